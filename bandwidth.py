@@ -0,0 +1,265 @@
+"""
+Общий ограничитель полосы для загрузок на платформы (token bucket).
+
+Все исходящие потоки (тело multipart для VK, медиапоток YouTube, отражение blob-ов lbrynet)
+берут токены из корзины своей платформы и из общей корзины. Лимиты задаются в
+bandwidth.json и перечитываются на лету при изменении файла:
+
+    {
+        "global_mbps": 40,          # общий лимит исходящего трафика, МБ/с (0 — без лимита)
+        "vk_mbps": 20,              # лимиты платформ
+        "youtube_mbps": 0,
+        "odysee_mbps": 10,
+        "favour": "twitch",         # стадия на критическом пути
+        "reserve": 0.5              # доля общего лимита, которая остаётся ей, пока она активна
+    }
+
+Пока активна предпочтительная стадия (по умолчанию скачивание с Twitch — иначе сегменты
+TwitchDownloaderCLI упираются в таймауты), остальные потоки вместе получают не больше
+(1 - reserve) общего лимита. Без файла ограничений нет.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import throughput
+
+BANDWIDTH_FILE = "bandwidth.json"
+PLATFORMS = ("vk", "youtube", "odysee", "twitch")
+DEFAULT_FAVOUR = "twitch"
+DEFAULT_RESERVE = 0.5
+BURST_SECONDS = 1.0
+RELOAD_INTERVAL = 1.0
+MB = 1024 * 1024
+
+
+class TokenBucket:
+    """
+    Корзина токенов (байт) с допустимым долгом: крупная порция забирается целиком,
+    а следующий вызов ждёт, пока долг не погасится. rate <= 0 — без ограничения.
+    """
+
+    def __init__(self, rate=0.0, burst_seconds=BURST_SECONDS):
+        self.lock = threading.Lock()
+        self.burst_seconds = burst_seconds
+        self.rate = 0.0
+        self.tokens = 0.0
+        self.stamp = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill()
+            self.rate = float(rate or 0)
+            self.tokens = min(self.tokens, self.rate * self.burst_seconds) if self.rate > 0 else 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.rate * self.burst_seconds, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def consume(self, amount, block=True):
+        """
+        Списывает amount байт; при block ждёт, пока баланс не станет неотрицательным.
+        """
+        with self.lock:
+            if self.rate <= 0:
+                return 0.0
+            self._refill()
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if block and wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class BandwidthManager:
+    def __init__(self, config_file=BANDWIDTH_FILE):
+        self.config_file = config_file
+        self.global_bucket = TokenBucket()
+        # общая корзина для непредпочтительных потоков, пока активна предпочтительная стадия
+        self.background = TokenBucket()
+        self.buckets = {p: TokenBucket() for p in PLATFORMS}
+        self.favour = DEFAULT_FAVOUR
+        self.reserve = DEFAULT_RESERVE
+        self.active = {}
+        self.lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.reload(force=True)
+
+    # --- настройки ---
+    def configure(self, global_mbps=None, favour=None, reserve=None, **platform_mbps):
+        """
+        Меняет лимиты во время работы (МБ/с; 0 — без лимита).
+        """
+        if global_mbps is not None:
+            self.global_bucket.set_rate(global_mbps * MB)
+        if favour is not None:
+            self.favour = favour or None
+        if reserve is not None:
+            self.reserve = min(max(float(reserve), 0.0), 1.0)
+        for platform, mbps in platform_mbps.items():
+            self.buckets.setdefault(platform, TokenBucket()).set_rate((mbps or 0) * MB)
+        self.background.set_rate(self.global_bucket.rate * (1 - self.reserve))
+
+    def reload(self, force=False):
+        """
+        Перечитывает bandwidth.json, если он изменился (не чаще раза в секунду).
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < RELOAD_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime and not force:
+            return
+        self._mtime = mtime
+        cfg = {}
+        if mtime is not None:
+            try:
+                with open(self.config_file, "r", encoding="utf-8") as f:
+                    cfg = json.load(f) or {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"Не удалось прочитать {self.config_file}: {e}")
+                return
+        self.configure(
+            global_mbps=float(cfg.get("global_mbps") or 0),
+            favour=cfg.get("favour", DEFAULT_FAVOUR),
+            reserve=cfg.get("reserve", DEFAULT_RESERVE),
+            **{p: float(cfg.get(f"{p}_mbps") or 0) for p in PLATFORMS}
+        )
+        if mtime is not None:
+            logging.info(f"Лимиты полосы: {cfg}")
+
+    # --- стадии ---
+    @contextmanager
+    def stage(self, platform):
+        """
+        Отмечает стадию активной (например, пока идёт скачивание с Twitch).
+        """
+        with self.lock:
+            self.active[platform] = self.active.get(platform, 0) + 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active[platform] -= 1
+
+    def _favoured_busy(self, platform):
+        with self.lock:
+            return bool(self.favour) and platform != self.favour and self.active.get(self.favour, 0) > 0
+
+    # --- учёт трафика ---
+    def throttle(self, platform, amount):
+        """
+        Блокирует поток, пока он не уложится в лимиты своей платформы и общий.
+        """
+        self.reload()
+        self.buckets.setdefault(platform, TokenBucket()).consume(amount)
+        if self._favoured_busy(platform):
+            self.background.consume(amount)
+        self.global_bucket.consume(amount)
+
+    def charge(self, platform, amount):
+        """
+        Учитывает трафик, который идёт мимо нас (процесс lbrynet): не блокирует,
+        но долг в корзинах притормозит остальные потоки.
+        """
+        self.reload()
+        self.buckets.setdefault(platform, TokenBucket()).consume(amount, block=False)
+        if self._favoured_busy(platform):
+            self.background.consume(amount, block=False)
+        self.global_bucket.consume(amount, block=False)
+
+
+class ThrottledReader:
+    """
+    Файлоподобная обёртка: read() проходит через manager.throttle(platform, ...).
+    Подходит и для тела multipart (upload_body.FileMultipartBody: requests берёт длину из .len), и для файла,
+    отдаваемого MediaIoBaseUpload (seek/tell пробрасываются к файлу). Скорость отдачи (от
+    первого чтения до конца данных) попадает в историю throughput.
+    """
+
+    def __init__(self, raw, platform, manager=None, block_size=256 * 1024):
+        self.raw = raw
+        self.platform = platform
+        self.manager = manager or get_manager()
+        self.block_size = block_size
+        self._started = None
+        self._sent = 0
+        self._recorded = False
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(self.block_size)
+                if not chunk:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+        data = self.raw.read(min(size, self.block_size))
+        if data:
+            if self._started is None:
+                self._started = time.monotonic()
+            self._sent += len(data)
+            self.manager.throttle(self.platform, len(data))
+            if getattr(self.raw, "len", 0) is not None:
+                throughput.progress(id(self), self.platform, self._sent, self._started)
+        else:
+            self._record()
+        return data
+
+    def _record(self):
+        throughput.finish(id(self))
+        # тело без длины (растущий файл) отдаётся со скоростью скачивания — не замеряем
+        if self._recorded or self._started is None or getattr(self.raw, "len", 0) is None:
+            return
+        self._recorded = True
+        throughput.record(self.platform, self._sent, time.monotonic() - self._started)
+
+    def close(self):
+        self._record()
+        self.raw.close()
+
+    @property
+    def len(self):
+        if hasattr(self.raw, "len"):
+            return self.raw.len
+        pos = self.raw.tell()
+        end = self.raw.seek(0, os.SEEK_END)
+        self.raw.seek(pos)
+        return end - pos
+
+    def __getattr__(self, name):
+        # seek/tell и прочее — как у исходного объекта (у тела multipart seek/tell нет,
+        # и requests по hasattr должен это увидеть)
+        return getattr(self.raw, name)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BandwidthManager()
+        return _manager
+
+
+def stage(platform):
+    return get_manager().stage(platform)
+
+
+def wrap(raw, platform):
+    return ThrottledReader(raw, platform)
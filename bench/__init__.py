@@ -0,0 +1 @@
+# Офлайн-бенчмарки: синтетические VOD и локальные заглушки Twitch/VK/YouTube/lbrynet.
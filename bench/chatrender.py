@@ -0,0 +1,106 @@
+"""
+Бенчмарк рендера чата: один процесс chatrender против chat.render_chat (куски таймлайна
+в параллельных процессах, склейка concatenate_videos из uploader.py) по числу процессов.
+
+    python -m bench.chatrender                         # чат 60 мин, 1..число ядер процессов
+    python -m bench.chatrender --minutes 240 --workers 1 2 4 8 --output chatrender.json
+
+Рендер — заглушка TwitchDownloaderCLI (bench/fake_twitchdownloader.py): настоящий ffmpeg
+кодирует тестовую картинку в один поток, так что кусок грузит одно ядро, как настоящий
+chatrender. Проверяется и результат: длительность склейки должна совпасть с длиной чата.
+Код возврата 1, если склейка потеряла или добавила больше секунды.
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import subprocess
+
+from bench import harness, stubs
+
+if harness.ROOT not in sys.path:
+    sys.path.insert(0, harness.ROOT)
+
+import chat  # noqa: E402
+import mp4meta  # noqa: E402
+
+WORK_DIR = os.path.join(harness.BENCH_DIR, "work", "chatrender")
+
+
+def make_chat(path, seconds, interval=3.0, seed=1):
+    """
+    Синтетический JSON чата в формате chatdownload: сообщение каждые ~interval секунд.
+    """
+    rnd = random.Random(seed)
+    comments = []
+    t = 0.0
+    while t < seconds:
+        comments.append({
+            "_id": f"c{len(comments)}",
+            "content_offset_seconds": round(t, 3),
+            "commenter": {"display_name": f"viewer{rnd.randint(1, 500)}"},
+            "message": {"body": " ".join(rnd.choice(["gg", "Kappa", "lol", "PogChamp", "wow", "nice"])
+                                         for _ in range(rnd.randint(1, 8)))},
+        })
+        t += rnd.uniform(0.2, 2 * interval)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"video": {"id": "900000901", "start": 0, "end": seconds, "length": seconds},
+                   "comments": comments}, f)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ускорение рендера чата по числу процессов")
+    parser.add_argument("--minutes", type=float, default=60, help="Длина синтетического чата, мин")
+    parser.add_argument("--workers", type=int, nargs="*", help="Числа процессов (по умолчанию 1, 2, 4… до числа ядер)")
+    parser.add_argument("--chunk", type=int, default=chat.RENDER_CHUNK, help="Наибольшая длина куска, с")
+    parser.add_argument("--repeat", type=int, default=1, help="Прогонов на вариант")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cores} | {2 ** i for i in range(1, 8) if 2 ** i < cores})
+    seconds = int(args.minutes * 60)
+    uploader = harness.load_script("uploader")
+    os.makedirs(WORK_DIR, exist_ok=True)
+    stubs.install_fake_tools(WORK_DIR, WORK_DIR)
+    cli = os.path.join(WORK_DIR, "TwitchDownloaderCLI", "TwitchDownloaderCLI")
+    results = {}
+    status = 0
+    with harness.chdir(WORK_DIR):
+        chat_file = make_chat("chat.json", seconds)
+
+        def serial():
+            subprocess.run([cli, "chatrender", "-i", chat_file, "-o", "serial.mp4"], check=True)
+
+        base = harness.measure(serial, repeat=args.repeat)
+        results["chatrender[serial]"] = base
+        print(f"-> один процесс: {base['median']:.2f} с (ядер {cores}, чат {args.minutes:g} мин)")
+        for n in workers:
+            output = f"chunked-{n}.mp4"
+
+            def chunked(n=n, output=output):
+                if os.path.exists(output):
+                    os.remove(output)
+                chat.render_chat(chat_file, output, cli, uploader.FFMPEG_PATH,
+                                 uploader.concatenate_videos, workers=n, chunk=args.chunk)
+
+            res = harness.measure(chunked, repeat=args.repeat)
+            duration = mp4meta.read_duration(output) or uploader.get_video_duration(output)
+            res.update(workers=n, speedup=base["median"] / res["median"], duration=duration)
+            results[f"chatrender[workers={n}]"] = res
+            print(f"-> процессов {n}: {res['median']:.2f} с, ускорение x{res['speedup']:.2f}, "
+                  f"длительность {duration:.1f} с из {seconds}")
+            if abs(duration - seconds) > 1:
+                status = 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
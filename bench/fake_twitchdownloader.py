@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Заглушка TwitchDownloaderCLI для бенчмарков.
+
+videodownload --id ID -o OUT: копирует $BENCH_VOD_DIR/ID.mp4 в OUT, печатая строки прогресса
+в формате настоящего CLI. Скорость ограничивается $BENCH_DOWNLOAD_MBPS (0 — без ограничения).
+Отсутствующий ID завершается кодом 1, как удалённый/саб-онли VOD. С -q (кроме source)
+копируется облегчённая версия $BENCH_VOD_DIR/ID_Q.mp4: при первом запросе она один раз
+кодируется ffmpeg из ID.mp4 с меньшим битрейтом и остаётся рядом с корпусом. С -b/-e
+(секунды) копируется только этот кусок VOD: ffmpeg вырезает его без перекодирования, как
+настоящий CLI.
+
+chatdownload --id ID -o OUT: пишет в OUT JSON чата без сообщений через $BENCH_CHAT_SECONDS
+секунд; по умолчанию — за половину времени скачивания видео того же VOD (0.05 с без ограничения).
+
+chatrender -i CHAT -o OUT [-b С] [-e С] [--output-args ARGS]: кодирует настоящим ffmpeg
+($BENCH_FFMPEG, по умолчанию ffmpeg) тестовую картинку длиной e - b секунд в один поток
+(-threads 1), как однопоточный рендер настоящего CLI; ARGS — с подстановкой {save_path}.
+Размер и частота кадров — -w/-h/--framerate (по умолчанию 320x240, 10 кадров/с).
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import subprocess
+
+CHUNK = 4 * 1024 * 1024
+
+
+def _rendition(src, quality):
+    path = f"{src[:-4]}_{quality}.mp4"
+    if not os.path.exists(path):
+        partial = path + ".part.mp4"
+        subprocess.run([os.environ.get("BENCH_FFMPEG", "ffmpeg"), "-y", "-v", "error", "-i", src,
+                        "-map", "0", "-c:v", "libx264", "-preset", "ultrafast", "-crf", "40",
+                        "-c:a", "aac", "-b:a", "16k", partial], check=True)
+        os.replace(partial, path)
+    return path
+
+
+def _trim(src, beginning, ending, output):
+    path = output + ".trim.mp4"
+    command = [os.environ.get("BENCH_FFMPEG", "ffmpeg"), "-y", "-v", "error", "-ss", str(beginning or 0), "-i", src]
+    if ending:
+        command += ["-t", str(float(ending) - float(beginning or 0))]
+    subprocess.run(command + ["-map", "0", "-c", "copy", path], check=True)
+    return path
+
+
+def videodownload(args):
+    src = os.path.join(os.environ.get("BENCH_VOD_DIR", "."), f"{args.id}.mp4")
+    if not os.path.exists(src):
+        print(f"[ERROR] - Video {args.id} not found")
+        return 1
+    if args.quality and args.quality.lower() != "source":
+        src = _rendition(src, args.quality)
+    trimmed = None
+    if args.beginning or args.ending:
+        src = trimmed = _trim(src, args.beginning, args.ending, args.output)
+    mbps = float(os.environ.get("BENCH_DOWNLOAD_MBPS", "0") or 0)
+    total = os.path.getsize(src)
+    done = 0
+    last_pct = -1
+    start = time.monotonic()
+    with open(src, "rb") as fin, open(args.output, "wb") as fout:
+        while True:
+            chunk = fin.read(CHUNK)
+            if not chunk:
+                break
+            fout.write(chunk)
+            done += len(chunk)
+            if mbps > 0:
+                ahead = done / (mbps * 1024 * 1024) - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+            pct = int(done * 100 / total) if total else 100
+            if pct != last_pct:
+                print(f"[STATUS] - Downloading {pct}% [1/4]", flush=True)
+                last_pct = pct
+    if trimmed:
+        os.remove(trimmed)
+    print("[STATUS] - Finalizing Video 100% [4/4]", flush=True)
+    return 0
+
+
+def chatdownload(args):
+    src = os.path.join(os.environ.get("BENCH_VOD_DIR", "."), f"{args.id}.mp4")
+    if not os.path.exists(src):
+        print(f"[ERROR] - Video {args.id} not found")
+        return 1
+    seconds = os.environ.get("BENCH_CHAT_SECONDS")
+    if seconds is None:
+        mbps = float(os.environ.get("BENCH_DOWNLOAD_MBPS", "0") or 0)
+        seconds = os.path.getsize(src) / (mbps * 1024 * 1024) / 2 if mbps > 0 else 0.05
+    time.sleep(float(seconds))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"video": {"id": args.id}, "comments": []}, f)
+    print("[STATUS] - Downloading 100%", flush=True)
+    return 0
+
+
+def chatrender(args):
+    with open(args.input, "r", encoding="utf-8") as f:
+        video = json.load(f).get("video") or {}
+    begin = float(args.beginning or 0)
+    end = float(args.ending) if args.ending else float(video.get("length") or 0)
+    output_args = args.output_args or '-c:v libx264 -preset veryfast -crf 18 -pix_fmt yuv420p "{save_path}"'
+    command = [os.environ.get("BENCH_FFMPEG", "ffmpeg"), "-v", "error", "-y", "-f", "lavfi",
+               "-i", f"testsrc2=s={args.width}x{args.height}:r={args.framerate}:d={end - begin}",
+               "-threads", "1", *shlex.split(output_args.replace("{save_path}", args.output))]
+    return subprocess.run(command).returncode
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="TwitchDownloaderCLI")
+    sub = parser.add_subparsers(dest="command", required=True)
+    vd = sub.add_parser("videodownload")
+    vd.add_argument("--id", required=True)
+    vd.add_argument("-o", "--output", required=True)
+    vd.add_argument("--threads")
+    vd.add_argument("--temp-path")
+    vd.add_argument("-q", "--quality")
+    vd.add_argument("-b", "--beginning")
+    vd.add_argument("-e", "--ending")
+    cd = sub.add_parser("chatdownload")
+    cd.add_argument("--id", required=True)
+    cd.add_argument("-o", "--output", required=True)
+    cd.add_argument("--temp-path")
+    cr = sub.add_parser("chatrender", add_help=False)
+    cr.add_argument("-i", "--input", required=True)
+    cr.add_argument("-o", "--output", required=True)
+    cr.add_argument("-b", "--beginning")
+    cr.add_argument("-e", "--ending")
+    cr.add_argument("-w", "--chat-width", dest="width", type=int, default=320)
+    cr.add_argument("-h", "--chat-height", dest="height", type=int, default=240)
+    cr.add_argument("--framerate", type=int, default=10)
+    cr.add_argument("--output-args")
+    cr.add_argument("--temp-path")
+    args, _ = parser.parse_known_args(argv)
+    if args.command == "chatrender":
+        return chatrender(args)
+    if args.command == "videodownload":
+        return videodownload(args)
+    if args.command == "chatdownload":
+        return chatdownload(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
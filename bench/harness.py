@@ -0,0 +1,151 @@
+"""
+Общие утилиты бенчмарков: загрузка скриптов по пути, замеры времени и сравнение с базовой линией.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import importlib.util
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "bench")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+SCRIPTS = {
+    "uploader": "uploader.py",
+    "uploader_beta": "uploader-beta.py",
+    "yt": "yt.py",
+    "vk": "vk.py",
+}
+
+
+def load_script(name):
+    """
+    Импортирует скрипт из корня репозитория как модуль (имена с дефисом обычным import не грузятся).
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    path = os.path.join(ROOT, SCRIPTS.get(name, name))
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def patched(obj, **attrs):
+    """
+    Временно подменяет атрибуты объекта/модуля.
+    """
+    saved = {k: getattr(obj, k) for k in attrs if hasattr(obj, k)}
+    for k, v in attrs.items():
+        setattr(obj, k, v)
+    try:
+        yield obj
+    finally:
+        for k in attrs:
+            if k in saved:
+                setattr(obj, k, saved[k])
+            else:
+                delattr(obj, k)
+
+
+@contextmanager
+def chdir(path):
+    prev = os.getcwd()
+    os.makedirs(path, exist_ok=True)
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(prev)
+
+
+def measure(func, repeat=1, setup=None):
+    """
+    Запускает func() repeat раз, возвращает словарь с минимумом/медианой в секундах.
+    setup() вызывается перед каждым повтором и в замер не входит. Необработанное исключение
+    в любом потоке за время прогона (threading.excepthook) — ошибка кейса: время сломанного
+    прогона не возвращается.
+    """
+    samples = []
+    errors = []
+    hook = threading.excepthook
+
+    def catch(args):
+        errors.append(args)
+        hook(args)
+
+    threading.excepthook = catch
+    try:
+        for _ in range(max(1, repeat)):
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - t0)
+            if errors:
+                e = errors[0]
+                raise RuntimeError(f"исключение в потоке {e.thread.name if e.thread else '?'}: "
+                                   f"{e.exc_type.__name__}: {e.exc_value}")
+    finally:
+        threading.excepthook = hook
+    samples.sort()
+    return {"min": samples[0], "median": samples[len(samples) // 2], "runs": len(samples)}
+
+
+def load_baseline(path=DEFAULT_BASELINE):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_baseline(results, path=DEFAULT_BASELINE):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    print(f"Базовая линия сохранена в {path}")
+
+
+def missing_baseline(baseline, path):
+    """
+    Без базовой линии сравнение ничего не проверяет: печатает, как её записать, и
+    возвращает True — вызывающий завершается с кодом 2, а не молча проходит.
+    """
+    if baseline:
+        return False
+    print(f"--!! Нет базовой линии {path}: сравнивать не с чем. Запишите её на этой машине "
+          f"запуском с --save-baseline.")
+    return True
+
+
+def compare(results, baseline, tolerance=0.2, expected=()):
+    """
+    Печатает таблицу сравнения с базовой линией. Возвращает список регрессий: кейсы, где
+    медиана хуже базовой больше чем на tolerance, упавшие кейсы ({"error": ...} в results)
+    и кейсы из expected (обычно — выбранные кейсы базовой линии), которых нет в results.
+    """
+    regressions = []
+    names = sorted(set(results) | set(expected))
+    width = max([len(k) for k in names] + [10])
+    print(f"{'кейс':<{width}}  {'медиана, с':>11}  {'база, с':>9}  {'отношение':>9}")
+    for name in names:
+        if name not in results or "error" in results[name]:
+            reason = results[name]["error"] if name in results else "нет результата"
+            print(f"{name:<{width}}  {'—':>11}  {'':>9}  {'':>9}  <-- упал: {reason}")
+            regressions.append(name)
+            continue
+        cur = results[name]["median"]
+        base = baseline.get(name, {}).get("median")
+        if base:
+            ratio = cur / base
+            mark = "  <-- регрессия" if ratio > 1 + tolerance else ""
+            print(f"{name:<{width}}  {cur:>11.3f}  {base:>9.3f}  {ratio:>9.2f}{mark}")
+            if mark:
+                regressions.append(name)
+        else:
+            print(f"{name:<{width}}  {cur:>11.3f}  {'—':>9}  {'—':>9}")
+    return regressions
@@ -0,0 +1,134 @@
+"""
+Бенчмарк задержки чтения длительности и глав: ffprobe против mp4meta.
+
+    python -m bench.probe /path/to/twitchdownloader/outputs   # корпус реальных выгрузок
+    python -m bench.probe --synthetic                          # синтетический корпус bench/work/vods
+    python -m bench.probe DIR --cold                           # сбрасывать page cache перед каждым чтением
+
+Для каждого файла проверяется, что оба способа дают одинаковые длительность и главы.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+
+from bench import harness, synth
+
+ROOT = harness.ROOT
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import mp4meta  # noqa: E402
+
+FFPROBE_PATH = shutil.which("ffprobe") or "/usr/bin/ffprobe"
+
+
+def drop_cache(path):
+    """
+    Просит ядро выбросить страницы файла из page cache (best effort, только Linux).
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def via_ffprobe(path):
+    out = subprocess.run(
+        [FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
+         "-of", "default=noprint_wrappers=1:nokey=1", path],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    chapters = subprocess.run(
+        [FFPROBE_PATH, "-v", "quiet", "-print_format", "json", "-show_chapters", path],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+    return float(out.strip()), json.loads(chapters or "{}").get("chapters", [])
+
+
+def via_mp4meta(path):
+    mp4meta._probe.cache_clear()
+    info = mp4meta.probe(path)
+    if info is None:
+        return None, None
+    return info["duration"], info["chapters"]
+
+
+def _timed(func, path, repeat, cold):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        if cold:
+            drop_cache(path)
+        t0 = time.perf_counter()
+        result = func(path)
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+
+def _agree(a, b):
+    (dur_a, ch_a), (dur_b, ch_b) = a, b
+    if dur_a is None or dur_b is None or abs(dur_a - dur_b) > 0.05:
+        return False
+    if len(ch_a) != len(ch_b):
+        return False
+    for x, y in zip(ch_a, ch_b):
+        if abs(float(x["start_time"]) - float(y["start_time"])) > 0.01:
+            return False
+        if x.get("tags", {}).get("title") != y.get("tags", {}).get("title"):
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Задержка чтения метаданных MP4: ffprobe vs mp4meta")
+    parser.add_argument("corpus", nargs="?", help="Папка с .mp4 (выгрузки TwitchDownloaderCLI)")
+    parser.add_argument("--synthetic", action="store_true", help="Использовать синтетический корпус")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов на файл")
+    parser.add_argument("--cold", action="store_true", help="Сбрасывать page cache перед каждым замером")
+    args = parser.parse_args(argv)
+
+    if args.synthetic or not args.corpus:
+        directory = os.path.join(harness.BENCH_DIR, "work", "vods")
+        synth.build_corpus(directory, scale=1 / 60)
+    else:
+        directory = args.corpus
+    files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".mp4"))
+    if not files:
+        print(f"В {directory} нет .mp4 файлов.")
+        return 1
+
+    have_ffprobe = os.path.exists(FFPROBE_PATH)
+    totals = {"ffprobe": 0.0, "mp4meta": 0.0}
+    mismatches = 0
+    print(f"{'файл':<40} {'размер, МБ':>10} {'ffprobe, мс':>12} {'mp4meta, мс':>12}  совпадение")
+    for path in files:
+        t_meta, r_meta = _timed(via_mp4meta, path, args.repeat, args.cold)
+        totals["mp4meta"] += t_meta
+        if have_ffprobe:
+            t_ff, r_ff = _timed(via_ffprobe, path, args.repeat, args.cold)
+            totals["ffprobe"] += t_ff
+            ok = _agree(r_meta, r_ff)
+            mismatches += 0 if ok else 1
+            ff_col, ok_col = f"{t_ff * 1000:>12.2f}", "да" if ok else "НЕТ"
+        else:
+            ff_col, ok_col = f"{'—':>12}", "—"
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"{os.path.basename(path):<40} {size_mb:>10.1f} {ff_col} {t_meta * 1000:>12.3f}  {ok_col}")
+
+    print(f"\nИтого по {len(files)} файлам: mp4meta {totals['mp4meta'] * 1000:.2f} мс", end="")
+    if have_ffprobe and totals["mp4meta"] > 0:
+        print(f", ffprobe {totals['ffprobe'] * 1000:.2f} мс (x{totals['ffprobe'] / totals['mp4meta']:.0f})")
+    else:
+        print(" (ffprobe не найден, сравнение пропущено)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
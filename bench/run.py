@@ -0,0 +1,383 @@
+"""
+Офлайн-бенчмарк конвейера: синтетические VOD + локальные заглушки платформ.
+
+Запуск из корня репозитория:
+    python -m bench.run --quick                  # короткие ролики (1/60 длительности)
+    python -m bench.run --save-baseline          # сохранить результаты как базовую линию
+    python -m bench.run --only split main        # только кейсы, содержащие подстроки
+Код возврата 1, если какой-то кейс медленнее базовой линии больше чем на --tolerance,
+упал (в том числе исключением в фоновом потоке) или есть в базовой линии, но не дал
+результата, и 2, если базовой линии нет (её записывают на своей машине: --save-baseline).
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import builtins
+import importlib
+import threading
+import contextlib
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from bench import harness, stubs, synth
+
+MAX_ALLOWED_DURATION = 11 * 3600 + 58 * 60
+GROUP_DURATION = 12 * 3600
+
+# Строки тестового streams.xlsx: несколько VOD (конкат), длинный VOD (нарезка), обычный
+# и VOD, которого нет на «Twitch» (проверка preflight и ошибок скачивания).
+ROWS = [
+    ["900000901", "900000902"],
+    ["900000903"],
+    ["900000904"],
+    ["900000999"],
+]
+
+
+def _reset_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def _link_inputs(workdir, corpus, ids):
+    """
+    Симлинки на файлы корпуса в рабочей папке: скрипты пишут результаты рядом со входом.
+    """
+    names = []
+    for vid in ids:
+        name = f"{vid}.mp4"
+        dst = os.path.join(workdir, name)
+        if not os.path.lexists(dst):
+            os.symlink(corpus[vid]["path"], dst)
+        names.append(name)
+    return names
+
+
+@contextlib.contextmanager
+def scaled_limits(module, scale):
+    """
+    Масштабирует лимиты длительности модуля вместе с корпусом (--quick), включая
+    значения по умолчанию, которые Python связал при определении функций.
+    """
+    saved = {}
+    if hasattr(module, "MAX_ALLOWED_DURATION"):
+        saved["MAX_ALLOWED_DURATION"] = module.MAX_ALLOWED_DURATION
+        module.MAX_ALLOWED_DURATION = int(MAX_ALLOWED_DURATION * scale)
+    defaults = {}
+    for fname, value in (("split_single_video", MAX_ALLOWED_DURATION), ("smart_group_and_concatenate", GROUP_DURATION)):
+        func = getattr(module, fname, None)
+        if func is None or not func.__defaults__:
+            continue
+        # первый параметр со значением по умолчанию — лимит длительности (max_dur/max_duration)
+        code = func.__code__
+        first = code.co_varnames[code.co_argcount - len(func.__defaults__)]
+        if first.startswith("max_dur"):
+            defaults[func] = func.__defaults__
+            func.__defaults__ = (int(value * scale),) + func.__defaults__[1:]
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            setattr(module, k, v)
+        for func, d in defaults.items():
+            func.__defaults__ = d
+
+
+def _point_to_stubs(module, base_url):
+    attrs = {
+        "VK_API_URL": f"{base_url}/method",
+        "LBRYNET_API_URL": f"{base_url}/lbrynet",
+        "TWITCH_AUTH_URL": f"{base_url}/oauth2/token",
+        "TWITCH_API_URL": f"{base_url}/helix",
+        "FFMPEG_PATH": shutil.which("ffmpeg") or "ffmpeg",
+        "FFPROBE_PATH": shutil.which("ffprobe") or "ffprobe",
+    }
+    for k, v in attrs.items():
+        if hasattr(module, k):
+            setattr(module, k, v)
+    if hasattr(module, "get_authenticated_youtube_service"):
+        module.get_authenticated_youtube_service = stubs.youtube_service_factory(base_url)
+
+
+def _write_workspace(workdir, corpus, vod_dir):
+    """
+    Готовит рабочую папку для main(): streams.xlsx, config.json, файлы OAuth, заглушка CLI.
+    """
+    _reset_dir(workdir)
+    rows = []
+    for i, ids in enumerate(ROWS):
+        rows.append({
+            "A": None,
+            "B": " ".join(f"https://www.twitch.tv/videos/{vid}" for vid in ids),
+            "C": f"Синтетический стрим {i + 1} ({i + 1:02d}.01.2025)",
+            "D": "Описание",
+            "E": "bench, synthetic",
+            "F": f"bench-claim-{i + 1}",
+            "G": "",
+            "H": None,
+            "I": f"chat/{ids[0]}.json",
+        })
+    pd.DataFrame(rows, columns=list("ABCDEFGHI")).to_excel(os.path.join(workdir, "streams.xlsx"), index=False)
+    config = {
+        "vk_token": "bench", "vk_group_id": 1, "vk_album_id": 1,
+        "streams_file": "streams.xlsx", "wallet_path": "",
+        "twitch_client_id": "bench", "twitch_client_secret": "bench",
+    }
+    with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    for name in ("client_secret.json", "token.json", ".installed"):
+        with open(os.path.join(workdir, name), "w", encoding="utf-8") as f:
+            f.write("{}")
+    return stubs.install_fake_tools(workdir, vod_dir)
+
+
+@contextlib.contextmanager
+def _script_env(wdir, bin_dir, verbose=False):
+    """
+    Окружение запуска скрипта: PATH с заглушками, HOME в рабочей папке, ответ «y» на
+    вопросы, вывод заглушён без --verbose.
+    """
+    env = {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""), "HOME": wdir}
+    saved_env = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    sink = open(os.devnull, "w") if not verbose else None
+    try:
+        with harness.chdir(wdir), harness.patched(builtins, input=lambda *a, **kw: "y"), \
+                contextlib.redirect_stdout(sink or sys.stdout):
+            yield
+    finally:
+        if sink:
+            sink.close()
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _main_args(name):
+    if name == "yt":
+        return dict(start_row=1, end_row=len(ROWS), max_uploads=99)
+    if name == "vk":
+        return dict(start_row=1, end_row=len(ROWS), do_vk_upload=True, do_odysee_upload=True)
+    return dict(start_row=1, end_row=len(ROWS), do_vk=True, do_youtube=True, max_uploads=99)
+
+
+def run_cases(args):
+    work = os.path.abspath(args.work)
+    vod_dir = os.path.join(work, "vods")
+    scale = 1 / 60 if args.quick else 1.0
+    corpus = synth.build_corpus(vod_dir, scale=scale)
+    server, base_url, state = stubs.start_stub_server(
+        archives=stubs.make_archives(corpus), upload_mbps=args.upload_mbps)
+
+    with harness.chdir(work):
+        modules = {name: harness.load_script(name) for name in harness.SCRIPTS}
+    # twitch_api — общий модуль, который скрипты импортируют по имени
+    for module in list(modules.values()) + [importlib.import_module("twitch_api")]:
+        _point_to_stubs(module, base_url)
+
+    cases = {}
+
+    def fn_case(case, module, build):
+        fdir = os.path.join(work, "fn", case.replace("[", "_").replace("]", ""))
+
+        def setup():
+            _reset_dir(fdir)
+
+        def run():
+            with harness.chdir(fdir), scaled_limits(module, scale):
+                build(fdir)
+        cases[case] = (run, setup)
+
+    for name in ("uploader", "uploader_beta", "yt"):
+        m = modules[name]
+        fn_case(f"create_concat_metadata[{name}]", m,
+                lambda d, m=m: m.create_concat_metadata(_link_inputs(d, corpus, ROWS[0])))
+        fn_case(f"concatenate_videos[{name}]", m,
+                lambda d, m=m: m.concatenate_videos(
+                    _link_inputs(d, corpus, ROWS[0]), "out.mp4",
+                    m.create_concat_metadata(_link_inputs(d, corpus, ROWS[0]))))
+        fn_case(f"split_single_video[{name}]", m,
+                lambda d, m=m: m.split_single_video(_link_inputs(d, corpus, ROWS[1])[0]))
+    fn_case("concatenate_videos[vk]", modules["vk"],
+            lambda d: modules["vk"].concatenate_videos(_link_inputs(d, corpus, ROWS[0]), "out.mp4"))
+    fn_case("smart_group_and_concatenate[yt]", modules["yt"],
+            lambda d: modules["yt"].smart_group_and_concatenate(
+                _link_inputs(d, corpus, ["900000901", "900000902", "900000904"])))
+
+    def helix_case():
+        d = os.path.join(work, "helix")
+        _reset_dir(d)
+        with harness.chdir(d):
+            with open("config.json", "w", encoding="utf-8") as f:
+                json.dump({"twitch_client_id": "bench", "twitch_client_secret": "bench"}, f)
+            modules["uploader_beta"].generate_streams_xlsx("benchuser", len(corpus), "streams.xlsx")
+    cases["generate_streams_xlsx[uploader_beta]"] = (helix_case, None)
+
+    def sync_setup():
+        # Полная выгрузка, затем замеряется ежедневная синхронизация без новых архивов
+        helix_case()
+        state.reset()
+
+    def sync_case():
+        with harness.chdir(os.path.join(work, "helix")):
+            modules["uploader_beta"].sync_streams_xlsx("benchuser", 100, "streams.xlsx")
+    cases["sync_streams_xlsx[uploader_beta]"] = (sync_case, sync_setup)
+
+    variants = [(name, m, "", {}) for name, m in modules.items()]
+    # Скачивание по сроку удаления VOD (--schedule expiry)
+    variants += [(name, modules[name], ":expiry", {"schedule": "expiry"}) for name in ("uploader", "uploader_beta")]
+    # Режим общей очереди (--queue): один воркер должен выбрать все живые строки
+    variants += [(name, modules[name], ":queue", {"queue_file": "queue.sqlite"}) for name in ("uploader", "uploader_beta")]
+    # VK и YouTube одновременно из одного чтения файла (--tee), маленькое окно — чтобы каналы ждали друг друга
+    variants += [(name, modules[name], ":tee", {"tee_window": 1}) for name in ("uploader", "uploader_beta")]
+    # Загрузка в VK по ходу скачивания (--stream-upload): куски VOD собираются во фрагментированный MP4
+    variants += [("uploader", modules["uploader"], ":stream", {"stream_upload": True})]
+    # Чат (--chat) качается вместе с видео: время строки почти не должно вырасти
+    variants += [(name, modules[name], ":chat", {"chat_download": True}) for name in ("uploader", "uploader_beta")]
+    # --transcode: VK получает версию 480p, YouTube — исходник; главы VK-версии те же
+    variants += [(name, modules[name], ":transcode", {"transcode_profiles": {"vk": "480p"}})
+                 for name in ("uploader", "uploader_beta")]
+    # --max-quality: VK хватает 480p — вторая, облегчённая версия дешевле загрузки источника в VK
+    variants += [(name, modules[name], ":max-quality", {"max_quality": {"vk": (480, 0)}})
+                 for name in ("uploader", "uploader_beta")]
+    variants += [("vk", modules["vk"], ":max-quality", {"max_quality": {"odysee": (480, 0)}})]
+    # --plan: только Helix, без скачиваний и загрузок
+    variants += [(name, modules[name], ":plan", {"plan_file": "batch_plan.json"})
+                 for name in ("uploader", "uploader_beta", "yt")]
+    # --plan, затем --from-plan по сохранённому плану: загрузки те же, что без плана
+    variants += [(name, modules[name], ":from-plan", {"from_plan": "batch_plan.json"})
+                 for name in ("uploader", "uploader_beta")]
+    for name, m, suffix, extra in variants:
+        def main_case(name=name, m=m, suffix=suffix, extra=extra):
+            wdir = os.path.join(work, f"main_{name}{suffix.replace(':', '_')}")
+            bin_dir = _write_workspace(wdir, corpus, vod_dir)
+            with _script_env(wdir, bin_dir, args.verbose), scaled_limits(m, scale):
+                if "from_plan" in extra:
+                    m.main(**_main_args(name), plan_file=extra["from_plan"])
+                m.main(**_main_args(name), **extra)
+        cases[f"main[{name}{suffix}]"] = (main_case, None)
+
+    # --watch: архивы канала уже в таблице, затем идёт стрим (его архив публиковать рано), стрим
+    # кончается — архив должен сам дойти до VK и YouTube; замеряется задержка от конца стрима
+    watch_module = importlib.import_module("watch")
+    new_id = ROWS[1][0]
+    latency = {}
+
+    def watch_case():
+        wdir = os.path.join(work, "watch_uploader_beta")
+        bin_dir = _write_workspace(wdir, corpus, vod_dir)
+        os.remove(os.path.join(wdir, "streams.xlsx"))
+        archives = stubs.make_archives(corpus)
+        new = next(v for v in archives if v["id"] == new_id)
+        duration = corpus[new_id]["duration"]
+        state.archives = [v for v in archives if v is not new]
+        stop = threading.Event()
+        m = modules["uploader_beta"]
+        options = _main_args("uploader_beta")
+        del options["start_row"], options["end_row"]
+
+        def wait_for(condition, label, deadline=120):
+            end = time.monotonic() + deadline
+            while not condition():
+                if time.monotonic() > end:
+                    raise RuntimeError(f"watch: не дождался: {label}")
+                time.sleep(0.05)
+
+        def polls():
+            return state.snapshot()["requests"].get("helix.streams", 0)
+
+        with _script_env(wdir, bin_dir, args.verbose), scaled_limits(m, scale), \
+                harness.patched(watch_module, LIVE_INTERVAL=0.3, IDLE_MIN=0.3, IDLE_MAX=1.0):
+            thread = threading.Thread(target=m.watch_archives, args=("benchuser", 100, stop), kwargs=options)
+            thread.start()
+            try:
+                wait_for(lambda: polls() >= 1, "первый опрос")
+                # стрим идёт: его архив уже виден в Helix, но публиковать его рано
+                started = datetime.now(timezone.utc) - timedelta(seconds=duration)
+                new["created_at"] = started.strftime("%Y-%m-%dT%H:%M:%SZ")
+                state.live = {"user_id": new["user_id"], "type": "live", "started_at": new["created_at"]}
+                state.archives = [new] + state.archives
+                seen = polls()
+                wait_for(lambda: polls() >= seen + 2, "опросы в эфире")
+                if state.snapshot()["requests"].get("youtube.upload"):
+                    raise RuntimeError("watch: архив идущего стрима опубликован до конца стрима")
+                # стрим кончился: архив готов
+                new["created_at"] = (datetime.now(timezone.utc) - timedelta(seconds=duration)).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ")
+                state.live = None
+                wait_for(lambda: watch_module.summary(), "публикация")
+                latency.update(watch_module.summary())
+            finally:
+                stop.set()
+                thread.join()
+                state.live = None
+                state.archives = archives
+    cases["watch[uploader_beta]"] = (watch_case, None)
+
+    results = {}
+    for case, (run, setup) in cases.items():
+        if args.only and not any(s in case for s in args.only):
+            continue
+        state.reset()
+        print(f"-> {case}")
+        try:
+            result = harness.measure(run, repeat=args.repeat, setup=setup)
+        except Exception as e:
+            # упавший кейс остаётся в результатах — compare считает его регрессией
+            print(f"--!! {case}: {e}")
+            logging.exception(case)
+            results[case] = {"error": str(e)}
+            continue
+        result["api"] = state.snapshot()
+        if case.startswith("watch[") and latency:
+            result["latency"] = dict(latency)
+            print(f"-> конец стрима -> публикация {latency['median']:.1f} с, "
+                  f"из них до обнаружения {latency['detect']:.1f} с")
+        results[case] = result
+    server.shutdown()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк конвейера VOD")
+    parser.add_argument("--work", default=os.path.join(harness.BENCH_DIR, "work"), help="Рабочая папка")
+    parser.add_argument("--quick", action="store_true", help="Короткие ролики и масштабированные лимиты")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов на кейс")
+    parser.add_argument("--only", nargs="*", help="Только кейсы, содержащие эти подстроки")
+    parser.add_argument("--upload-mbps", type=float, default=0.0, help="Ограничение аплинка заглушек, МБ/с")
+    parser.add_argument("--baseline", default=harness.DEFAULT_BASELINE, help="Файл базовой линии")
+    parser.add_argument("--save-baseline", action="store_true", help="Записать результаты как базовую линию")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допустимое замедление (доля)")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--verbose", action="store_true", help="Не глушить вывод main()")
+    args = parser.parse_args(argv)
+
+    results = run_cases(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    failed = sorted(k for k, v in results.items() if "error" in v)
+    if args.save_baseline:
+        if failed:
+            print(f"--!! Упали кейсы {', '.join(failed)}: базовая линия не сохранена.")
+            return 1
+        harness.save_baseline(results, args.baseline)
+        return 0
+    baseline = harness.load_baseline(args.baseline)
+    expected = [k for k in baseline if not args.only or any(s in k for s in args.only)]
+    regressions = harness.compare(results, baseline, args.tolerance, expected)
+    if harness.missing_baseline(baseline, args.baseline):
+        return 2
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Бенчмарк холодного старта скриптов: python -X importtime SCRIPT --help.
+
+    python -m bench.startup                  # замер и сравнение с bench/startup_baseline.json
+    python -m bench.startup --save-baseline  # записать текущие значения как базовую линию
+    python -m bench.startup --only vk --top 15
+
+Для каждого скрипта считается медиана времени запуска и суммарное время импортов
+верхнего уровня, печатаются самые тяжёлые импорты. Завершается с кодом 1, если медиана
+хуже базовой больше чем на --tolerance или превышает --budget-ms, либо если при старте
+загрузился модуль, который должен импортироваться лениво (клиент Google, rich, pandas, ...),
+и с кодом 2, если базовой линии нет (--save-baseline).
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+from bench import harness
+
+BASELINE_FILE = os.path.join(harness.BENCH_DIR, "startup_baseline.json")
+
+# Эти пакеты нужны только на конкретных путях (YouTube, прогресс-бар yt.py, загрузка в VK)
+LAZY_MODULES = ("googleapiclient", "google_auth_oauthlib", "google.oauth2", "rich", "pandas",
+                "requests_toolbelt", "openpyxl")
+
+
+def parse_importtime(stderr):
+    """
+    Разбирает вывод -X importtime: [(модуль, cumulative мкс, уровень вложенности), ...].
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # после разделителя один пробел, затем по два на уровень вложенности
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        try:
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue
+        entries.append((name.strip(), cumulative_us, depth))
+    return entries
+
+
+def run_once(script, workdir):
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.join(harness.ROOT, script), "--help"],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        env=dict(os.environ, PYTHONPATH=harness.ROOT)
+    )
+    elapsed = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} --help завершился с кодом {proc.returncode}")
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def measure_script(script, repeat, workdir):
+    samples = []
+    entries = []
+    for _ in range(repeat):
+        elapsed, entries = run_once(script, workdir)
+        samples.append(elapsed)
+    samples.sort()
+    top_level = [e for e in entries if e[2] == 0]
+    return {
+        "min": samples[0],
+        "median": samples[len(samples) // 2],
+        "runs": len(samples),
+        "imports_ms": sum(e[1] for e in top_level) / 1000,
+        "heaviest": sorted(top_level, key=lambda e: -e[1]),
+        "lazy_loaded": sorted({m for e in entries for m in LAZY_MODULES
+                               if e[0] == m or e[0].startswith(m + ".")}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Холодный старт скриптов (python -X importtime)")
+    parser.add_argument("--only", nargs="*", help="Скрипты из bench.harness.SCRIPTS")
+    parser.add_argument("--repeat", type=int, default=5, help="Запусков на скрипт")
+    parser.add_argument("--top", type=int, default=5, help="Сколько тяжёлых импортов показать")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Допустимое ухудшение медианы")
+    parser.add_argument("--budget-ms", type=float, help="Абсолютный предел медианы старта, мс")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результат как базовую линию")
+    args = parser.parse_args(argv)
+
+    names = args.only or list(harness.SCRIPTS)
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as workdir:
+        for name in names:
+            script = harness.SCRIPTS.get(name, name)
+            # первый запуск прогревает .pyc и в замер не входит
+            run_once(script, workdir)
+            res = measure_script(script, args.repeat, workdir)
+            results[f"startup[{name}]"] = res
+            print(f"-> {script}: медиана {res['median'] * 1000:.0f} мс, импорты {res['imports_ms']:.0f} мс")
+            for module, cumulative_us, _ in res["heaviest"][:args.top]:
+                print(f"     {cumulative_us / 1000:>8.1f} мс  {module}")
+            if res["lazy_loaded"]:
+                print(f"   !! при старте загружены: {', '.join(res['lazy_loaded'])}")
+                failures.append(name)
+            elif args.budget_ms and res["median"] * 1000 > args.budget_ms:
+                print(f"   !! старт дольше бюджета {args.budget_ms:.0f} мс")
+                failures.append(name)
+
+    summary = {k: {"median": v["median"], "min": v["min"], "runs": v["runs"]} for k, v in results.items()}
+    if args.save_baseline:
+        harness.save_baseline(summary, BASELINE_FILE)
+        return 1 if failures else 0
+    baseline = harness.load_baseline(BASELINE_FILE)
+    regressions = harness.compare(summary, baseline, args.tolerance,
+                                  [k for k in baseline if k in {f"startup[{n}]" for n in names}])
+    if regressions:
+        print(f"Регрессии старта: {', '.join(regressions)}")
+    if failures:
+        return 1
+    if harness.missing_baseline(baseline, BASELINE_FILE):
+        return 2
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+"""
+Локальные заглушки платформ для бенчмарков.
+
+Один HTTP-сервер обслуживает все маршруты:
+  /method/video.save, /method/video.edit, /vk/upload — VK API и сервер загрузки
+  /upload/youtube/v3/videos               — resumable upload YouTube Data API
+  /lbrynet                                — JSON-RPC lbrynet
+  /oauth2/token, /helix/users, /helix/videos — Twitch
+Сервер считает запросы и принятые байты по маршрутам, чтобы бенчмарки могли
+проверять не только время, но и число обращений к API.
+"""
+
+import os
+import sys
+import json
+import stat
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+READ_CHUNK = 1024 * 1024
+
+
+def _helix_duration(seconds):
+    seconds = int(seconds)
+    h, m, s = seconds // 3600, (seconds % 3600) // 60, seconds % 60
+    return f"{h}h{m}m{s}s" if h else f"{m}m{s}s"
+
+
+def make_archives(corpus, user_id="1000", login="benchuser", now=None):
+    """
+    Helix-объекты архивов для корпуса (самый новый первым, как отдаёт Twitch).
+    """
+    now = now or datetime.now(timezone.utc)
+    items = []
+    for i, (video_id, info) in enumerate(sorted(corpus.items(), reverse=True)):
+        created = now - timedelta(days=i + 1)
+        items.append({
+            "id": video_id,
+            "user_id": user_id,
+            "user_login": login,
+            "title": f"Синтетический стрим {video_id}",
+            "created_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "published_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "url": f"https://www.twitch.tv/videos/{video_id}",
+            "duration": _helix_duration(info["duration"]),
+            "type": "archive",
+            "view_count": 0,
+        })
+    return items
+
+
+class StubState:
+    def __init__(self, archives=None, upload_mbps=0.0):
+        self.lock = threading.Lock()
+        self.archives = list(archives or [])
+        self.upload_mbps = upload_mbps
+        self.requests = {}
+        self.bytes_in = {}
+        self.youtube_sessions = {}
+        self.published = {}
+        self.live = None  # объект Helix streams идущего стрима (кейс watch)
+
+    def hit(self, route, nbytes=0):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            self.bytes_in[route] = self.bytes_in.get(route, 0) + nbytes
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.bytes_in.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": dict(self.requests), "bytes_in": dict(self.bytes_in)}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # подставляется в start_stub_server
+
+    def log_message(self, *args):
+        pass
+
+    # --- утилиты ---
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _drain_body(self):
+        """
+        Читает тело запроса целиком (Content-Length или chunked), возвращает число байт.
+        При upload_mbps > 0 эмулирует ограниченный аплинк.
+        """
+        total = 0
+        start = time.monotonic()
+        mbps = self.state.upload_mbps
+
+        def throttle():
+            if mbps > 0:
+                ahead = total / (mbps * 1024 * 1024) - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                remaining = size
+                while remaining:
+                    got = len(self.rfile.read(min(READ_CHUNK, remaining)))
+                    if not got:
+                        return total
+                    remaining -= got
+                    total += got
+                    throttle()
+                self.rfile.readline()
+            return total
+        remaining = int(self.headers.get("Content-Length") or 0)
+        while remaining:
+            got = len(self.rfile.read(min(READ_CHUNK, remaining)))
+            if not got:
+                break
+            remaining -= got
+            total += got
+            throttle()
+        return total
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return {}
+
+    # --- маршрутизация ---
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/method/video.save":
+            self.state.hit("vk.video.save")
+            base = f"http://{self.headers.get('Host')}"
+            return self._send_json({"response": {"upload_url": f"{base}/vk/upload", "video_id": 1}})
+        if url.path == "/method/video.edit":
+            self.state.hit("vk.video.edit")
+            return self._send_json({"response": 1})
+        if url.path == "/helix/users":
+            self.state.hit("helix.users")
+            login = (query.get("login") or ["benchuser"])[0]
+            return self._send_json({"data": [{"id": "1000", "login": login}]})
+        if url.path == "/helix/videos":
+            self.state.hit("helix.videos")
+            return self._helix_videos(query)
+        if url.path == "/helix/streams":
+            self.state.hit("helix.streams")
+            return self._send_json({"data": [self.state.live] if self.state.live else [], "pagination": {}})
+        self.state.hit("404")
+        self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path == "/vk/upload":
+            n = self._drain_body()
+            self.state.hit("vk.upload", n)
+            return self._send_json({"video_id": 1, "size": n})
+        if url.path.endswith("/upload/youtube/v3/videos"):
+            n = self._drain_body()
+            self.state.hit("youtube.init", n)
+            session = uuid.uuid4().hex
+            with self.state.lock:
+                self.state.youtube_sessions[session] = 0
+            base = f"http://{self.headers.get('Host')}"
+            location = f"{base}/upload/youtube/v3/videos?uploadType=resumable&upload_id={session}"
+            return self._send_json({}, headers={"Location": location})
+        if url.path == "/lbrynet":
+            self.state.hit("lbrynet")
+            return self._lbrynet(self._read_json())
+        if url.path == "/oauth2/token":
+            self._drain_body()
+            self.state.hit("twitch.token")
+            return self._send_json({"access_token": "bench-token", "expires_in": 5000000, "token_type": "bearer"})
+        self._drain_body()
+        self.state.hit("404")
+        self._send_json({"error": "not found"}, status=404)
+
+    def do_PUT(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/upload/youtube/v3/videos"):
+            n = self._drain_body()
+            self.state.hit("youtube.upload", n)
+            return self._send_json({"id": f"bench{uuid.uuid4().hex[:8]}", "status": {"uploadStatus": "uploaded"}})
+        self._drain_body()
+        self.state.hit("404")
+        self._send_json({"error": "not found"}, status=404)
+
+    # --- Twitch Helix ---
+    def _helix_videos(self, query):
+        archives = self.state.archives
+        if "id" in query:
+            ids = set(query["id"])
+            data = [v for v in archives if v["id"] in ids]
+            return self._send_json({"data": data, "pagination": {}})
+        first = int((query.get("first") or ["20"])[0])
+        offset = int((query.get("after") or ["0"])[0])
+        data = archives[offset:offset + first]
+        pagination = {"cursor": str(offset + first)} if offset + first < len(archives) else {}
+        return self._send_json({"data": data, "pagination": pagination})
+
+    # --- lbrynet JSON-RPC ---
+    def _lbrynet(self, payload):
+        method = payload.get("method")
+        params = payload.get("params") or {}
+        if method == "status":
+            result = {"startup_status": {c: True for c in ("wallet", "file_manager", "blob_manager", "database")}}
+        elif method == "publish":
+            claim_id = uuid.uuid4().hex[:40]
+            path = params.get("file_path", "")
+            size = os.path.getsize(path) if path and os.path.exists(path) else 0
+            with self.state.lock:
+                self.state.published[claim_id] = size
+            result = {"outputs": [{"claim_id": claim_id}]}
+        elif method == "claim_search":
+            result = {"items": [{"claim_id": params.get("claim_id"), "confirmations": 1}]}
+        elif method == "file_list":
+            result = {"items": [{"status": "finished", "blobs_remaining": 0, "is_fully_reflected": True}]}
+        else:
+            result = {}
+        self._send_json({"jsonrpc": "2.0", "id": payload.get("id"), "result": result})
+
+
+def start_stub_server(archives=None, upload_mbps=0.0, host="127.0.0.1", port=0):
+    """
+    Запускает сервер заглушек в фоновом потоке. Возвращает (server, base_url, state).
+    """
+    state = StubState(archives, upload_mbps)
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}"
+    return server, base_url, state
+
+
+def youtube_service_factory(base_url):
+    """
+    Возвращает функцию-замену get_authenticated_youtube_service, строящую клиент
+    из статического discovery-документа с rootUrl, указывающим на заглушку.
+    """
+    from googleapiclient.discovery import build_from_document
+    from googleapiclient.discovery_cache import get_static_doc
+
+    doc = json.loads(get_static_doc("youtube", "v3"))
+    doc["rootUrl"] = base_url.rstrip("/") + "/"
+    doc["baseUrl"] = doc["rootUrl"] + doc.get("servicePath", "")
+
+    def factory(*args, **kwargs):
+        return build_from_document(doc, developerKey="bench")
+    return factory
+
+
+def _write_executable(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def install_fake_tools(workdir, vod_dir):
+    """
+    Кладёт в рабочую папку заглушку ./TwitchDownloaderCLI/TwitchDownloaderCLI и создаёт
+    bin-папку с no-op `lbrynet` и прозрачным `sudo` (vk.py вызывает `sudo lbrynet start`).
+    Возвращает путь к bin-папке — её нужно добавить в начало PATH.
+    """
+    fake = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_twitchdownloader.py")
+    _write_executable(
+        os.path.join(workdir, "TwitchDownloaderCLI", "TwitchDownloaderCLI"),
+        f'#!/bin/sh\nBENCH_VOD_DIR="{os.path.abspath(vod_dir)}" exec "{sys.executable}" "{fake}" "$@"\n',
+    )
+    bin_dir = os.path.join(workdir, ".bench-bin")
+    _write_executable(os.path.join(bin_dir, "lbrynet"), "#!/bin/sh\nexit 0\n")
+    _write_executable(os.path.join(bin_dir, "sudo"), '#!/bin/sh\nexec "$@"\n')
+    return bin_dir
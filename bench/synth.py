@@ -0,0 +1,97 @@
+"""
+Генерация синтетических VOD (H.264/AAC MP4 с главами) через ffmpeg lavfi.
+
+Видео нарочно маленькое по разрешению и fps: важна длительность и структура файла
+(moov, главы, ключевые кадры), а не картинка. Готовые файлы кешируются по параметрам.
+"""
+
+import os
+import json
+import shutil
+import subprocess
+
+FFMPEG_PATH = shutil.which("ffmpeg") or "/usr/bin/ffmpeg"
+
+# Корпус по умолчанию: id -> (длительность в секундах, число глав).
+# 901 + 902 вместе дают > 11:58 (группировка/конкат), 903 длиннее лимита YouTube (нарезка).
+DEFAULT_CORPUS = {
+    "900000901": (5 * 3600, 4),
+    "900000902": (7 * 3600 + 30 * 60, 5),
+    "900000903": (13 * 3600, 6),
+    "900000904": (2 * 3600, 2),
+}
+
+
+def _chapters_metadata(duration, chapters):
+    content = ";FFMETADATA1\n"
+    step = duration / max(1, chapters)
+    for i in range(chapters):
+        start = int(i * step * 1000)
+        end = int(min(duration, (i + 1) * step) * 1000)
+        content += f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle=Глава {i + 1}\n"
+    return content
+
+
+def make_vod(path, duration, chapters=4, size="96x54", fps=2, gop=None):
+    """
+    Создаёт MP4 длительностью duration секунд с chapters главами.
+    gop — интервал ключевых кадров в кадрах (по умолчанию 2 секунды, как у Twitch).
+    """
+    gop = gop or fps * 2
+    meta = path + ".ffmeta"
+    with open(meta, "w", encoding="utf-8") as f:
+        f.write(_chapters_metadata(duration, chapters))
+    cmd = [
+        FFMPEG_PATH, "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=22050",
+        "-i", meta,
+        "-map", "0:v", "-map", "1:a", "-map_metadata", "2", "-map_chapters", "2",
+        "-t", str(duration),
+        "-c:v", "libx264", "-preset", "ultrafast", "-g", str(gop), "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "32k",
+        path,
+    ]
+    try:
+        subprocess.run(cmd, check=True)
+    finally:
+        if os.path.exists(meta):
+            os.remove(meta)
+    return path
+
+
+def build_corpus(directory, corpus=None, scale=1.0):
+    """
+    Создаёт (или берёт из кеша) корпус VOD в directory. scale < 1 укорачивает все ролики
+    (режим --quick). Возвращает {video_id: {"path", "duration", "chapters"}}.
+    """
+    corpus = corpus or DEFAULT_CORPUS
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, "corpus.json")
+    known = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            known = json.load(f)
+
+    result = {}
+    for video_id, (duration, chapters) in corpus.items():
+        duration = max(10, int(duration * scale))
+        path = os.path.join(directory, f"{video_id}.mp4")
+        entry = {"path": path, "duration": duration, "chapters": chapters}
+        if known.get(video_id) != entry or not os.path.exists(path):
+            print(f"Генерирую {path} ({duration} сек, глав: {chapters})...")
+            make_vod(path, duration, chapters)
+        result[video_id] = entry
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return result
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Генерация синтетических VOD")
+    parser.add_argument("directory")
+    parser.add_argument("--scale", type=float, default=1.0, help="Множитель длительности")
+    args = parser.parse_args()
+    for vid, info in build_corpus(args.directory, scale=args.scale).items():
+        print(vid, info["path"], info["duration"])
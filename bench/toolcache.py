@@ -0,0 +1,226 @@
+"""
+Бенчмарк общего кеша TwitchDownloaderCLI (toolcache): прежняя установка в каждую рабочую
+папку против одного кеша на машину.
+
+    python -m bench.toolcache                       # архив 40 МБ, 4 воркера
+    python -m bench.toolcache --mb 80 --workers 8 --output toolcache.json
+
+Локальный HTTP-сервер отдаёт GitHub API (releases/latest, releases/tags/<версия> с digest
+ассета) и zip с бинарником случайного содержимого. Сравниваются:
+  legacy — каждый воркер в своей папке спрашивает API и качает архив (как было);
+  cold   — воркеры стартуют одновременно с пустым кешем: архив качается один раз;
+  warm   — старт с прогретым кешем, запросов в сеть быть не должно.
+Проверяются и отказы: офлайн без кеша, неверная контрольная сумма и ассет без digest —
+понятная ошибка без частичной установки. Код возврата 1, если какая-то проверка не прошла.
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import zipfile
+import argparse
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench import harness
+
+if harness.ROOT not in sys.path:
+    sys.path.insert(0, harness.ROOT)
+
+import toolcache  # noqa: E402
+
+WORK_DIR = os.path.join(harness.BENCH_DIR, "work", "toolcache")
+VERSION = toolcache.TWITCH_DOWNLOADER_VERSION
+
+
+def make_archive(path, mb):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr(toolcache.BINARY, os.urandom(int(mb * 2 ** 20)))
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def start_server(archive, digest):
+    state = {"requests": 0, "downloads": 0, "digest": digest}
+    asset = toolcache.ASSET_NAME.format(version=VERSION)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _json(self, data):
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            state["requests"] += 1
+            base = f"http://{self.headers['Host']}"
+            if self.path.endswith("/releases/latest") or self.path.endswith(f"/releases/tags/{VERSION}"):
+                self._json({"tag_name": VERSION, "assets": [{
+                    "name": asset, "digest": f"sha256:{state['digest']}" if state["digest"] else None,
+                    "browser_download_url": f"{base}/download/{VERSION}/{asset}"}]})
+            elif self.path.endswith(f"/download/{VERSION}/{asset}"):
+                state["downloads"] += 1
+                self.send_response(200)
+                self.send_header("Content-Length", str(os.path.getsize(archive)))
+                self.end_headers()
+                with open(archive, "rb") as f:
+                    shutil.copyfileobj(f, self.wfile, 2 ** 20)
+            else:
+                self.send_error(404)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", state
+
+
+def legacy_install(workdir, api_url):
+    # прежний ensure_twitch_downloader: API -> urlretrieve в папку -> extractall
+    with urllib.request.urlopen(f"{api_url}/latest") as response:
+        release = json.load(response)
+    url = release["assets"][0]["browser_download_url"]
+    zip_path = os.path.join(workdir, "TwitchDownloaderCLI.zip")
+    urllib.request.urlretrieve(url, zip_path)
+    with zipfile.ZipFile(zip_path, "r") as zf:
+        zf.extractall(os.path.join(workdir, "TwitchDownloaderCLI"))
+    os.remove(zip_path)
+
+
+def in_parallel(func, count):
+    errors = []
+
+    def run(i):
+        try:
+            func(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Общий кеш TwitchDownloaderCLI против установки в каждую папку")
+    parser.add_argument("--mb", type=float, default=40, help="Размер бинарника в архиве, МБ")
+    parser.add_argument("--workers", type=int, default=4, help="Одновременно стартующих воркеров")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    os.makedirs(WORK_DIR)
+    archive = os.path.join(WORK_DIR, "archive.zip")
+    digest = make_archive(archive, args.mb)
+    server, base_url, state = start_server(archive, digest)
+    api_url = f"{base_url}/repos/lay295/TwitchDownloader/releases"
+    cache_root = os.path.join(WORK_DIR, "cache")
+    results = {}
+    failures = []
+
+    def check(ok, message):
+        if not ok:
+            failures.append(message)
+            print(f"--!! {message}")
+
+    def case(name, func):
+        state["requests"] = state["downloads"] = 0
+        res = harness.measure(func)
+        res.update(requests=state["requests"], downloads=state["downloads"])
+        results[f"toolcache[{name}]"] = res
+        print(f"-> {name}: {res['median']:.3f} с, запросов {res['requests']}, скачиваний {res['downloads']}")
+        return res
+
+    os.environ.pop("TOOLCACHE_OFFLINE", None)
+    os.environ.pop("TOOLCACHE_ALLOW_UNVERIFIED", None)
+    with harness.patched(toolcache, CACHE_ROOT=cache_root, RELEASES_API=api_url,
+                         DOWNLOAD_URL=f"{base_url}/download/{{version}}/{toolcache.ASSET_NAME}"):
+        def legacy_worker(i):
+            workdir = os.path.join(WORK_DIR, f"legacy{i}")
+            os.makedirs(workdir, exist_ok=True)
+            legacy_install(workdir, api_url)
+
+        def legacy():
+            errors = in_parallel(legacy_worker, args.workers)
+            check(not errors, f"legacy: {errors[:1]}")
+
+        case("legacy", legacy)
+
+        paths = []
+
+        def cold():
+            errors = in_parallel(lambda i: paths.append(toolcache.twitch_downloader(local_path=None)), args.workers)
+            check(not errors, f"cold: {errors[:1]}")
+
+        res = case("cold", cold)
+        check(res["downloads"] == 1, f"cold: архив скачан {res['downloads']} раз вместо 1")
+        check(len(set(paths)) == 1 and toolcache.verify(), "cold: бинарник в кеше не сходится с manifest.json")
+
+        def warm():
+            for _ in range(args.workers):
+                toolcache.twitch_downloader(local_path=None)
+
+        res = case("warm", warm)
+        check(res["requests"] == 0, f"warm: {res['requests']} запросов в сеть при тёплом кеше")
+
+        os.environ["TOOLCACHE_OFFLINE"] = "1"
+        try:
+            res = case("warm-offline", warm)
+            check(res["requests"] == 0, "warm-offline: запросы в сеть в офлайн-режиме")
+            shutil.rmtree(cache_root)
+            try:
+                toolcache.twitch_downloader(local_path=None)
+                check(False, "offline: без кеша установка не упала")
+            except RuntimeError as e:
+                print(f"-> офлайн без кеша: {e}")
+            check(state["requests"] == 0, "offline: запросы в сеть в офлайн-режиме")
+        finally:
+            os.environ.pop("TOOLCACHE_OFFLINE", None)
+
+        state["digest"] = "0" * 64
+        try:
+            toolcache.twitch_downloader(local_path=None)
+            check(False, "checksum: неверная сумма не остановила установку")
+        except RuntimeError as e:
+            print(f"-> неверная сумма: {e}")
+        check(toolcache.cached(VERSION) is None, "checksum: после неверной суммы в кеше осталась установка")
+
+        state["digest"] = None
+        try:
+            toolcache.twitch_downloader(local_path=None)
+            check(False, "unverified: установка без суммы не упала")
+        except RuntimeError as e:
+            print(f"-> без суммы: {e}")
+        check(toolcache.cached(VERSION) is None, "unverified: без суммы в кеше осталась установка")
+        os.environ["TOOLCACHE_ALLOW_UNVERIFIED"] = "1"
+        try:
+            check(bool(toolcache.twitch_downloader(local_path=None)), "unverified: явное разрешение не помогло")
+        except RuntimeError as e:
+            check(False, f"unverified: явное разрешение не помогло: {e}")
+        finally:
+            os.environ.pop("TOOLCACHE_ALLOW_UNVERIFIED", None)
+    server.shutdown()
+
+    legacy, cold, warm = (results[f"toolcache[{n}]"]["median"] for n in ("legacy", "cold", "warm"))
+    print(f"-> воркеров {args.workers}, архив {os.path.getsize(archive) / 2 ** 20:.0f} МБ: "
+          f"каждый в свою папку {legacy:.2f} с, общий кеш {cold:.2f} с, тёплый старт "
+          f"{warm / args.workers * 1000:.2f} мс на воркер")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
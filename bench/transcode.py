@@ -0,0 +1,89 @@
+"""
+Бенчмарк профиля --transcode: один ffmpeg на всё видео против transcode.transcode (куски
+по ключевым кадрам в параллельных процессах) по числу процессов.
+
+    python -m bench.transcode                          # 10 мин 720p30, 1..число ядер процессов
+    python -m bench.transcode --minutes 60 --workers 1 2 4 8 --profile 480p --output transcode.json
+
+Исходник — синтетический VOD (bench/synth.py) с главами и GOP 2 секунды, как у Twitch.
+Проверяется и результат: длительность должна совпасть с исходником (±1 кадр на кусок),
+главы — сохраниться. Код возврата 1, если это не так.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from bench import harness, synth
+
+if harness.ROOT not in sys.path:
+    sys.path.insert(0, harness.ROOT)
+
+import mp4meta  # noqa: E402
+import transcode  # noqa: E402
+
+WORK_DIR = os.path.join(harness.BENCH_DIR, "work", "transcode")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ускорение перекодирования кусками по числу процессов")
+    parser.add_argument("--minutes", type=float, default=10, help="Длина синтетического VOD, мин")
+    parser.add_argument("--size", default="1280x720", help="Размер кадра исходника")
+    parser.add_argument("--fps", type=int, default=30, help="Частота кадров исходника")
+    parser.add_argument("--profile", default="480p", choices=list(transcode.PROFILES))
+    parser.add_argument("--workers", type=int, nargs="*", help="Числа процессов (по умолчанию 1, 2, 4… до числа ядер)")
+    parser.add_argument("--chunk", type=int, default=transcode.CHUNK, help="Наибольшая длина куска, с")
+    parser.add_argument("--repeat", type=int, default=1, help="Прогонов на вариант")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({1, cores} | {2 ** i for i in range(1, 8) if 2 ** i < cores})
+    seconds = int(args.minutes * 60)
+    ffmpeg = synth.FFMPEG_PATH
+    os.makedirs(WORK_DIR, exist_ok=True)
+    results = {}
+    status = 0
+    with harness.chdir(WORK_DIR):
+        source = f"source_{seconds}s_{args.size}_{args.fps}.mp4"
+        if not os.path.exists(source):
+            synth.make_vod(source, seconds, chapters=4, size=args.size, fps=args.fps)
+        chapters = len(mp4meta.read_chapters(source) or [])
+
+        def serial():
+            subprocess.run([ffmpeg, "-y", "-v", "error", "-i", source, *transcode.video_args(args.profile),
+                            "-c:a", "aac", "-b:a", transcode.PROFILES[args.profile]["audio"], "serial.mp4"],
+                           check=True)
+
+        base = harness.measure(serial, repeat=args.repeat)
+        base["bytes"] = os.path.getsize("serial.mp4")
+        results["transcode[serial]"] = base
+        print(f"-> один ffmpeg: {base['median']:.2f} с (ядер {cores}, VOD {args.minutes:g} мин, "
+              f"{os.path.getsize(source) / 2 ** 20:.0f} МБ -> {base['bytes'] / 2 ** 20:.1f} МБ)")
+        for n in workers:
+            output = f"chunked-{n}.mp4"
+
+            def chunked(n=n, output=output):
+                transcode.transcode(source, output, args.profile, ffmpeg, workers=n, chunk=args.chunk)
+
+            res = harness.measure(chunked, repeat=args.repeat)
+            duration = mp4meta.read_duration(output)
+            kept = len(mp4meta.read_chapters(output) or [])
+            res.update(workers=n, speedup=base["median"] / res["median"], duration=duration,
+                       chapters=kept, bytes=os.path.getsize(output))
+            results[f"transcode[workers={n}]"] = res
+            print(f"-> процессов {n}: {res['median']:.2f} с, ускорение x{res['speedup']:.2f}, "
+                  f"длительность {duration:.2f} с из {seconds}, глав {kept} из {chapters}")
+            if abs(duration - seconds) > 1 or kept != chapters:
+                status = 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
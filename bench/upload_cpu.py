@@ -0,0 +1,124 @@
+"""
+Бенчмарк CPU на загрузку в VK: MultipartEncoder (requests_toolbelt) против
+upload_body.FileMultipartBody (mmap) на локальной заглушке /vk/upload.
+
+    python -m bench.upload_cpu                    # файл 1 ГБ, по 3 прогона
+    python -m bench.upload_cpu --size-mb 4096 --repeat 1 --output upload_cpu.json
+
+Считается процессорное время потока, который отправляет запрос (time.thread_time —
+сервер-заглушка крутится в других потоках и в замер не входит), в пересчёте на 1 ГБ,
+и скорость по wall-clock. Тело оборачивается в bandwidth.ThrottledReader без лимитов,
+как в скриптах. Код возврата 1, если mmap-тело тратит CPU больше MultipartEncoder.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import requests
+
+from bench import harness, stubs
+
+if harness.ROOT not in sys.path:
+    sys.path.insert(0, harness.ROOT)
+
+import bandwidth  # noqa: E402
+import upload_body  # noqa: E402
+
+WORK_DIR = os.path.join(harness.BENCH_DIR, "work", "upload_cpu")
+GB = 1024 ** 3
+MB = 1024 * 1024
+
+
+def make_file(path, size_mb):
+    if os.path.exists(path) and os.path.getsize(path) == size_mb * MB:
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    block = os.urandom(MB)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+    return path
+
+
+def encoder_body(path):
+    from requests_toolbelt import MultipartEncoder
+    f = open(path, "rb")
+    encoder = MultipartEncoder(fields={"video_file": ("video_file", f, "video/mp4")})
+    return encoder, f.close
+
+
+def mmap_body(path):
+    body = upload_body.FileMultipartBody(path)
+    return body, body.close
+
+
+BODIES = {
+    "encoder": encoder_body,
+    "mmap": mmap_body,
+}
+
+
+def upload_once(make_body, path, url, manager):
+    body, close = make_body(path)
+    try:
+        cpu0, t0 = time.thread_time(), time.perf_counter()
+        rsp = requests.post(url, data=bandwidth.ThrottledReader(body, "vk", manager=manager),
+                            headers={"Content-Type": body.content_type})
+        cpu, wall = time.thread_time() - cpu0, time.perf_counter() - t0
+    finally:
+        close()
+    rsp.raise_for_status()
+    return cpu, wall, rsp.json()["size"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CPU на ГБ при multipart-загрузке в VK")
+    parser.add_argument("--size-mb", type=int, default=1024, help="Размер тестового файла, МБ")
+    parser.add_argument("--repeat", type=int, default=3, help="Прогонов на вариант")
+    parser.add_argument("--only", nargs="*", choices=sorted(BODIES), help="Только эти варианты")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    path = make_file(os.path.join(WORK_DIR, f"upload-{args.size_mb}mb.bin"), args.size_mb)
+    server, base_url, state = stubs.start_stub_server()
+    # несуществующий конфиг — лимитов нет, но путь через throttle() тот же, что в скриптах
+    manager = bandwidth.BandwidthManager(config_file=os.path.join(WORK_DIR, "bandwidth.json"))
+    results = {}
+    # ThrottledReader пишет замеры в throughput.json текущей папки — не в историю скриптов
+    with harness.chdir(WORK_DIR):
+        try:
+            for name in args.only or list(BODIES):
+                samples = []
+                for _ in range(max(1, args.repeat)):
+                    cpu, wall, received = upload_once(BODIES[name], path, f"{base_url}/vk/upload", manager)
+                    if received < args.size_mb * MB:
+                        raise RuntimeError(f"{name}: сервер принял {received} байт из {args.size_mb * MB}")
+                    samples.append((cpu, wall))
+                samples.sort()
+                cpu, wall = samples[len(samples) // 2]
+                gb = args.size_mb * MB / GB
+                results[f"upload_cpu[{name}]"] = {
+                    "cpu_s_per_gb": cpu / gb,
+                    "mb_per_s": args.size_mb / wall if wall else 0.0,
+                    "median": cpu,
+                    "runs": len(samples),
+                }
+                print(f"-> {name}: {cpu / gb:.3f} с CPU/ГБ, {args.size_mb / wall:.0f} МБ/с")
+        finally:
+            server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    enc, mm = results.get("upload_cpu[encoder]"), results.get("upload_cpu[mmap]")
+    if enc and mm:
+        print(f"mmap / MultipartEncoder по CPU: {mm['cpu_s_per_gb'] / enc['cpu_s_per_gb']:.2f}")
+        return 1 if mm["cpu_s_per_gb"] > enc["cpu_s_per_gb"] else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Скачивание чата VOD (TwitchDownloaderCLI chatdownload) одновременно со скачиванием видео.
+
+Чат пишется в файл из колонки I таблицы (её заполняет generate_streams_xlsx: <id>.json).
+Если в строке несколько VOD, колонка I относится к первому, остальные получают
+<имя из I>_<id>.json рядом с ним; без колонки — <id>.json в текущей папке.
+
+Чат качается в фоне, пока идёт videodownload того же VOD, поэтому почти не добавляет
+времени строке. Процессов chatdownload одновременно не больше CHAT_WORKERS (при
+скачивании наперёд --schedule expiry строк может быть несколько), и каждый отмечает
+стадию twitch в bandwidth — загрузки уступают ей полосу так же, как скачиванию видео.
+Ошибка чата строку не останавливает: видео загружается, в лог пишется предупреждение.
+
+    job = chat.start(video_id, "1234567.json", TWITCH_DOWNLOADER_PATH)
+    download_twitch_video(...)
+    job.wait()
+
+Рендер чата в видео (chatrender) — один долгий процесс на одном ядре. render_chat режет
+таймлайн чата на куски по времени, рендерит их одновременно (процессы chatrender, не больше
+workers — по умолчанию по числу ядер) и склеивает без перекодирования переданной функцией
+склейки скриптов (concatenate_videos). Каждый кусок начинается на RENDER_LEAD секунд
+раньше своей границы, чтобы окно чата на стыке было уже заполнено; в этой точке ставится
+ключевой кадр, и лишнее отрезается через -c copy ровно по нему.
+
+    python chat.py render 1234567.json 1234567_chat.mp4 [--workers N] [--chunk СЕКУНД]
+"""
+
+import os
+import sys
+import json
+import math
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import bandwidth
+import manifest
+import workspace
+
+CHAT_COLUMN = "I"
+CHAT_WORKERS = 2
+RENDER_CHUNK = 1800  # секунд таймлайна на кусок, не больше
+RENDER_MIN_CHUNK = 300  # короче нет смысла: вступление и запуск процесса дороже
+RENDER_LEAD = 60  # секунд сообщений до начала куска
+# выходные аргументы chatrender по умолчанию + ключевой кадр в конце вступления ({lead})
+RENDER_OUTPUT_ARGS = '-c:v libx264 -preset veryfast -crf 18 -pix_fmt yuv420p -force_key_frames {lead} "{save_path}"'
+
+_slots = threading.BoundedSemaphore(CHAT_WORKERS)
+
+
+def row_chat_files(row, video_ids):
+    """
+    {id VOD: файл чата} для строки таблицы.
+    """
+    value = row[CHAT_COLUMN]
+    first = str(value).strip() if manifest.notna(value) and str(value).strip() else None
+    result = {}
+    for i, video_id in enumerate(video_ids):
+        if first is None:
+            result[video_id] = f"{video_id}.json"
+        elif i == 0:
+            result[video_id] = first
+        else:
+            result[video_id] = f"{os.path.splitext(first)[0]}_{video_id}.json"
+    return result
+
+
+def download_chat(video_id, output_file, cli_path, temp_dir=None):
+    """
+    Скачивает чат в output_file (через временный файл рядом — недокачанный чат не останется
+    под итоговым именем). Уже скачанный чат не перекачивается.
+    """
+    if os.path.exists(output_file):
+        return output_file
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    partial = output_file + ".part.json"
+    command = [cli_path, "chatdownload", "--id", video_id, "-o", partial]
+    if temp_dir:
+        command += ["--temp-path", temp_dir]
+    with _slots, bandwidth.stage("twitch"):
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0 or not os.path.exists(partial):
+        if os.path.exists(partial):
+            os.remove(partial)
+        tail = (result.stdout or "").strip().splitlines()[-1:] or [""]
+        raise RuntimeError(f"chatdownload {video_id} завершился с кодом {result.returncode}: {tail[0]}")
+    os.replace(partial, output_file)
+    return output_file
+
+
+def chat_length(chat_file):
+    """
+    Длина таймлайна чата в секундах (по данным VOD в JSON, иначе по последнему сообщению).
+    """
+    with open(chat_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    video = data.get("video") or {}
+    if video.get("end"):
+        return float(video["end"]) - float(video.get("start") or 0)
+    if video.get("length"):
+        return float(video["length"])
+    return max((float(c.get("content_offset_seconds") or 0) for c in data.get("comments", [])), default=0.0)
+
+
+def render_chunks(length, workers, chunk=RENDER_CHUNK):
+    """
+    [(начало, конец)] кусков: не меньше workers (но не короче RENDER_MIN_CHUNK) и не
+    длиннее chunk — мелкие куски выравнивают загрузку ядер к концу рендера. Один процесс
+    рендерит весь таймлайн целиком.
+    """
+    length = math.ceil(length)
+    if workers <= 1:
+        return [(0, length)]
+    count = max(1, min(workers, math.ceil(length / RENDER_MIN_CHUNK)), math.ceil(length / chunk))
+    size = math.ceil(length / count)
+    return [(i * size, min(length, (i + 1) * size)) for i in range(count) if i * size < length]
+
+
+def _render_range(chat_file, output_file, begin, end, cli_path, ffmpeg_path, work_dir, extra_args=()):
+    start = max(0, begin - RENDER_LEAD)
+    lead = begin - start
+    raw = output_file if not lead else output_file[:-4] + "_lead.mp4"
+    temp_dir = os.path.join(work_dir, os.path.basename(output_file) + ".temp")
+    os.makedirs(temp_dir, exist_ok=True)
+    command = [cli_path, "chatrender", "-i", chat_file, "-o", raw, "-b", str(start), "-e", str(end),
+               "--output-args", RENDER_OUTPUT_ARGS.format(lead=lead, save_path="{save_path}"),
+               "--temp-path", temp_dir, *extra_args]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0 or not os.path.exists(raw):
+        tail = (result.stdout or "").strip().splitlines()[-1:] or [""]
+        raise RuntimeError(f"chatrender {begin}–{end} завершился с кодом {result.returncode}: {tail[0]}")
+    if lead:
+        # вступление отрезается по ключевому кадру — без перекодирования
+        subprocess.run([ffmpeg_path, "-y", "-ss", str(lead), "-i", raw, "-c", "copy", output_file],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.remove(raw)
+    return output_file
+
+
+def render_chat(chat_file, output_file, cli_path, ffmpeg_path, concatenate, workers=None,
+                chunk=RENDER_CHUNK, extra_args=()):
+    """
+    Рендерит чат в output_file кусками параллельно. concatenate(файлы, результат) — склейка
+    скриптов (concatenate_videos). extra_args — дополнительные аргументы chatrender
+    (размер, частота кадров и т.п.).
+    """
+    workers = workers or os.cpu_count() or 1
+    length = chat_length(chat_file)
+    if length <= 0:
+        print(f"-> Чат {chat_file} пуст, рендерить нечего.")
+        return None
+    chunks = render_chunks(length, workers, chunk)
+    stem = os.path.splitext(os.path.basename(output_file))[0]
+    print(f"-> Рендер чата {chat_file}: кусков {len(chunks)}, процессов {min(workers, len(chunks))}")
+    with workspace.Workspace(f"chatrender-{stem}") as job:
+        parts = [job.path(f"chunk{i + 1}.mp4") for i in range(len(chunks))]
+        # процессы chatrender сами грузят ядра; потоки только ждут их
+        with ThreadPoolExecutor(min(workers, len(chunks)), thread_name_prefix="chatrender") as pool:
+            list(pool.map(lambda c: _render_range(chat_file, c[1], *c[0], cli_path, ffmpeg_path, job.dir, extra_args),
+                          zip(chunks, parts)))
+        rendered = job.path(f"{stem}.mp4")
+        if len(parts) == 1:
+            os.replace(parts[0], rendered)
+        else:
+            concatenate(parts, rendered)
+        job.publish(rendered, output_file)
+    return output_file
+
+
+class Job:
+    """
+    Фоновая задача чата (скачивание, рендер); wait() ждёт её, ошибка только пишется в лог.
+    """
+
+    def __init__(self, label, target, *args):
+        self.label = label
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(target, args), name=label, daemon=True)
+
+    def _run(self, target, args):
+        try:
+            target(*args)
+        except Exception as e:
+            self.error = e
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def wait(self):
+        self.thread.join()
+        if self.error is not None:
+            print(f"--!! {self.label}: {self.error}")
+            logging.warning(f"{self.label}: {self.error}")
+            return False
+        return True
+
+
+def start(video_id, output_file, cli_path, temp_dir=None):
+    return Job(f"Чат {video_id} не скачан", download_chat, video_id, output_file, cli_path, temp_dir).start()
+
+
+def rendered_path(chat_file):
+    return os.path.splitext(chat_file)[0] + ".mp4"
+
+
+def start_render(chat_files, cli_path, ffmpeg_path, concatenate, workers=None):
+    """
+    Рендерит скачанные чаты строки в фоне (<имя чата>.mp4): CPU-рендер идёт, пока строка
+    загружается на платформы.
+    """
+    def run():
+        for chat_file in chat_files:
+            if os.path.exists(chat_file) and not os.path.exists(rendered_path(chat_file)):
+                render_chat(chat_file, rendered_path(chat_file), cli_path, ffmpeg_path, concatenate, workers)
+    return Job("Рендер чата не удался", run).start()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Параллельный рендер чата Twitch в видео")
+    sub = parser.add_subparsers(dest="command", required=True)
+    render = sub.add_parser("render")
+    render.add_argument("chat_file")
+    render.add_argument("output_file")
+    render.add_argument("--workers", type=int, help="Процессов chatrender (по умолчанию по числу ядер)")
+    render.add_argument("--chunk", type=int, default=RENDER_CHUNK, help="Наибольшая длина куска, с")
+    render.add_argument("--cli", help="TwitchDownloaderCLI (по умолчанию локальный или из общего кеша)")
+    render.add_argument("--ffmpeg", default="ffmpeg")
+    args, extra = parser.parse_known_args()
+
+    def concat(files, output_file):
+        list_file = f"{output_file}.concat.txt"
+        with open(list_file, "w") as f:
+            for path in files:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        subprocess.run([args.ffmpeg, "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output_file],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        os.remove(list_file)
+
+    import toolcache
+    render_chat(args.chat_file, args.output_file, args.cli or toolcache.twitch_downloader(), args.ffmpeg, concat, args.workers, args.chunk,
+                extra_args=extra)
+    sys.exit(0)
@@ -0,0 +1,247 @@
+"""
+Живой прогноз окончания пачки: ETA всего запуска и время готовности каждой строки.
+
+Работа строки — байты по этапам из плана пачки (plan.build_batch, поле "bytes"): twitch,
+remux, vk/youtube/odysee. Оставшееся время этапа — оставшиеся байты на скорость этапа:
+  - скачивание с Twitch идёт по процентам TwitchDownloaderCLI (video_progress), его
+    скорость в этом запуске видна прямо по ним;
+  - у остальных этапов прогресс — время с начала этапа на throughput.current_rate (идущие
+    передачи ThrottledReader, замеры этого запуска, история throughput.json).
+Прогноз пересчитывается при каждом выводе, поэтому следует за изменением скорости канала.
+Этапы строки идут друг за другом, строки — по порядку (загрузки --tee — одновременно).
+
+    eta.start(batch, rows=[1, 2, 3], tee=False)    # раз в ETA_INTERVAL печатает прогноз
+    with eta.stage(row, "vk"):
+        upload(...)
+    eta.row_done(row)
+    eta.stop()
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import throughput
+
+ETA_INTERVAL = 60.0
+UPLOAD_STAGES = ("vk", "youtube", "odysee")
+MIN_LEFT = 0.02  # идущий этап не считаем законченным раньше времени: минимум 2% объёма
+
+
+def _fmt_left(seconds):
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes} мин"
+    return f"{minutes // 60} ч {minutes % 60:02d} мин"
+
+
+def _fmt_clock(ts):
+    moment = datetime.fromtimestamp(ts)
+    if moment.date() == datetime.now().date():
+        return f"{moment:%H:%M}"
+    return f"{moment:%d.%m %H:%M}"
+
+
+class Forecast:
+    def __init__(self, batch, rows=None, tee=False):
+        self.tee = tee
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.rows = {}
+        self.order = []
+        self.videos = {}  # id VOD -> (строка, размер)
+        for e in batch.get("rows", []):
+            if e["status"] != "ok" or "bytes" not in e or (rows is not None and e["row"] not in rows):
+                continue
+            self.order.append(e["row"])
+            self.rows[e["row"]] = {"bytes": dict(e["bytes"]), "done": set(), "active": {},
+                                   "fractions": {}, "finished": None}
+            if e["bytes"].get("twitch"):
+                for v in e["videos"]:
+                    self.videos[v["id"]] = (e["row"], v["size"])
+        self.initial = self.left()
+
+    # --- события ---
+    def begin(self, row, stage):
+        with self.lock:
+            r = self.rows.get(row)
+            if r is not None and stage not in r["done"]:
+                r["active"].setdefault(stage, time.monotonic())
+
+    def end(self, row, stage):
+        with self.lock:
+            r = self.rows.get(row)
+            if r is not None:
+                r["active"].pop(stage, None)
+                r["done"].add(stage)
+
+    def video_progress(self, video_id, fraction):
+        with self.lock:
+            row, _ = self.videos.get(video_id, (None, 0))
+            r = self.rows.get(row)
+            if r is None:
+                return
+            r["active"].setdefault("twitch", time.monotonic())
+            r["fractions"][video_id] = min(max(fraction, 0.0), 1.0)
+
+    def row_done(self, row):
+        """
+        Строка закончена (или пропущена): оставшиеся её этапы в прогноз больше не входят.
+        """
+        with self.lock:
+            r = self.rows.get(row)
+            if r is not None and r["finished"] is None:
+                r["finished"] = time.time()
+                r["active"].clear()
+
+    # --- прогноз ---
+    def _twitch_done(self, row, r):
+        return sum(size * r["fractions"].get(vid, 0.0)
+                   for vid, (owner, size) in self.videos.items() if owner == row)
+
+    def _rate(self, stage, row=None, r=None, now=None):
+        base = throughput.current_rate(stage)
+        if stage == "twitch" and r is not None and "twitch" in r["active"]:
+            elapsed = now - r["active"]["twitch"]
+            done = self._twitch_done(row, r)
+            if done and elapsed >= throughput.LIVE_MIN_SECONDS:
+                base += throughput.LIVE_WEIGHT * (done / elapsed - base)
+        return base
+
+    def _stage_left(self, row, r, stage, now, rates):
+        nbytes = r["bytes"].get(stage) or 0
+        if not nbytes or stage in r["done"]:
+            return 0.0
+        rate = self._rate(stage, row, r, now) if stage == "twitch" else rates[stage]
+        started = r["active"].get(stage)
+        if started is None:
+            return nbytes / rate
+        if stage == "twitch":
+            done = self._twitch_done(row, r)
+        else:
+            done = (now - started) * rate
+        return max(nbytes - done, nbytes * MIN_LEFT) / rate
+
+    def row_left(self, row, now=None, rates=None):
+        now = now or time.monotonic()
+        r = self.rows[row]
+        if r["finished"] is not None:
+            return 0.0
+        rates = rates or {s: throughput.current_rate(s) for s in {"remux", *UPLOAD_STAGES, *r["bytes"]}}
+        left = self._stage_left(row, r, "twitch", now, rates) + self._stage_left(row, r, "remux", now, rates)
+        uploads = [self._stage_left(row, r, s, now, rates) for s in r["bytes"] if s in UPLOAD_STAGES]
+        if uploads:
+            left += max(uploads) if self.tee else sum(uploads)
+        return left
+
+    def finish_times(self):
+        """
+        [(строка, ожидаемое время готовности)] ещё не законченных строк, по порядку.
+        """
+        now = time.monotonic()
+        stages = {s for r in self.rows.values() for s in r["bytes"]} | {"remux"}
+        rates = {s: throughput.current_rate(s) for s in stages}
+        with self.lock:
+            clock = time.time()
+            result = []
+            for row in self.order:
+                if self.rows[row]["finished"] is not None:
+                    continue
+                clock += self.row_left(row, now, rates)
+                result.append((row, clock))
+            return result
+
+    def left(self):
+        times = self.finish_times()
+        return times[-1][1] - time.time() if times else 0.0
+
+    def line(self):
+        times = self.finish_times()
+        if not times:
+            return None
+        finish = times[-1][1]
+        rows = ", ".join(f"строка {row} к {_fmt_clock(ts)}" for row, ts in times[:3])
+        more = f" и ещё {len(times) - 3}" if len(times) > 3 else ""
+        now = time.monotonic()
+        with self.lock:
+            active = {}
+            for row, r in self.rows.items():
+                if r["finished"] is None:
+                    for s in r["active"]:
+                        active.setdefault(s, self._rate(s, row, r, now))
+        speeds = ", ".join(f"{s} {rate / throughput.MB:.1f} МБ/с" for s, rate in sorted(active.items()))
+        text = (f"ETA: пачка к {_fmt_clock(finish)} (осталось ~{_fmt_left(finish - time.time())}); "
+                f"{rows}{more}")
+        return f"{text}; сейчас {speeds}" if speeds else text
+
+    def summary(self):
+        with self.lock:
+            done = sum(1 for r in self.rows.values() if r["finished"] is not None)
+        spent = time.time() - self.started
+        return (f"Пачка: строк {done} за {_fmt_left(spent)} "
+                f"(прогноз на старте — {_fmt_left(self.initial)})")
+
+
+_active = None
+_stop = threading.Event()
+
+
+def start(batch, rows=None, tee=False, interval=ETA_INTERVAL):
+    """
+    Делает прогноз активным и раз в interval секунд печатает его (0 — не печатать).
+    """
+    global _active
+    _active = Forecast(batch, rows, tee)
+    if not _active.order:
+        _active = None
+        return None
+    _stop.clear()
+    report()
+    if interval:
+        def loop():
+            while not _stop.wait(interval):
+                report()
+        threading.Thread(target=loop, name="eta", daemon=True).start()
+    return _active
+
+
+def stop():
+    global _active
+    _stop.set()
+    if _active is not None:
+        print(_active.summary())
+    _active = None
+
+
+def report():
+    forecast = _active
+    text = forecast.line() if forecast else None
+    if text:
+        print(text)
+
+
+@contextmanager
+def stage(row, name):
+    forecast = _active
+    if forecast is None:
+        yield
+        return
+    forecast.begin(row, name)
+    try:
+        yield
+    finally:
+        forecast.end(row, name)
+
+
+def video_progress(video_id, fraction):
+    forecast = _active
+    if forecast is not None:
+        forecast.video_progress(video_id, fraction)
+
+
+def row_done(row):
+    forecast = _active
+    if forecast is not None:
+        forecast.row_done(row)
+        report()
@@ -0,0 +1,156 @@
+"""
+Одно чтение файла — несколько одновременных загрузок (режим --tee).
+
+Когда один и тот же файл параллельно отдаётся в VK и на YouTube, каждый загрузчик
+читает его сам, и на HDD два последовательных чтения превращаются в случайный доступ.
+FileTee читает файл один раз, блоками по BLOCK_SIZE, в ограниченное окно, а каждая
+загрузка получает свой канал (sink) — файлоподобный объект с read/seek/tell и .len.
+
+Чтение не уходит дальше чем на окно (window_mb) от самого медленного активного канала,
+поэтому одна медленная платформа не затягивает весь файл в память: быстрые каналы
+просто ждут. Канал, чья загрузка упала, закрывается и перестаёт сдерживать остальных.
+
+    tee = filetee.FileTee(path, window_mb=256)
+    vk, yt = tee.sink("vk"), tee.sink("youtube")
+    tee.start()
+    ... загрузки в потоках, каждая закрывает свой канал ...
+    tee.close()
+"""
+
+import io
+import os
+import logging
+import threading
+
+BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_WINDOW_MB = 256
+MB = 1024 * 1024
+
+
+class FileTee:
+    def __init__(self, path, window_mb=DEFAULT_WINDOW_MB, block_size=BLOCK_SIZE):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.block_size = block_size
+        self.max_blocks = max(2, int(window_mb * MB) // block_size)
+        self.total_blocks = -(-self.size // block_size)
+        self.blocks = {}  # номер блока -> bytes
+        self.next_block = 0
+        self.sinks = []
+        self.cond = threading.Condition()
+        self.error = None
+        self.closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sink(self, name):
+        """
+        Новый канал чтения. Все каналы создаются до start().
+        """
+        sink = TeeSink(self, name)
+        with self.cond:
+            self.sinks.append(sink)
+        return sink
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _low_block(self):
+        positions = [s.consumed for s in self.sinks if not s.closed]
+        if not positions:
+            return None
+        return min(positions) // self.block_size
+
+    def _run(self):
+        try:
+            with open(self.path, "rb") as f:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                while True:
+                    with self.cond:
+                        while True:
+                            low = self._low_block()
+                            if self.closed or low is None or self.next_block >= self.total_blocks:
+                                return
+                            # блоки, которые прочитали все активные каналы, больше не нужны
+                            for index in [i for i in self.blocks if i < low]:
+                                del self.blocks[index]
+                            if self.next_block - low < self.max_blocks:
+                                break
+                            self.cond.wait()
+                        index = self.next_block
+                    data = f.read(self.block_size)
+                    if not data:
+                        raise OSError(f"{self.path}: файл короче ожидаемого ({index * self.block_size} байт)")
+                    with self.cond:
+                        self.blocks[index] = data
+                        self.next_block += 1
+                        self.cond.notify_all()
+        except OSError as e:
+            logging.error(f"Ошибка чтения {self.path}: {e}")
+            with self.cond:
+                self.error = e
+                self.cond.notify_all()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.blocks.clear()
+            self.cond.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+class TeeSink:
+    """
+    Канал FileTee. read() отдаёт memoryview по блоку (может вернуть больше запрошенного,
+    но не дальше конца блока); seek назад возможен только в пределах окна.
+    """
+
+    def __init__(self, tee, name):
+        self.tee = tee
+        self.name = name
+        self.len = tee.size
+        self.pos = 0
+        self.consumed = 0  # позиция, до которой данные уже отданы и не нужны этому каналу
+        self.closed = False
+
+    def read(self, size=-1):
+        tee = self.tee
+        if self.closed:
+            raise ValueError(f"канал {self.name} закрыт")
+        if self.pos >= self.len or size == 0:
+            return b""
+        index = self.pos // tee.block_size
+        with tee.cond:
+            self.consumed = self.pos
+            tee.cond.notify_all()
+            while index not in tee.blocks:
+                if tee.error is not None:
+                    raise tee.error
+                if tee.closed or index < tee.next_block:
+                    raise io.UnsupportedOperation(f"канал {self.name}: данные уже вышли из окна чтения")
+                tee.cond.wait()
+            block = tee.blocks[index]
+        start = self.pos - index * tee.block_size
+        self.pos += len(block) - start
+        return memoryview(block)[start:]
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.pos
+        elif whence == os.SEEK_END:
+            offset += self.len
+        self.pos = min(max(0, offset), self.len)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        with self.tee.cond:
+            self.closed = True
+            self.tee.cond.notify_all()
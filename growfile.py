@@ -0,0 +1,84 @@
+"""
+Чтение файла, который ещё дописывается (загрузка в VK по ходу скачивания, --stream-upload).
+
+GrowingFile отдаёт данные по мере записи: read() ждёт новых байт, пока писатель
+(поток скачивания) не завершился, и возвращает b"" только после этого. Длина заранее
+неизвестна, поэтому тело запроса уходит с Transfer-Encoding: chunked.
+
+Загружать растущий файл можно только если уже записанное не изменится: MPEG-TS или
+фрагментированный MP4 (moof). Обычный MP4 (так пишет и TwitchDownloaderCLI) получает moov
+только в конце записи, поэтому --stream-upload сам собирает фрагментированный MP4 из
+кусков VOD (uploader.download_streaming_to_vk).
+
+Новые данные ждутся с нарастающей паузой (waiting.Backoff, от POLL_INITIAL до
+POLL_SECONDS): пока запись идёт быстро, чтение почти не отстаёт.
+"""
+
+import os
+
+import waiting
+
+POLL_SECONDS = 0.5
+POLL_INITIAL = 0.02
+
+
+class GrowingFile:
+    """
+    Файлоподобный объект поверх дописываемого файла. done() — писатель завершился,
+    error() — исключение писателя (None, если всё хорошо).
+    """
+
+    def __init__(self, path, done, error=None, poll=POLL_SECONDS):
+        self.path = path
+        self.done = done
+        self.error = error or (lambda: None)
+        self.backoff = waiting.Backoff(min(POLL_INITIAL, poll), poll)
+        self._file = None
+
+    def _check(self):
+        error = self.error()
+        if error is not None:
+            raise RuntimeError(f"запись {self.path} прервана: {error}")
+
+    def _wait_size(self, size):
+        """
+        Ждёт, пока файл не вырастет до size байт или писатель не завершится.
+        """
+        while True:
+            self._check()
+            finished = self.done()
+            try:
+                current = os.path.getsize(self.path)
+            except OSError:
+                current = 0
+            if current >= size or finished:
+                self.backoff.reset()
+                return current
+            self.backoff.sleep()
+
+    def read(self, size=-1):
+        if self._file is None:
+            self._wait_size(1)
+            self._file = open(self.path, "rb")
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(1024 * 1024)
+                if not chunk:
+                    return b"".join(chunks)
+                chunks.append(chunk)
+        while True:
+            self._check()
+            finished = self.done()
+            data = self._file.read(size)
+            if data or finished:
+                # после завершения писателя read() выше уже видит весь файл
+                self._check()
+                self.backoff.reset()
+                return data
+            self.backoff.sleep()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
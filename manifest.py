@@ -0,0 +1,244 @@
+"""
+Потоковое чтение таблицы стримов (streams.xlsx и альтернативы).
+
+Вместо pd.read_excel на весь лист читаются только строки --start..--end: xlsx открывается
+в read-only режиме openpyxl, csv/jsonl читаются построчно, sqlite — через LIMIT/OFFSET.
+Первая строка файла — заголовок, нумерация строк данных с 1 (как index+1 у pandas).
+
+Строки возвращаются как Row: row.iloc[i] и len(row) работают так же, как у строки
+DataFrame, поэтому _get_link_from_row/_pick_first_nonempty и индексы колонок
+(B => iloc[1] и т.д.) остаются прежними. Пустая ячейка — None.
+
+    python manifest.py streams.xlsx streams.sqlite   # конвертация в другой формат
+"""
+
+import os
+import csv
+import json
+import math
+import sqlite3
+
+SQLITE_TABLE = "streams"
+
+
+def isna(value):
+    return value is None or (isinstance(value, float) and math.isnan(value)) or \
+        (isinstance(value, str) and not value.strip())
+
+
+def notna(value):
+    return not isna(value)
+
+
+class Row:
+    """
+    Компактная запись строки таблицы: номер (с 1), значения ячеек и заголовок.
+    """
+    __slots__ = ("number", "values", "header")
+
+    def __init__(self, number, values, header=()):
+        self.number = number
+        self.values = tuple(values)
+        self.header = header
+
+    @property
+    def iloc(self):
+        return self.values
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.values[key]
+        idx = self.header.index(key) if key in self.header else ord(key.upper()) - ord("A")
+        return self.values[idx] if 0 <= idx < len(self.values) else None
+
+    def text(self, idx):
+        """
+        Значение ячейки строкой ("" для пустой).
+        """
+        value = self.values[idx] if idx < len(self.values) else None
+        return "" if isna(value) else str(value).strip()
+
+    def __repr__(self):
+        return f"Row({self.number}, {self.values!r})"
+
+
+def _clean(value):
+    if isinstance(value, str) and not value.strip():
+        return None
+    return value
+
+
+def _iter_xlsx(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for values in wb.active.iter_rows(values_only=True):
+            yield [_clean(v) for v in values]
+    finally:
+        wb.close()
+
+
+def _iter_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for values in csv.reader(f):
+            yield [_clean(v) for v in values]
+
+
+def _iter_jsonl(path):
+    header = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                if header is None:
+                    header = list(item)
+                    yield header
+                yield [_clean(item.get(k)) for k in header]
+            else:
+                yield [_clean(v) for v in item]
+
+
+def _iter_sqlite(path, offset=0, limit=None):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cur = conn.execute(
+            f"SELECT * FROM {SQLITE_TABLE} ORDER BY rowid LIMIT ? OFFSET ?",
+            (-1 if limit is None else limit, offset)
+        )
+        yield [d[0] for d in cur.description]
+        for values in cur:
+            yield [_clean(v) for v in values]
+    finally:
+        conn.close()
+
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".sqlite", ".sqlite3", ".db"):
+        return "sqlite"
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    return "xlsx"
+
+
+def read_rows(path, start_row=1, end_row=None):
+    """
+    Итерирует Row для строк start_row..end_row (включительно, с 1). Полностью пустые строки
+    в конце файла отбрасываются, как это делает pandas.
+    """
+    start_row = max(1, start_row)
+    fmt = _format(path)
+    if fmt == "sqlite":
+        limit = None if end_row is None else max(0, end_row - start_row + 1)
+        source = _iter_sqlite(path, offset=start_row - 1, limit=limit)
+        first = start_row
+    else:
+        source = {"xlsx": _iter_xlsx, "csv": _iter_csv, "jsonl": _iter_jsonl}[fmt](path)
+        first = 1
+
+    header = None
+    held = []  # пустые строки придерживаем, пока не встретится непустая
+    number = first - 1
+    for values in source:
+        if header is None:
+            header = tuple("" if v is None else str(v) for v in values)
+            continue
+        number += 1
+        if number < start_row:
+            continue
+        if end_row is not None and number > end_row:
+            break
+        if len(values) < len(header):
+            values = list(values) + [None] * (len(header) - len(values))
+        row = Row(number, values, header)
+        if all(isna(v) for v in values):
+            held.append(row)
+            continue
+        yield from held
+        held = []
+        yield row
+    if hasattr(source, "close"):
+        source.close()
+
+
+def count_rows(path):
+    if _format(path) == "sqlite":
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM {SQLITE_TABLE}").fetchone()[0]
+        finally:
+            conn.close()
+    last = 0
+    for row in read_rows(path):
+        last = row.number
+    return last
+
+
+def write_rows(path, header, rows):
+    """
+    Записывает таблицу (заголовок + списки значений) в формат по расширению path.
+    """
+    header = list(header)
+    rows = [list(r) for r in rows]
+    fmt = _format(path)
+    tmp = path + ".tmp"
+    if fmt == "xlsx":
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(header)
+        for r in rows:
+            ws.append(r)
+        wb.save(tmp)
+    elif fmt == "csv":
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows([["" if v is None else v for v in r] for r in rows])
+    elif fmt == "jsonl":
+        with open(tmp, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(dict(zip(header, r)), ensure_ascii=False) + "\n")
+    else:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            cols = ", ".join(f'"{h or f"col{i}"}"' for i, h in enumerate(header))
+            conn.execute(f"CREATE TABLE {SQLITE_TABLE} ({cols})")
+            marks = ", ".join("?" for _ in header)
+            conn.executemany(f"INSERT INTO {SQLITE_TABLE} VALUES ({marks})",
+                             [(r + [None] * len(header))[:len(header)] for r in rows])
+            conn.commit()
+        finally:
+            conn.close()
+    os.replace(tmp, path)
+
+
+def convert(src, dst):
+    header = None
+    rows = []
+    for row in read_rows(src):
+        header = row.header
+        rows.append(list(row.values))
+    if header is None:
+        raise RuntimeError(f"{src}: нет строк для конвертации")
+    write_rows(dst, header, rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print("Использование: python manifest.py ИСТОЧНИК НАЗНАЧЕНИЕ (.xlsx/.csv/.jsonl/.sqlite)")
+        sys.exit(1)
+    n = convert(sys.argv[1], sys.argv[2])
+    print(f"Сконвертировано строк: {n} → {sys.argv[2]}")
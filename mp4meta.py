@@ -0,0 +1,403 @@
+"""
+Чтение длительности, глав и ключевых кадров MP4 без запуска ffprobe.
+
+Разбираем только атомы moov: mvhd (длительность), udta/chpl (главы Nero), текстовую
+дорожку глав QuickTime (tref/chap) и stss/stts видеодорожки (ключевые кадры). Файл
+отображается через mmap; из mdat читаются только сэмплы текстовой дорожки глав (по
+несколько байт на главу), поэтому стоимость не зависит от размера видео. Если файл разобрать не удалось,
+функции возвращают None — вызывающий код откатывается на ffprobe.
+
+append_fragments() дописывает фрагменты (moof/mdat) одного фрагментированного MP4 в конец
+другого со сдвигом времени — так --stream-upload собирает VOD из кусков по ходу скачивания.
+"""
+
+import os
+import mmap
+import struct
+import functools
+
+# Контейнеры, внутрь которых надо спускаться при поиске атомов
+_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"tref", b"edts", b"mvex"}
+
+# результаты probe по (путь, размер, mtime); ограничен, чтобы долгоживущий --watch не копил
+# записи всех когда-либо разобранных файлов
+CACHE_SIZE = 256
+COPY_CHUNK = 1024 * 1024
+
+
+class MP4Error(Exception):
+    pass
+
+
+def _boxes(buf, start, end):
+    """
+    Итерирует атомы в диапазоне [start, end): (тип, начало данных, конец атома).
+    """
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                raise MP4Error("обрезанный заголовок largesize")
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise MP4Error(f"некорректный размер атома {kind!r}")
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find(buf, start, end, *path):
+    """
+    Ищет первый атом по пути вложенности, возвращает (начало данных, конец) или None.
+    """
+    for kind, data, stop in _boxes(buf, start, end):
+        if kind == path[0]:
+            if len(path) == 1:
+                return data, stop
+            return _find(buf, data, stop, *path[1:])
+    return None
+
+
+def _read_mvhd(buf, data):
+    version = buf[data]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", buf, data + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", buf, data + 12)
+        if duration == 0xFFFFFFFF:
+            duration = 0
+    return timescale, duration
+
+
+def _read_mdhd(buf, data):
+    # Формат полей совпадает с mvhd
+    return _read_mvhd(buf, data)
+
+
+def _track_id(buf, trak_start, trak_end):
+    tkhd = _find(buf, trak_start, trak_end, b"tkhd")
+    if not tkhd:
+        return None
+    data = tkhd[0]
+    offset = 20 if buf[data] == 1 else 12
+    return struct.unpack_from(">I", buf, data + offset)[0]
+
+
+def _duration(buf, moov):
+    mvhd = _find(buf, moov[0], moov[1], b"mvhd")
+    if not mvhd:
+        raise MP4Error("нет mvhd")
+    timescale, duration = _read_mvhd(buf, mvhd[0])
+    if not timescale:
+        raise MP4Error("нулевой timescale")
+    if duration:
+        return duration / timescale
+    # Фрагментированный MP4: длительность в mvex/mehd
+    mehd = _find(buf, moov[0], moov[1], b"mvex", b"mehd")
+    if mehd:
+        data = mehd[0]
+        fmt = ">Q" if buf[data] == 1 else ">I"
+        value = struct.unpack_from(fmt, buf, data + 4)[0]
+        if value:
+            return value / timescale
+    raise MP4Error("длительность не указана в moov")
+
+
+def _chapter(index, time_base, start, end, title):
+    num, den = time_base
+    return {
+        "id": index,
+        "time_base": f"{num}/{den}",
+        "start": start,
+        "start_time": f"{start * num / den:.6f}",
+        "end": end,
+        "end_time": f"{end * num / den:.6f}",
+        "tags": {"title": title},
+    }
+
+
+def _decode_title(raw):
+    if raw[:2] in (b"\xfe\xff", b"\xff\xfe"):
+        return raw.decode("utf-16")
+    return raw.decode("utf-8", errors="replace")
+
+
+def _chpl_chapters(buf, moov, duration):
+    chpl = _find(buf, moov[0], moov[1], b"udta", b"chpl")
+    if not chpl:
+        return None
+    pos, end = chpl
+    version = buf[pos]
+    pos += 4
+    if version:
+        pos += 4
+    count = buf[pos]
+    pos += 1
+    starts = []
+    for _ in range(count):
+        start = struct.unpack_from(">Q", buf, pos)[0]
+        length = buf[pos + 8]
+        title = _decode_title(bytes(buf[pos + 9:pos + 9 + length]))
+        pos += 9 + length
+        if pos > end:
+            raise MP4Error("обрезанный chpl")
+        starts.append((start, title))
+    total = int(round(duration * 10_000_000))
+    chapters = []
+    for i, (start, title) in enumerate(starts):
+        stop = starts[i + 1][0] if i + 1 < len(starts) else total
+        chapters.append(_chapter(i, (1, 10_000_000), start, max(start, stop), title))
+    return chapters
+
+
+def _sample_table(buf, stbl):
+    """
+    Возвращает список (смещение в файле, размер, длительность) сэмплов дорожки.
+    """
+    start, end = stbl
+    boxes = {kind: (data, stop) for kind, data, stop in _boxes(buf, start, end)}
+    if b"stts" not in boxes or b"stsz" not in boxes or b"stsc" not in boxes:
+        raise MP4Error("неполная таблица сэмплов")
+
+    data = boxes[b"stts"][0]
+    durations = []
+    for i in range(struct.unpack_from(">I", buf, data + 4)[0]):
+        count, delta = struct.unpack_from(">II", buf, data + 8 + i * 8)
+        durations.extend([delta] * count)
+
+    data = boxes[b"stsz"][0]
+    fixed, count = struct.unpack_from(">II", buf, data + 4)
+    sizes = [fixed] * count if fixed else list(struct.unpack_from(f">{count}I", buf, data + 12))
+
+    if b"stco" in boxes:
+        data = boxes[b"stco"][0]
+        n = struct.unpack_from(">I", buf, data + 4)[0]
+        offsets = list(struct.unpack_from(f">{n}I", buf, data + 8))
+    elif b"co64" in boxes:
+        data = boxes[b"co64"][0]
+        n = struct.unpack_from(">I", buf, data + 4)[0]
+        offsets = list(struct.unpack_from(f">{n}Q", buf, data + 8))
+    else:
+        raise MP4Error("нет смещений чанков")
+
+    data = boxes[b"stsc"][0]
+    entries = [struct.unpack_from(">III", buf, data + 8 + i * 12)
+               for i in range(struct.unpack_from(">I", buf, data + 4)[0])]
+    samples = []
+    sample = 0
+    for i, (first_chunk, per_chunk, _) in enumerate(entries):
+        last_chunk = entries[i + 1][0] - 1 if i + 1 < len(entries) else len(offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            pos = offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if sample >= len(sizes):
+                    break
+                samples.append((pos, sizes[sample], durations[sample] if sample < len(durations) else 0))
+                pos += sizes[sample]
+                sample += 1
+    return samples
+
+
+def _text_track_chapters(buf, moov):
+    traks = [(data, stop) for kind, data, stop in _boxes(buf, moov[0], moov[1]) if kind == b"trak"]
+    chapter_ids = set()
+    for trak in traks:
+        chap = _find(buf, trak[0], trak[1], b"tref", b"chap")
+        if chap:
+            n = (chap[1] - chap[0]) // 4
+            chapter_ids.update(struct.unpack_from(f">{n}I", buf, chap[0]))
+    if not chapter_ids:
+        return None
+    for trak in traks:
+        if _track_id(buf, *trak) not in chapter_ids:
+            continue
+        mdhd = _find(buf, trak[0], trak[1], b"mdia", b"mdhd")
+        stbl = _find(buf, trak[0], trak[1], b"mdia", b"minf", b"stbl")
+        if not mdhd or not stbl:
+            raise MP4Error("дорожка глав без mdhd/stbl")
+        timescale, _ = _read_mdhd(buf, mdhd[0])
+        chapters = []
+        t = 0
+        for i, (pos, size, delta) in enumerate(_sample_table(buf, stbl)):
+            title = ""
+            if size >= 2:
+                length = struct.unpack_from(">H", buf, pos)[0]
+                title = _decode_title(bytes(buf[pos + 2:pos + 2 + min(length, size - 2)]))
+            chapters.append(_chapter(i, (1, timescale), t, t + delta, title))
+            t += delta
+        return chapters
+    return None
+
+
+def _video_keyframes(buf, moov):
+    for kind, data, stop in _boxes(buf, moov[0], moov[1]):
+        if kind != b"trak":
+            continue
+        hdlr = _find(buf, data, stop, b"mdia", b"hdlr")
+        if not hdlr or bytes(buf[hdlr[0] + 8:hdlr[0] + 12]) != b"vide":
+            continue
+        mdhd = _find(buf, data, stop, b"mdia", b"mdhd")
+        stbl = _find(buf, data, stop, b"mdia", b"minf", b"stbl")
+        if not mdhd or not stbl:
+            raise MP4Error("видеодорожка без mdhd/stbl")
+        timescale, _ = _read_mdhd(buf, mdhd[0])
+        boxes = {k: d for k, d, _ in _boxes(buf, *stbl)}
+        if b"stts" not in boxes or not timescale:
+            raise MP4Error("видеодорожка без stts")
+        if b"stss" not in boxes:
+            return None  # все кадры ключевые
+        pos = boxes[b"stss"]
+        sync = struct.unpack_from(f">{struct.unpack_from('>I', buf, pos + 4)[0]}I", buf, pos + 8)
+        # номер сэмпла (с 1) -> время его начала по stts
+        times = []
+        pos = boxes[b"stts"]
+        sample, t, i = 1, 0, 0
+        for e in range(struct.unpack_from(">I", buf, pos + 4)[0]):
+            count, delta = struct.unpack_from(">II", buf, pos + 8 + e * 8)
+            while i < len(sync) and sync[i] < sample + count:
+                times.append((t + (sync[i] - sample) * delta) / timescale)
+                i += 1
+            sample += count
+            t += count * delta
+        return times
+    return None
+
+
+def _parse(buf):
+    moov = _find(buf, 0, len(buf), b"moov")
+    if not moov:
+        raise MP4Error("нет moov")
+    duration = _duration(buf, moov)
+    chapters = _text_track_chapters(buf, moov)
+    if chapters is None:
+        chapters = _chpl_chapters(buf, moov, duration) or []
+    return {"duration": duration, "chapters": chapters}
+
+
+def probe(video_file):
+    """
+    Возвращает {"duration": секунды, "chapters": [...]} или None, если файл не MP4/повреждён.
+    Главы в формате ffprobe -show_chapters. Результат кешируется по (размер, mtime).
+    """
+    try:
+        st = os.stat(video_file)
+    except OSError:
+        return None
+    return _probe(os.path.abspath(video_file), st.st_size, st.st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _probe(path, size, mtime_ns):
+    if size < 8:
+        return None
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return _parse(buf)
+    except (OSError, ValueError, IndexError, struct.error, MP4Error):
+        return None
+
+
+def read_duration(video_file):
+    info = probe(video_file)
+    return info["duration"] if info else None
+
+
+def read_chapters(video_file):
+    info = probe(video_file)
+    return [dict(ch, tags=dict(ch["tags"])) for ch in info["chapters"]] if info else None
+
+
+def read_keyframes(video_file):
+    """
+    Времена ключевых кадров видеодорожки в секундах (по stss/stts, mdat не читается) или
+    None, если файл не разобрался или в нём нет таблицы ключевых кадров.
+    """
+    try:
+        with open(video_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            moov = _find(buf, 0, len(buf), b"moov")
+            return _video_keyframes(buf, moov) if moov else None
+    except (OSError, ValueError, IndexError, struct.error, MP4Error):
+        return None
+
+
+def _timescales(buf, start, end):
+    # {track_id: timescale} дорожек moov
+    scales = {}
+    for kind, data, stop in _boxes(buf, start, end):
+        if kind != b"trak":
+            continue
+        mdhd = _find(buf, data, stop, b"mdia", b"mdhd")
+        if mdhd:
+            scales[_track_id(buf, data, stop)] = _read_mdhd(buf, mdhd[0])[0]
+    return scales
+
+
+def _shift_moof(buf, start, end, timescales, offset, sequence):
+    # сквозной номер фрагмента (mfhd) и tfdt каждой дорожки + offset секунд, на месте
+    for kind, data, stop in _boxes(buf, start, end):
+        if kind == b"mfhd":
+            struct.pack_into(">I", buf, data + 4, sequence)
+        elif kind == b"traf":
+            tfhd = _find(buf, data, stop, b"tfhd")
+            tfdt = _find(buf, data, stop, b"tfdt")
+            if not tfhd or not tfdt:
+                raise MP4Error("фрагмент без tfhd/tfdt")
+            track_id = struct.unpack_from(">I", buf, tfhd[0] + 4)[0]
+            if track_id not in timescales:
+                raise MP4Error(f"дорожки {track_id} нет в moov")
+            fmt = ">Q" if buf[tfdt[0]] == 1 else ">I"
+            value = struct.unpack_from(fmt, buf, tfdt[0] + 4)[0] + round(offset * timescales[track_id])
+            if fmt == ">I" and value > 0xFFFFFFFF:
+                raise MP4Error("tfdt не помещается в 32 бита")
+            struct.pack_into(fmt, buf, tfdt[0] + 4, value)
+
+
+def append_fragments(src, dst, offset=0.0, sequence=0, init=False):
+    """
+    Дописывает фрагментированный MP4 src (ffmpeg -movflags frag_keyframe+empty_moov+default_base_moof)
+    в открытый файл dst: фрагменты сдвигаются на offset секунд, номера фрагментов продолжают
+    sequence. init — первый кусок: копируются и ftyp/moov, у остальных их пропускаем (дорожки
+    кусков одного VOD одинаковые). mdat копируется кусками, не загружаясь в память целиком.
+    Возвращает номер последнего записанного фрагмента.
+    """
+    timescales = {}
+    with open(src, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            size, kind = struct.unpack(">I4s", header)
+            if size == 1:
+                header += f.read(8)
+                size = struct.unpack_from(">Q", header, 8)[0]
+            elif size == 0:
+                size = os.fstat(f.fileno()).st_size - f.tell() + len(header)
+            if size < len(header):
+                raise MP4Error(f"некорректный размер атома {kind!r}")
+            if kind in (b"moov", b"moof"):
+                box = bytearray(header + f.read(size - len(header)))
+                if kind == b"moov":
+                    timescales = _timescales(box, len(header), len(box))
+                    if not init:
+                        continue
+                else:
+                    sequence += 1
+                    _shift_moof(box, len(header), len(box), timescales, offset, sequence)
+                dst.write(box)
+            elif kind == b"mdat" or init:
+                dst.write(header)
+                left = size - len(header)
+                while left > 0:
+                    chunk = f.read(min(COPY_CHUNK, left))
+                    if not chunk:
+                        raise MP4Error(f"обрезанный атом {kind!r}")
+                    dst.write(chunk)
+                    left -= len(chunk)
+            else:
+                f.seek(size - len(header), os.SEEK_CUR)
+    dst.flush()
+    return sequence
@@ -0,0 +1,111 @@
+"""
+Параллельная загрузка частей одной строки на YouTube.
+
+Части после split_single_video раньше уходили по одной (а в yt.py ещё и с паузой 10 с
+после каждой), хотя канал обычно тянет несколько загрузок сразу. upload_parts запускает
+до workers частей одновременно; названия и номера частей вычисляются заранее, а итоги
+возвращаются в порядке частей, поэтому результат не зависит от того, какая часть
+загрузилась первой.
+
+Пауз между загрузками нет, пока API не ответит ограничением частоты (429,
+rateLimitExceeded): тогда Pacer разносит старты загрузок паузой, которая удваивается на
+каждом таком ответе и уменьшается после успешных загрузок, а часть повторяется.
+Исчерпанная дневная квота (quota.is_quota_error) не повторяется.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import quota
+
+PART_WORKERS = 2
+RETRIES = 5
+BASE_DELAY = 10.0
+MAX_DELAY = 300.0
+RATE_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+def is_rate_limit_error(error):
+    """
+    Ответ API «слишком часто» (а не исчерпанная дневная квота).
+    """
+    if quota.is_quota_error(error):
+        return False
+    resp = getattr(error, "resp", None)
+    if getattr(resp, "status", None) == 429:
+        return True
+    content = getattr(error, "content", None) or str(error).encode("utf-8", "replace")
+    return any(reason in content for reason in RATE_REASONS)
+
+
+def retry_after(error):
+    """
+    Retry-After из ответа API в секундах (None, если заголовка нет).
+    """
+    resp = getattr(error, "resp", None)
+    try:
+        return float(resp.get("retry-after")) if resp is not None and resp.get("retry-after") else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class Pacer:
+    """
+    Пауза перед стартом загрузки: ноль, пока не было ограничения частоты.
+    """
+
+    def __init__(self, base=BASE_DELAY, max_delay=MAX_DELAY):
+        self.base = base
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        # пауза под блокировкой: при ограничении частоты старты идут по одному через delay
+        with self.lock:
+            if self.delay:
+                time.sleep(self.delay)
+
+    def backoff(self, error=None):
+        with self.lock:
+            delay = min(self.max_delay, max(self.base, self.delay * 2))
+            self.delay = max(delay, retry_after(error) or 0)
+            return self.delay
+
+    def success(self):
+        with self.lock:
+            self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+
+_pacer = Pacer()
+
+
+def upload_parts(parts, upload, workers=PART_WORKERS, pacer=None, retries=RETRIES):
+    """
+    Загружает части, не больше workers одновременно. parts — задания с уже вычисленными
+    названиями, upload(part) загружает одно. Возвращает [(part, ошибка или None)] в порядке parts.
+    """
+    pacer = pacer or _pacer
+
+    def run(part):
+        for attempt in range(retries + 1):
+            pacer.wait()
+            try:
+                upload(part)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == retries:
+                    return e
+                delay = pacer.backoff(e)
+                logging.warning(f"YouTube ограничил частоту запросов, повтор через {delay:.0f} с: {e}")
+                continue
+            pacer.success()
+            return None
+
+    if workers <= 1 or len(parts) <= 1:
+        results = [run(part) for part in parts]
+    else:
+        with ThreadPoolExecutor(min(workers, len(parts)), thread_name_prefix="yt-part") as pool:
+            results = list(pool.map(run, parts))
+    return list(zip(parts, results))
@@ -0,0 +1,326 @@
+"""
+План запуска: какие строки таблицы и какие VOD будут обработаны, их длительность и размер.
+
+Предполётная проверка (preflight) разрешает все VOD выбранного диапазона --start/--end
+через Helix пачками по 100 и помечает мёртвые строки (удалённые/недоступные VOD) до того,
+как начнётся скачивание.
+
+План пачки (--plan) идёт дальше, ничего не скачивая: раскладывает VOD строк по выходным
+файлам и частям YouTube той же логикой склейки/нарезки, что и настоящий запуск
+(split_boundaries, hour_split_boundaries, group_durations), считает пик диска, время
+этапов по истории скоростей (throughput.json) и укладывание в квоту YouTube. Сохранённый
+план запускается как есть: --from-plan batch_plan.json.
+"""
+
+import os
+import json
+import math
+import time
+from datetime import datetime, timezone
+
+import throughput
+import twitch_api
+import workspace
+
+PLAN_FILE = "plan.json"
+BATCH_PLAN_FILE = "batch_plan.json"
+GROUP_MAX_DURATION = 12 * 3600
+# Средний битрейт source-качества Twitch (видео + аудио) для оценки размера, кбит/с
+DEFAULT_BITRATE_KBPS = 6500
+
+
+def estimate_size(duration, bitrate_kbps=DEFAULT_BITRATE_KBPS):
+    return int(duration * bitrate_kbps * 1000 / 8)
+
+
+def build_plan(rows, videos, bitrate_kbps=DEFAULT_BITRATE_KBPS):
+    """
+    rows — список (номер строки с 1, [url, ...]); videos — {id: объект Helix}.
+    Строка мертва, если хотя бы один её VOD не найден: склейка без него потеряет часть стрима.
+    """
+    plan_rows = []
+    for row_number, urls in rows:
+        items = []
+        for url in urls:
+            vid = twitch_api.video_id_from_url(url)
+            v = videos.get(vid)
+            if v is None:
+                items.append({"id": vid, "url": url, "status": "missing"})
+                continue
+            duration = twitch_api.parse_duration(v.get("duration"))
+            items.append({
+                "id": vid,
+                "url": url,
+                "status": "private" if v.get("viewable") == "private" else "ok",
+                "title": v.get("title", ""),
+                "created_at": v.get("created_at", ""),
+                "duration": duration,
+                "size": estimate_size(duration, bitrate_kbps),
+            })
+        alive = all(i["status"] == "ok" for i in items)
+        plan_rows.append({
+            "row": row_number,
+            "status": "ok" if alive else "dead",
+            "videos": items,
+            "duration": sum(i.get("duration", 0) for i in items),
+            "size": sum(i.get("size", 0) for i in items),
+        })
+    return {
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "bitrate_kbps": bitrate_kbps,
+        "rows": plan_rows,
+    }
+
+
+def preflight(rows, client_id, client_secret, bitrate_kbps=DEFAULT_BITRATE_KBPS):
+    token = twitch_api.get_app_token(client_id, client_secret)
+    ids = [twitch_api.video_id_from_url(url) for _, urls in rows for url in urls]
+    videos = twitch_api.get_videos(ids, client_id, token)
+    return build_plan(rows, videos, bitrate_kbps)
+
+
+def run_preflight(rows, plan_file=PLAN_FILE):
+    """
+    Проверка для main(): печатает сводку и сохраняет план. Возвращает план или None,
+    если Twitch-ключей нет или Helix недоступен (тогда работаем как раньше, без проверки).
+    """
+    client_id, client_secret = twitch_api.get_credentials()
+    if not client_id:
+        print("Preflight пропущен: нет twitch_client_id/twitch_client_secret в config.json или env.")
+        return None
+    try:
+        result = preflight(rows, client_id, client_secret)
+    except Exception as e:
+        print(f"Preflight не удался ({e}), продолжаю без проверки.")
+        return None
+    print_plan(result)
+    save_plan(result, plan_file)
+    return result
+
+
+def dead_rows(plan):
+    return {r["row"] for r in (plan or {}).get("rows", []) if r["status"] != "ok"}
+
+
+def save_plan(plan, path=PLAN_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_plan(path=PLAN_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _fmt_hours(seconds):
+    return f"{seconds / 3600:.1f} ч"
+
+
+# --- логика склейки/нарезки (её же используют скрипты) ---
+
+def split_boundaries(duration, max_dur):
+    """
+    Нарезка uploader.py/uploader-beta.py: части по max_dur, последняя — остаток.
+    [(начало, длительность)] в секундах; одна часть, если резать не нужно.
+    """
+    if duration <= max_dur:
+        return [(0, duration)]
+    parts = int(math.ceil(duration / max_dur))
+    return [(int(i * max_dur), min(max_dur, duration - int(i * max_dur))) for i in range(parts)]
+
+
+def hour_split_boundaries(duration, max_dur):
+    """
+    Нарезка yt.py: на две части — по границе часа около середины, на большее число — равными
+    кусками по целым часам без секунды; остаток — последней частью.
+    """
+    if duration <= max_dur:
+        return [(0, duration)]
+    parts = int(math.ceil(duration / max_dur))
+    if parts == 2:
+        first = math.ceil((duration / 2) / 3600) * 3600 - 1
+        if first > max_dur:
+            first = max_dur - 1
+        points = [first]
+    else:
+        points = [int(math.floor((duration / parts) / 3600)) * 3600 - 1] * (parts - 1)
+    result = []
+    start = 0
+    for length in points:
+        result.append((start, length))
+        start += length
+    if start < duration:
+        result.append((start, duration - start))
+    return result
+
+
+def group_durations(durations, max_duration=GROUP_MAX_DURATION):
+    """
+    Группировка yt.py (smart_group_and_concatenate): подряд идущие VOD склеиваются, пока
+    сумма не превышает max_duration. Возвращает списки индексов.
+    """
+    groups, current, total = [], [], 0
+    for i, duration in enumerate(durations):
+        if total + duration <= max_duration:
+            current.append(i)
+            total += duration
+        else:
+            if current:
+                groups.append(current)
+            current, total = [i], duration
+    if current:
+        groups.append(current)
+    return groups
+
+
+def layout_concat(durations, max_dur):
+    """
+    uploader.py: все VOD строки склеиваются в один файл, он режется split_boundaries.
+    """
+    return [(list(range(len(durations))), split_boundaries(sum(durations), max_dur))]
+
+
+def layout_grouped(durations, max_dur, max_group=GROUP_MAX_DURATION):
+    """
+    yt.py: группы group_durations, каждая режется hour_split_boundaries.
+    """
+    return [(g, hour_split_boundaries(sum(durations[i] for i in g), max_dur))
+            for g in group_durations(durations, max_group)]
+
+
+# --- план пачки (--plan) ---
+
+def build_batch(preflight_plan, layout, names=None, title=None, platforms=("vk", "youtube"),
+                pool=None, channels=None, max_uploads=None, tee=False):
+    """
+    План пачки поверх preflight. layout(длительности VOD строки) -> [(индексы VOD,
+    [(начало, длительность) частей])]; names — {строка: название}; title(название, номер) —
+    название части; pool — youtube_accounts.AccountPool для квоты, channels — {строка: канал}.
+    """
+    rates = throughput.rates()
+    names = names or {}
+    rows = []
+    elapsed = 0.0
+    for r in preflight_plan.get("rows", []):
+        entry = dict(r)
+        rows.append(entry)
+        if r["status"] != "ok":
+            continue
+        videos = r["videos"]
+        durations = [v["duration"] for v in videos]
+        disk = sum(v["size"] for v in videos)
+        remux = 0
+        outputs = []
+        for indexes, bounds in layout(durations):
+            duration = sum(durations[i] for i in indexes)
+            size = sum(videos[i]["size"] for i in indexes)
+            if len(indexes) > 1:
+                remux += size
+                disk += size
+            if len(bounds) > 1:
+                remux += size
+                disk += size
+            parts = [{"start": start, "length": length,
+                      "size": int(size * length / duration) if duration else size}
+                     for start, length in bounds]
+            outputs.append({"videos": [videos[i]["id"] for i in indexes], "duration": duration,
+                            "size": size, "parts": parts})
+        # нумерация частей сквозная по строке, как при загрузке
+        all_parts = [p for o in outputs for p in o["parts"]]
+        name = names.get(r["row"], "")
+        for number, part in enumerate(all_parts, 1):
+            part["title"] = title(name, number) if title and len(all_parts) > 1 else name
+        to_download = sum(v["size"] for v in videos if not os.path.exists(workspace.cache_path(v["id"])))
+        # объём работы по этапам — по нему же считает живой прогноз (eta.py)
+        work = {"twitch": to_download, "remux": remux}
+        work.update((platform, r["size"]) for platform in platforms)
+        seconds = {"download": to_download / rates["twitch"], "remux": remux / rates["remux"]}
+        for platform in platforms:
+            seconds[platform] = r["size"] / (rates.get(platform) or throughput.rate(platform))
+        uploads = [seconds[p] for p in platforms]
+        upload = (max(uploads) if tee else sum(uploads)) if uploads else 0.0
+        seconds["total"] = seconds["download"] + seconds["remux"] + upload
+        elapsed += seconds["total"]
+        entry.update(name=name, outputs=outputs, youtube_parts=len(all_parts), disk_peak=disk,
+                     bytes=work, seconds=seconds, finish_offset=elapsed)
+
+    alive = [e for e in rows if e["status"] == "ok"]
+    deferred = []
+    if pool is not None and "youtube" in platforms:
+        deferred = pool.split_today(
+            [(e["row"], e["youtube_parts"], (channels or {}).get(e["row"])) for e in alive], max_uploads)
+    for e in alive:
+        if "youtube" in platforms:
+            e["youtube"] = "deferred" if e["row"] in deferred else "today"
+    numbers = [e["row"] for e in rows]
+    return {
+        "kind": "batch",
+        "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "bitrate_kbps": preflight_plan.get("bitrate_kbps"),
+        "range": [min(numbers), max(numbers)] if numbers else None,
+        "platforms": list(platforms),
+        "max_uploads": max_uploads,
+        "tee": bool(tee),
+        "rates": {k: round(v / throughput.MB, 2) for k, v in rates.items()},
+        "rows": rows,
+        "totals": {
+            "rows": len(rows),
+            "alive": len(alive),
+            "duration": sum(e["duration"] for e in alive),
+            "size": sum(e["size"] for e in alive),
+            "disk_peak": max((e["disk_peak"] for e in alive), default=0),
+            "youtube_parts": sum(e["youtube_parts"] for e in alive) if "youtube" in platforms else 0,
+            "youtube_deferred_rows": deferred,
+            "seconds": elapsed,
+            "finish": time.time() + elapsed,
+        },
+    }
+
+
+def stale_rows(saved_plan, rows):
+    """
+    Строки, ссылки которых изменились с момента составления плана (или которых в нём нет).
+    """
+    planned = {r["row"]: [v["url"] for v in r["videos"]] for r in saved_plan.get("rows", [])}
+    return {number for number, urls in rows if planned.get(number) != list(urls)}
+
+
+def print_batch(batch):
+    totals = batch["totals"]
+    gb = 1024 ** 3
+    print(f"План: строк {totals['rows']}, к обработке {totals['alive']}, "
+          f"мёртвых {totals['rows'] - totals['alive']}")
+    start = totals["finish"] - totals["seconds"]
+    for e in batch["rows"]:
+        if e["status"] != "ok":
+            continue
+        parts = f", частей YouTube {e['youtube_parts']}" if "youtube" in batch["platforms"] else ""
+        if e.get("youtube") == "deferred":
+            parts += " (после сброса квоты)"
+        finish = datetime.fromtimestamp(start + e["finish_offset"]).strftime("%d.%m %H:%M")
+        print(f"  Строка {e['row']}: {_fmt_hours(e['duration'])}, ~{e['size'] / gb:.1f} ГБ{parts}, "
+              f"диск до {e['disk_peak'] / gb:.1f} ГБ, ~{e['seconds']['total'] / 60:.0f} мин (к {finish})")
+    rates = ", ".join(f"{k} {v:.1f}" for k, v in batch["rates"].items())
+    print(f"  Итого: {_fmt_hours(totals['duration'])}, ~{totals['size'] / gb:.1f} ГБ, "
+          f"пик диска ~{totals['disk_peak'] / gb:.1f} ГБ, время ~{_fmt_hours(totals['seconds'])} "
+          f"(к {datetime.fromtimestamp(totals['finish']):%d.%m %H:%M})")
+    if "youtube" in batch["platforms"]:
+        deferred = totals["youtube_deferred_rows"]
+        note = f", строки {', '.join(map(str, deferred))} — после сброса квоты" if deferred else ""
+        print(f"  Частей YouTube: {totals['youtube_parts']}{note}")
+    print(f"  Скорости этапов, МБ/с: {rates}")
+
+
+def print_plan(plan):
+    rows = plan.get("rows", [])
+    alive = [r for r in rows if r["status"] == "ok"]
+    print(f"Preflight: строк {len(rows)}, готовы {len(alive)}, мёртвых {len(rows) - len(alive)}")
+    for r in rows:
+        if r["status"] != "ok":
+            bad = ", ".join(f"{v['id']} ({v['status']})" for v in r["videos"] if v["status"] != "ok")
+            print(f"  Строка {r['row']}: пропущу — {bad}")
+    total = sum(r["duration"] for r in alive)
+    size_gb = sum(r["size"] for r in alive) / (1024 ** 3)
+    print(f"  Всего к обработке: {_fmt_hours(total)}, ~{size_gb:.1f} ГБ")
@@ -0,0 +1,134 @@
+"""
+Качество скачивания Twitch по площадкам строки (--max-quality ПЛОЩАДКА=КАЧЕСТВО).
+
+Площадка может объявить наибольшее нужное ей качество (зеркалу не нужен 1080p60); профиль
+--transcode тоже ограничивает его высотой профиля. Планировщик plan_row выбирает, какие
+версии VOD скачать (ключ -q TwitchDownloaderCLI) и какую из них получит каждая площадка:
+перебираются все назначения версий, подходящих площадкам, и берётся то, что двигает меньше
+байт — скачивание плюс загрузки (для площадки с профилем — размер перекодированной версии).
+Поэтому одну версию на всех качаем, пока вторая скачанная версия не выходит дешевле, чем
+загружать площадке большую версию или перекодировать её.
+
+Размеры — средние битрейты лесенки Twitch (LADDER) и профилей transcode.PROFILES; у
+источника — plan.DEFAULT_BITRATE_KBPS. Если у VOD нет выбранной версии, TwitchDownloaderCLI
+скачает лучшую — байт будет больше, но строка не сломается.
+
+    caps = quality.parse_caps(["vk=720p"], ("vk", "youtube"))
+    row_plan = quality.plan_row({"vk": (caps.get("vk"), None), "youtube": (None, None)})
+    row_plan["downloads"]                     # ["source", "720p30"]
+    row_plan["sinks"]["vk"]                   # {"rendition": "720p30", "transcode": None}
+"""
+
+import re
+import itertools
+
+import plan
+import transcode
+
+SOURCE = "source"
+# (версия, высота, кадров/с, средний битрейт видео + аудио, кбит/с) — от дешёвой к дорогой
+LADDER = [
+    ("160p30", 160, 30, 300),
+    ("360p30", 360, 30, 700),
+    ("480p30", 480, 30, 1400),
+    ("720p30", 720, 30, 2500),
+    ("720p60", 720, 60, 3500),
+    (SOURCE, 10 ** 4, 60, plan.DEFAULT_BITRATE_KBPS),
+]
+
+
+def parse_quality(value):
+    """
+    (высота, кадров/с) из "720p", "720p60" или "source" (None — источник).
+    """
+    value = str(value).strip().lower()
+    if value == SOURCE:
+        return None
+    m = re.fullmatch(r"(\d+)p(\d+)?", value)
+    if not m:
+        raise ValueError(f"непонятное качество {value!r} (например 480p, 720p60, source)")
+    return int(m.group(1)), int(m.group(2) or 0)
+
+
+def parse_caps(values, sinks):
+    """
+    {площадка: (высота, кадров/с)} из значений --max-quality вида "odysee=480p".
+    """
+    result = {}
+    for value in values or []:
+        sink, _, cap = value.partition("=")
+        sink = sink.strip().lower()
+        if sink not in sinks:
+            raise ValueError(f"--max-quality: неизвестная площадка {sink!r} (есть {', '.join(sinks)})")
+        try:
+            result[sink] = parse_quality(cap)
+        except ValueError as e:
+            raise ValueError(f"--max-quality: {e}")
+    return result
+
+
+def _need(cap, profile):
+    """
+    Наибольшее качество, которое площадке нужно скачать: её предел и высота профиля.
+    """
+    if profile:
+        height = transcode.PROFILES[profile]["height"]
+        cap = (min(cap[0], height), cap[1]) if cap else (height, 0)
+    return cap
+
+
+def _fits(rendition, need):
+    _, height, fps, _ = rendition
+    if need is None:
+        return rendition[0] == SOURCE
+    return height >= need[0] and fps >= need[1]
+
+
+def _upload_kbps(rendition, profile):
+    _, height, _, kbps = rendition
+    if profile and transcode.PROFILES[profile]["height"] < height:
+        return min(kbps, transcode.PROFILES[profile]["kbps"])
+    return kbps
+
+
+def plan_row(sinks):
+    """
+    sinks — {площадка: (предел качества или None, профиль --transcode или None)} активных
+    площадок строки. Возвращает {"downloads": [версии, первая — основная], "sinks":
+    {площадка: {"rendition", "transcode"}}, "kbps": скачивания и загрузки вместе, кбит/с}.
+    """
+    if not sinks:
+        return {"downloads": [SOURCE], "sinks": {}, "kbps": 0}
+    names = list(sinks)
+    options = [[r for r in LADDER if _fits(r, _need(*sinks[name]))] or [LADDER[-1]] for name in names]
+    best = None
+    for combo in itertools.product(*options):
+        downloads = {r[0]: r for r in combo}
+        kbps = sum(r[3] for r in downloads.values())
+        kbps += sum(_upload_kbps(r, sinks[name][1]) for name, r in zip(names, combo))
+        # при равенстве — меньше скачиваний, затем версия получше
+        key = (kbps, len(downloads), -sum(r[3] for r in combo))
+        if best is None or key < best[0]:
+            best = (key, combo)
+    combo = best[1]
+    assigned = {}
+    for name, r in zip(names, combo):
+        profile = sinks[name][1]
+        # версия не выше профиля — перекодировать незачем
+        needs_transcode = profile and transcode.PROFILES[profile]["height"] < r[1]
+        assigned[name] = {"rendition": r[0], "transcode": profile if needs_transcode else None}
+    # основная версия — та, что нужна большинству площадок (при равенстве — лучшая)
+    counts = {}
+    for r in combo:
+        counts[r] = counts.get(r, 0) + 1
+    downloads = [r[0] for r in sorted(counts, key=lambda r: (-counts[r], -r[3]))]
+    return {"downloads": downloads, "sinks": assigned, "kbps": best[0][0]}
+
+
+def describe(row_plan):
+    parts = []
+    for rendition in row_plan["downloads"]:
+        users = [f"{name} → {s['transcode']}" if s["transcode"] else name
+                 for name, s in row_plan["sinks"].items() if s["rendition"] == rendition]
+        parts.append(f"{rendition} ({', '.join(users)})")
+    return "; ".join(parts)
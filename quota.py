@@ -0,0 +1,178 @@
+"""
+Учёт дневной квоты YouTube Data API между запусками.
+
+Квота проекта (по умолчанию 10 000 единиц) сбрасывается в полночь по тихоокеанскому
+времени, videos.insert стоит ~1600 единиц — то есть 6 загрузок в сутки. Потраченное за
+текущие «тихоокеанские сутки» хранится в youtube_quota.json, поэтому запуски по cron
+видят общий остаток. Ответ API quotaExceeded помечает квоту исчерпанной до сброса.
+
+В файле можно поменять daily_quota (если Google поднял квоту проекта) и insert_cost:
+
+    {"daily_quota": 10000, "insert_cost": 1600, "day": "2026-10-19", "used": 3200}
+"""
+
+import os
+import json
+import math
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+QUOTA_FILE = "youtube_quota.json"
+DAILY_QUOTA = 10000
+INSERT_COST = 1600
+QUOTA_REASONS = (b"quotaExceeded", b"dailyLimitExceeded", b"uploadLimitExceeded")
+
+try:
+    from zoneinfo import ZoneInfo
+    PACIFIC = ZoneInfo("America/Los_Angeles")
+except Exception:
+    # нет базы часовых поясов (Windows без tzdata) — PST без перехода на летнее время
+    PACIFIC = timezone(timedelta(hours=-8), "PST")
+
+
+def pacific_now(now=None):
+    return (now or datetime.now(timezone.utc)).astimezone(PACIFIC)
+
+
+def next_reset(now=None):
+    """
+    Ближайшая полночь по тихоокеанскому времени (aware datetime).
+    """
+    local = pacific_now(now)
+    midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time())
+    return midnight.replace(tzinfo=PACIFIC)
+
+
+def is_quota_error(error):
+    """
+    HttpError googleapiclient с исчерпанной дневной квотой (403 quotaExceeded и т.п.).
+    """
+    content = getattr(error, "content", None) or str(error).encode("utf-8", "replace")
+    return any(reason in content for reason in QUOTA_REASONS)
+
+
+class QuotaLedger:
+    def __init__(self, path=QUOTA_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.daily_quota = DAILY_QUOTA
+        self.insert_cost = INSERT_COST
+        self.day = None
+        self.used = 0
+        self._load()
+
+    def _load(self, now=None):
+        data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f) or {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"Не удалось прочитать {self.path}: {e}")
+        self.daily_quota = int(data.get("daily_quota") or DAILY_QUOTA)
+        self.insert_cost = int(data.get("insert_cost") or INSERT_COST)
+        today = pacific_now(now).date().isoformat()
+        self.day = today
+        self.used = int(data.get("used") or 0) if data.get("day") == today else 0
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"daily_quota": self.daily_quota, "insert_cost": self.insert_cost,
+                       "day": self.day, "used": self.used}, f, indent=2)
+        os.replace(tmp, self.path)
+
+    # --- остаток ---
+    def remaining(self, now=None):
+        with self.lock:
+            self._load(now)
+            return max(0, self.daily_quota - self.used)
+
+    def uploads_left(self, now=None):
+        return self.remaining(now) // self.insert_cost
+
+    def per_day(self):
+        return self.daily_quota // self.insert_cost
+
+    # --- списание ---
+    def spend(self, units=None):
+        with self.lock:
+            self._load()
+            self.used += self.insert_cost if units is None else units
+            self._save()
+
+    def exhaust(self):
+        """
+        API ответил quotaExceeded: до сброса считаем квоту потраченной.
+        """
+        with self.lock:
+            self._load()
+            self.used = max(self.used, self.daily_quota)
+            self._save()
+        logging.warning(f"Квота YouTube исчерпана до {next_reset():%d.%m %H:%M %Z}")
+
+    # --- прогноз ---
+    def forecast(self, pending, now=None):
+        """
+        Когда будут загружены pending видео: (дней ожидания, дата по Тихоокеанскому времени)
+        или None, если дневной квоты не хватает даже на одну загрузку.
+        """
+        left = self.uploads_left(now)
+        if pending <= left:
+            return 0, pacific_now(now).date()
+        if not self.per_day():
+            return None
+        days = math.ceil((pending - left) / self.per_day())
+        return days, pacific_now(now).date() + timedelta(days=days)
+
+    def report(self, pending=0):
+        left = self.uploads_left()
+        reset = next_reset()
+        hours = (reset - datetime.now(timezone.utc)).total_seconds() / 3600
+        print(f"Квота YouTube: {self.used}/{self.daily_quota} единиц, загрузок сегодня ещё {left}, "
+              f"сброс через {hours:.1f} ч ({reset:%d.%m %H:%M %Z})")
+        if pending:
+            result = self.forecast(pending)
+            if result is None:
+                print(f"  В очереди {pending} загрузок, но дневной квоты не хватает даже на одну.")
+            elif result[0] == 0:
+                print(f"  В очереди {pending} загрузок — укладываемся в сегодняшнюю квоту.")
+            else:
+                print(f"  В очереди {pending} загрузок, при {self.per_day()} в сутки "
+                      f"разберём к {result[1]:%d.%m.%Y} (через {result[0]} дн.)")
+
+
+def parts_needed(duration, max_duration):
+    """
+    Сколько видео на YouTube даст строка длительностью duration (нарезка по max_duration).
+    """
+    return max(1, math.ceil((duration or 0) / max_duration))
+
+
+def split_today(rows_parts, uploads_left):
+    """
+    rows_parts — [(строка, число загрузок)] в порядке обработки. Возвращает (строки, которые
+    укладываются в сегодняшнюю квоту, отложенные строки). Порядок не нарушается: первая
+    не поместившаяся строка и все после неё откладываются.
+    """
+    today, deferred = [], []
+    for row, parts in rows_parts:
+        if deferred or parts > uploads_left:
+            deferred.append(row)
+            continue
+        uploads_left -= parts
+        today.append(row)
+    return today, deferred
+
+
+_ledger = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = QuotaLedger()
+        return _ledger
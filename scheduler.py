@@ -0,0 +1,184 @@
+"""
+Планировщик скачиваний по сроку удаления VOD на Twitch.
+
+Скачивания идут в фоне в порядке дедлайна (created_at + срок хранения архивов), а загрузка
+на платформы остаётся в порядке таблицы: main() ждёт готовности нужной строки через wait().
+Если скачанных, но ещё не загруженных строк набралось prefetch штук, следующей качается
+строка, которую main() ждёт прямо сейчас, — так буфер на диске ограничен и взаимной
+блокировки не бывает.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+
+RETENTION_DAYS = 7
+DEFAULT_DOWNLOAD_MBPS = 10.0
+
+
+def _parse_ts(value):
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def row_deadlines(plan, retention_days=RETENTION_DAYS):
+    """
+    {номер строки: unix-время удаления самого старого VOD строки} для живых строк плана.
+    """
+    result = {}
+    for r in plan.get("rows", []):
+        stamps = [_parse_ts(v["created_at"]) for v in r["videos"] if v.get("created_at")]
+        if r["status"] == "ok" and stamps:
+            result[r["row"]] = min(stamps) + retention_days * 86400
+    return result
+
+
+def _fmt(ts):
+    return datetime.fromtimestamp(ts).strftime("%d.%m %H:%M")
+
+
+class DownloadScheduler:
+    def __init__(self, rows, deadlines, sizes, download_row, prefetch=3, download_mbps=DEFAULT_DOWNLOAD_MBPS):
+        """
+        rows — номера строк в порядке таблицы; deadlines/sizes — {строка: unix-время/байты};
+        download_row(row) скачивает строку и возвращает её файлы.
+        """
+        self.rows = list(rows)
+        self.deadlines = deadlines
+        self.sizes = sizes
+        self.download_row = download_row
+        self.prefetch = max(1, prefetch)
+        self.pending = sorted(self.rows, key=lambda r: (deadlines.get(r, float("inf")), r))
+        self.results = {}
+        self.errors = {}
+        self.buffered = set()
+        self.wanted = None
+        self.cond = threading.Condition()
+        self.bytes_done = 0
+        self.seconds_done = 0.0
+        self.assumed_bps = download_mbps * 1024 * 1024
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    # --- пропускная способность и риски ---
+    def throughput(self):
+        if self.bytes_done and self.seconds_done > 0:
+            return self.bytes_done / self.seconds_done
+        return self.assumed_bps
+
+    def at_risk(self, now=None):
+        """
+        Строки, которые при текущей скорости скачаются позже своего дедлайна:
+        [(строка, ожидаемое окончание, дедлайн)].
+        """
+        with self.cond:
+            order = list(self.pending)
+        t = now or time.time()
+        bps = self.throughput()
+        risky = []
+        for row in order:
+            t += self.sizes.get(row, 0) / bps
+            deadline = self.deadlines.get(row)
+            if deadline is not None and t > deadline:
+                risky.append((row, t, deadline))
+        return risky
+
+    def report(self):
+        risky = self.at_risk()
+        mbps = self.throughput() / (1024 * 1024)
+        if not risky:
+            logging.info(f"Планировщик: все VOD успевают до удаления (скорость {mbps:.1f} МБ/с)")
+            return risky
+        print(f"!! Под угрозой удаления при {mbps:.1f} МБ/с: {len(risky)} строк(и)")
+        for row, eta, deadline in risky:
+            print(f"   Строка {row}: скачается ~{_fmt(eta)}, удаление {_fmt(deadline)}")
+            logging.warning(f"Строка {row} может не успеть до удаления VOD ({_fmt(deadline)})")
+        return risky
+
+    # --- фоновый поток ---
+    def start(self):
+        order = ", ".join(str(r) for r in self.pending)
+        print(f"Порядок скачивания по сроку удаления: {order}")
+        self.report()
+        self.thread.start()
+        return self
+
+    def _next_row(self):
+        with self.cond:
+            while self.pending and len(self.buffered) >= self.prefetch and self.wanted not in self.pending:
+                self.cond.wait()
+            if not self.pending:
+                return None
+            if len(self.buffered) >= self.prefetch:
+                row = self.wanted
+            else:
+                row = self.pending[0]
+            self.pending.remove(row)
+            return row
+
+    def _run(self):
+        while True:
+            row = self._next_row()
+            if row is None:
+                return
+            started = time.monotonic()
+            try:
+                files = self.download_row(row)
+            except Exception as e:
+                with self.cond:
+                    self.errors[row] = e
+                    self.cond.notify_all()
+                continue
+            elapsed = time.monotonic() - started
+            size = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+            with self.cond:
+                self.results[row] = files
+                self.buffered.add(row)
+                if size and elapsed > 0:
+                    self.bytes_done += size
+                    self.seconds_done += elapsed
+                self.cond.notify_all()
+            if self.pending:
+                self.report()
+
+    # --- API для main() ---
+    def wait(self, row):
+        """
+        Блокирует до окончания скачивания строки; пробрасывает ошибку скачивания.
+        """
+        with self.cond:
+            self.wanted = row
+            self.cond.notify_all()
+            while row not in self.results and row not in self.errors:
+                self.cond.wait()
+            self.wanted = None
+            if row in self.errors:
+                raise self.errors.pop(row)
+            return self.results.pop(row)
+
+    def release(self, row):
+        """
+        Строка загружена и её файлы удалены — освобождаем место в буфере.
+        """
+        with self.cond:
+            self.buffered.discard(row)
+            self.cond.notify_all()
+
+
+
+def plan_sizes(plan):
+    return {r["row"]: r["size"] for r in plan.get("rows", []) if r["status"] == "ok"}
+
+
+def start_for_plan(plan, rows, download_row, retention_days=RETENTION_DAYS, prefetch=3):
+    """
+    Запускает планировщик для живых строк плана. rows — [(номер строки, [url, ...])],
+    download_row(urls) скачивает ссылки строки и возвращает файлы.
+    """
+    urls_by_row = dict(rows)
+    dead = {p["row"] for p in plan.get("rows", []) if p["status"] != "ok"}
+    alive = [r for r, _ in rows if r not in dead]
+    return DownloadScheduler(
+        alive, row_deadlines(plan, retention_days), plan_sizes(plan),
+        lambda row: download_row(urls_by_row[row]), prefetch=prefetch
+    ).start()
@@ -0,0 +1,140 @@
+"""
+История пропускной способности этапов между запусками (для прогнозов --plan).
+
+Этапы: twitch (скачивание), remux (склейка и нарезка ffmpeg -c copy), vk, youtube,
+odysee (загрузки). Для каждого хранится экспоненциальное скользящее среднее скорости
+в throughput.json; пока замеров нет, берутся DEFAULT_MBPS.
+
+    with throughput.timed("twitch", output_file):   # размер берётся по файлу после этапа
+        download(...)
+    throughput.rate("youtube")                      # байт/с
+
+Загрузки на платформы замеряет bandwidth.ThrottledReader (от первого чтения до конца файла).
+Он же сообщает об идущих передачах (progress/finish), и current_rate отвечает скоростью
+текущего запуска: идущие передачи, затем завершённые замеры запуска, затем история —
+по ней живой прогноз (eta.py) следует за изменением скорости канала.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+THROUGHPUT_FILE = "throughput.json"
+MB = 1024 * 1024
+DEFAULT_MBPS = {"twitch": 10.0, "remux": 150.0, "vk": 5.0, "youtube": 5.0, "odysee": 5.0}
+ALPHA = 0.3  # вес нового замера в скользящем среднем
+MIN_BYTES = 8 * MB  # мелкие замеры больше говорят о задержках, чем о скорости
+LIVE_MIN_SECONDS = 3.0  # передача моложе этого ещё не показала свою скорость
+LIVE_WEIGHT = 0.7  # вес скорости идущих передач против замеров запуска/истории
+LIVE_STALE_SECONDS = 30.0  # передача без новых байт дольше этого — брошена, а не идёт
+
+_lock = threading.Lock()
+_run = {}  # этап -> [байт, секунд] завершённых замеров этого запуска
+_live = {}  # ключ передачи -> (этап, начало по monotonic, байт, последнее обновление)
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f) or {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Не удалось прочитать {path}: {e}")
+        return {}
+
+
+def record(stage, nbytes, seconds, path=THROUGHPUT_FILE):
+    """
+    Добавляет замер этапа: nbytes за seconds секунд.
+    """
+    if nbytes < MIN_BYTES or seconds <= 0:
+        return
+    bps = nbytes / seconds
+    with _lock:
+        run = _run.setdefault(stage, [0, 0.0])
+        run[0] += nbytes
+        run[1] += seconds
+        data = _load(path)
+        entry = data.get(stage) or {}
+        old = entry.get("bps")
+        entry["bps"] = bps if not old else old + ALPHA * (bps - old)
+        entry["samples"] = int(entry.get("samples") or 0) + 1
+        entry["updated"] = int(time.time())
+        data[stage] = entry
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить {path}: {e}")
+
+
+def rate(stage, path=THROUGHPUT_FILE):
+    """
+    Ожидаемая скорость этапа, байт/с.
+    """
+    with _lock:
+        entry = _load(path).get(stage) or {}
+    return entry.get("bps") or DEFAULT_MBPS.get(stage, 5.0) * MB
+
+
+def rates(path=THROUGHPUT_FILE):
+    with _lock:
+        data = _load(path)
+    stages = dict.fromkeys(list(DEFAULT_MBPS) + list(data))
+    return {s: (data.get(s) or {}).get("bps") or DEFAULT_MBPS.get(s, 5.0) * MB for s in stages}
+
+
+def progress(key, stage, nbytes, started):
+    """
+    Идущая передача key этапа stage: nbytes байт с момента started (time.monotonic).
+    """
+    with _lock:
+        _live[key] = (stage, started, nbytes, time.monotonic())
+
+
+def finish(key):
+    with _lock:
+        _live.pop(key, None)
+
+
+def live_rate(stage, now=None):
+    """
+    Суммарная скорость идущих передач этапа, байт/с (None — таких нет или они только начались).
+    """
+    now = now or time.monotonic()
+    with _lock:
+        speeds = [n / (now - started) for s, started, n, updated in _live.values()
+                  if s == stage and now - started >= LIVE_MIN_SECONDS and now - updated <= LIVE_STALE_SECONDS]
+    return sum(speeds) if speeds else None
+
+
+def current_rate(stage, path=THROUGHPUT_FILE):
+    """
+    Скорость этапа сейчас, байт/с: замеры этого запуска (или история), подтянутые к скорости
+    идущих передач.
+    """
+    with _lock:
+        run = _run.get(stage)
+    base = run[0] / run[1] if run else rate(stage, path)
+    live = live_rate(stage)
+    return base if live is None else base + LIVE_WEIGHT * (live - base)
+
+
+@contextmanager
+def timed(stage, output_file):
+    """
+    Замеряет этап, результат которого — output_file (размер берётся после этапа).
+    """
+    start = time.monotonic()
+    yield
+    try:
+        size = os.path.getsize(output_file)
+    except OSError:
+        return
+    record(stage, size, time.monotonic() - start)
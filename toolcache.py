@@ -0,0 +1,261 @@
+"""
+Общий кеш внешних инструментов (TwitchDownloaderCLI) для всех скриптов и воркеров.
+
+Версия закреплена: TWITCH_DOWNLOADER_VERSION, переопределяется $TWITCH_DOWNLOADER_VERSION
+("latest" — последний релиз; какой он, спрашиваем GitHub не чаще раза в LATEST_TTL).
+Архив версии один раз качается потоком во временный файл в CACHE_ROOT (по умолчанию
+~/.cache/twitch-uploader) с подсчётом SHA-256 по ходу скачивания. Сумма сверяется с
+закреплённой ($TWITCH_DOWNLOADER_SHA256 или PINNED_SHA256) или, без неё, с digest ассета из
+GitHub API. Если сверить не с чем, установка отказывает ещё до скачивания; поставить
+непроверенный архив можно только явно, $TOOLCACHE_ALLOW_UNVERIFIED=1. Затем бинарник извлекается потоком и папка версии публикуется через os.replace.
+Установка идёт под файловой блокировкой, поэтому одновременно стартующие воркеры качают
+архив один раз.
+
+Тёплый кеш сеть не трогает: путь и размер бинарника берутся из manifest.json версии.
+$TOOLCACHE_OFFLINE=1 — не ходить в сеть никогда, без кеша — понятная ошибка. Локальная
+копия ./TwitchDownloaderCLI/TwitchDownloaderCLI (ручная установка, заглушка бенчмарков)
+по-прежнему имеет приоритет.
+
+    TWITCH_DOWNLOADER_PATH = toolcache.twitch_downloader(TWITCH_DOWNLOADER_PATH)
+    python toolcache.py install [--version 1.55.2]    # прогреть кеш заранее (образ, общий диск)
+    python toolcache.py verify                         # пересчитать SHA-256 установленного
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import logging
+import zipfile
+import tempfile
+
+CACHE_ROOT = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "twitch-uploader")
+LOCAL_PATH = "./TwitchDownloaderCLI/TwitchDownloaderCLI"
+TWITCH_DOWNLOADER_VERSION = "1.55.2"
+# SHA-256 архивов, сверенные вручную; для версии без записи сверяем с digest ассета на GitHub,
+# а без него не ставим вовсе (кроме $TOOLCACHE_ALLOW_UNVERIFIED=1)
+PINNED_SHA256 = {}
+RELEASES_API = "https://api.github.com/repos/lay295/TwitchDownloader/releases"
+ASSET_NAME = "TwitchDownloaderCLI-{version}-Linux-x64.zip"
+DOWNLOAD_URL = "https://github.com/lay295/TwitchDownloader/releases/download/{version}/" + ASSET_NAME
+BINARY = "TwitchDownloaderCLI"
+LATEST_TTL = 24 * 3600
+CHUNK = 1024 * 1024
+
+
+def offline():
+    return os.environ.get("TOOLCACHE_OFFLINE", "").strip().lower() in ("1", "true", "yes")
+
+
+def allow_unverified():
+    return os.environ.get("TOOLCACHE_ALLOW_UNVERIFIED", "").strip().lower() in ("1", "true", "yes")
+
+
+def _tool_dir(version):
+    return os.path.join(CACHE_ROOT, "TwitchDownloaderCLI", version)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def cached(version):
+    """
+    Путь установленного бинарника версии или None (нет, не доустановлен, испорчен размер).
+    """
+    manifest = _read_json(os.path.join(_tool_dir(version), "manifest.json"))
+    if not manifest:
+        return None
+    path = os.path.join(_tool_dir(version), manifest.get("binary", BINARY))
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    return path if size == manifest.get("size") else None
+
+
+def _github(url):
+    import requests
+    response = requests.get(url, timeout=20, headers={"Accept": "application/vnd.github+json"})
+    response.raise_for_status()
+    return response.json()
+
+
+def resolve_version(version=None):
+    version = version or os.environ.get("TWITCH_DOWNLOADER_VERSION") or TWITCH_DOWNLOADER_VERSION
+    if version != "latest":
+        return version
+    state_path = os.path.join(CACHE_ROOT, "TwitchDownloaderCLI", "latest.json")
+    state = _read_json(state_path)
+    if state and (offline() or time.time() - state.get("checked", 0) < LATEST_TTL):
+        return state["version"]
+    if offline():
+        raise RuntimeError("TwitchDownloaderCLI: версия latest ещё не известна, а сеть выключена "
+                           "(TOOLCACHE_OFFLINE) — укажите TWITCH_DOWNLOADER_VERSION")
+    version = _github(f"{RELEASES_API}/latest")["tag_name"]
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    _write_json(state_path, {"version": version, "checked": time.time()})
+    return version
+
+
+def _expected_sha256(version):
+    """
+    (сумма, откуда) — закреплённая или digest ассета GitHub; (None, None), если сверить не с чем.
+    """
+    pinned = os.environ.get("TWITCH_DOWNLOADER_SHA256") or PINNED_SHA256.get(version)
+    if pinned:
+        return pinned.strip().lower(), "закреплённой"
+    try:
+        release = _github(f"{RELEASES_API}/tags/{version}")
+    except Exception as e:
+        logging.warning(f"TwitchDownloaderCLI {version}: не удалось получить digest ассета: {e}")
+        return None, None
+    for asset in release.get("assets", []):
+        digest = asset.get("digest") or ""
+        if asset.get("name") == ASSET_NAME.format(version=version) and digest.startswith("sha256:"):
+            return digest.split(":", 1)[1].lower(), "GitHub"
+    return None, None
+
+
+def _download(url, path):
+    """
+    Качает url потоком в path (не в память), возвращает SHA-256 скачанного.
+    """
+    import requests
+    sha = hashlib.sha256()
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(path, "wb") as f:
+            for chunk in response.iter_content(CHUNK):
+                f.write(chunk)
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _extract(zip_path, target_dir):
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            name = os.path.normpath(info.filename)
+            if info.is_dir():
+                continue
+            if os.path.isabs(name) or name.startswith(".."):
+                raise RuntimeError(f"подозрительный путь в архиве: {info.filename}")
+            output = os.path.join(target_dir, name)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            with zf.open(info) as src, open(output, "wb") as dst:
+                shutil.copyfileobj(src, dst, CHUNK)
+    binary = os.path.join(target_dir, BINARY)
+    if not os.path.exists(binary):
+        raise RuntimeError(f"в архиве нет {BINARY}")
+    os.chmod(binary, 0o755)
+    return binary
+
+
+def _file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def install(version=None):
+    """
+    Ставит версию в кеш (если её там нет) и возвращает путь бинарника.
+    """
+    version = resolve_version(version)
+    tool_dir = _tool_dir(version)
+    os.makedirs(os.path.dirname(tool_dir), exist_ok=True)
+    with open(tool_dir + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        path = cached(version)
+        if path:
+            return path  # поставил другой воркер, пока ждали блокировку
+        if offline():
+            raise RuntimeError(f"TwitchDownloaderCLI {version} нет в кеше {CACHE_ROOT}, а сеть выключена "
+                               f"(TOOLCACHE_OFFLINE): прогрейте кеш командой python toolcache.py install")
+        expected, origin = _expected_sha256(version)
+        if not expected and not allow_unverified():
+            raise RuntimeError(f"TwitchDownloaderCLI {version}: SHA-256 архива не с чем сверить (нет в "
+                               f"PINNED_SHA256 и digest GitHub недоступен) — закрепите сумму в "
+                               f"TWITCH_DOWNLOADER_SHA256 или явно разрешите TOOLCACHE_ALLOW_UNVERIFIED=1")
+        url = DOWNLOAD_URL.format(version=version)
+        print(f"Скачиваю TwitchDownloaderCLI {version} в общий кеш {CACHE_ROOT}...")
+        staging = tempfile.mkdtemp(prefix=f".{version}-", dir=os.path.dirname(tool_dir))
+        try:
+            zip_path = os.path.join(staging, ASSET_NAME.format(version=version))
+            actual = _download(url, zip_path)
+            if expected and actual != expected:
+                raise RuntimeError(f"SHA-256 архива TwitchDownloaderCLI {version} не совпал с {origin} "
+                                   f"суммой: {actual} != {expected}")
+            if not expected:
+                logging.warning(f"TwitchDownloaderCLI {version}: ставлю без сверки SHA-256 "
+                                f"(TOOLCACHE_ALLOW_UNVERIFIED), закрепите его: TWITCH_DOWNLOADER_SHA256={actual}")
+            target = os.path.join(staging, "tool")
+            binary = _extract(zip_path, target)
+            os.remove(zip_path)
+            _write_json(os.path.join(target, "manifest.json"), {
+                "version": version, "url": url, "archive_sha256": actual, "verified": origin,
+                "binary": BINARY, "size": os.path.getsize(binary), "sha256": _file_sha256(binary),
+                "installed": int(time.time()),
+            })
+            # неполная или испорченная прежняя установка
+            if os.path.exists(tool_dir):
+                shutil.rmtree(tool_dir)
+            os.replace(target, tool_dir)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    print(f"TwitchDownloaderCLI {version} установлен.")
+    return os.path.join(tool_dir, BINARY)
+
+
+def verify(version=None):
+    """
+    Пересчитывает SHA-256 установленного бинарника и сверяет с manifest.json.
+    """
+    version = resolve_version(version)
+    manifest = _read_json(os.path.join(_tool_dir(version), "manifest.json"))
+    path = cached(version)
+    return bool(manifest and path and _file_sha256(path) == manifest.get("sha256"))
+
+
+def twitch_downloader(local_path=LOCAL_PATH, version=None):
+    """
+    Путь TwitchDownloaderCLI: локальная копия, иначе закреплённая версия из общего кеша
+    (при первом запуске на машине она туда ставится).
+    """
+    if local_path and os.path.exists(local_path):
+        return local_path
+    version = resolve_version(version)
+    return cached(version) or install(version)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Общий кеш TwitchDownloaderCLI")
+    parser.add_argument("command", choices=["install", "path", "verify"])
+    parser.add_argument("--version", help=f"Версия (по умолчанию {TWITCH_DOWNLOADER_VERSION} или "
+                                          f"$TWITCH_DOWNLOADER_VERSION; latest — последняя)")
+    args = parser.parse_args()
+    if args.command == "install":
+        print(install(args.version))
+    elif args.command == "path":
+        print(cached(resolve_version(args.version)) or "")
+    else:
+        ok = verify(args.version)
+        print("OK" if ok else "НЕ СОВПАДАЕТ или не установлен")
+        sys.exit(0 if ok else 1)
@@ -0,0 +1,136 @@
+"""
+Перекодирование в облегчённую версию для отдельных площадок (профили PROFILES).
+
+Всё остальное в скриптах — -c copy, и размер загрузки задаёт битрейт исходника. Для
+зеркал (Odysee в vk.py, VK) можно загружать меньшую версию: --transcode ПЛОЩАДКА=ПРОФИЛЬ.
+
+Длинное видео кодируется параллельно: оно режется по ключевым кадрам (mp4meta.read_keyframes)
+на куски из целых GOP, куски кодируются одновременно (процессы ffmpeg, не больше workers —
+по умолчанию по числу ядер), звук — отдельным процессом целиком, чтобы на стыках не было
+щелчков AAC. Затем видео склеивается без перекодирования, к нему добавляются звук и главы
+из файла метаданных (create_concat_metadata скриптов) или, без него, из исходника.
+
+    profiles = transcode.parse_sinks(["odysee=720p"], ("vk", "odysee"))
+    transcode.transcode("row.mp4", "row_720p.mp4", "720p", FFMPEG_PATH, metadata_file)
+"""
+
+import os
+import math
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import mp4meta
+import workspace
+
+# kbps — средний битрейт результата на записях стримов (для выбора качества скачивания)
+PROFILES = {
+    "1080p": {"height": 1080, "crf": 23, "preset": "veryfast", "audio": "160k", "kbps": 4500},
+    "720p": {"height": 720, "crf": 23, "preset": "veryfast", "audio": "128k", "kbps": 2200},
+    "480p": {"height": 480, "crf": 25, "preset": "veryfast", "audio": "96k", "kbps": 1000},
+}
+CHUNK = 600  # секунд видео на кусок, не больше
+MIN_CHUNK = 60  # короче нет смысла: запуск ffmpeg и первый GOP дороже
+
+
+def parse_sinks(values, sinks):
+    """
+    {площадка: профиль} из значений --transcode вида "odysee=720p".
+    """
+    result = {}
+    for value in values or []:
+        sink, _, profile = value.partition("=")
+        sink = sink.strip().lower()
+        if sink not in sinks:
+            raise ValueError(f"--transcode: неизвестная площадка {sink!r} (есть {', '.join(sinks)})")
+        if profile not in PROFILES:
+            raise ValueError(f"--transcode: неизвестный профиль {profile!r} (есть {', '.join(PROFILES)})")
+        result[sink] = profile
+    return result
+
+
+def video_args(profile):
+    p = PROFILES[profile]
+    # меньшие исходники не растягиваем
+    return ["-vf", f"scale=-2:'min({p['height']},ih)'", "-c:v", "libx264", "-preset", p["preset"],
+            "-crf", str(p["crf"]), "-pix_fmt", "yuv420p"]
+
+
+def gop_chunks(duration, keyframes, workers, chunk=CHUNK):
+    """
+    [(начало, конец)] кусков по ключевым кадрам: не меньше workers (но не короче MIN_CHUNK)
+    и не длиннее chunk, если позволяют GOP. Без таблицы ключевых кадров — ровно по времени.
+    """
+    if workers <= 1 or duration <= MIN_CHUNK:
+        return [(0.0, duration)]
+    count = max(1, min(workers, math.ceil(duration / MIN_CHUNK)), math.ceil(duration / chunk))
+    size = duration / count
+    bounds = [0.0]
+    for i in range(1, count):
+        target = i * size
+        if keyframes:
+            # ближайший ключевой кадр к ровной границе
+            target = min(keyframes, key=lambda t: abs(t - target))
+        if bounds[-1] < target < duration:
+            bounds.append(target)
+    bounds.append(duration)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _run(command):
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0:
+        tail = (result.stdout or "").strip().splitlines()[-1:] or [""]
+        raise RuntimeError(f"ffmpeg завершился с кодом {result.returncode}: {tail[0]}")
+
+
+def _encode_video(video_file, output_file, begin, end, profile, ffmpeg_path, threads):
+    # -ss перед -i при перекодировании точен; с начала GOP ничего лишнего не декодируется
+    _run([ffmpeg_path, "-y", "-ss", f"{begin:.6f}", "-i", video_file, "-t", f"{end - begin:.6f}",
+          "-map", "0:v:0", "-an", "-sn", "-dn", *video_args(profile), "-threads", str(threads), output_file])
+
+
+def _encode_audio(video_file, output_file, profile, ffmpeg_path):
+    _run([ffmpeg_path, "-y", "-i", video_file, "-map", "0:a:0?", "-vn", "-sn", "-dn",
+          "-c:a", "aac", "-b:a", PROFILES[profile]["audio"], output_file])
+
+
+def transcode(video_file, output_file, profile, ffmpeg_path, metadata_file=None, workers=None, chunk=CHUNK):
+    """
+    Перекодирует video_file профилем profile в output_file кусками параллельно и возвращает
+    его — или video_file, если версия вышла не меньше исходника (грузить её нет смысла).
+    metadata_file — FFMETADATA с главами (create_concat_metadata); без него главы берутся
+    из исходника.
+    """
+    workers = workers or os.cpu_count() or 1
+    duration = mp4meta.read_duration(video_file)
+    if duration is None:
+        raise RuntimeError(f"не удалось прочитать длительность {video_file}")
+    chunks = gop_chunks(duration, mp4meta.read_keyframes(video_file), workers, chunk)
+    processes = min(workers, len(chunks))
+    # на каждый ffmpeg — своя доля ядер, иначе x264 каждого процесса займёт их все
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    stem = os.path.splitext(os.path.basename(output_file))[0]
+    print(f"-> Перекодирую {video_file} в {profile}: кусков {len(chunks)}, процессов {processes}")
+    with workspace.Workspace(f"transcode-{stem}") as job:
+        parts = [job.path(f"chunk{i + 1}.mp4") for i in range(len(chunks))]
+        audio = job.path("audio.m4a")
+        with ThreadPoolExecutor(processes + 1, thread_name_prefix="transcode") as pool:
+            futures = [pool.submit(_encode_audio, video_file, audio, profile, ffmpeg_path)]
+            futures += [pool.submit(_encode_video, video_file, part, begin, end, profile, ffmpeg_path, threads)
+                        for part, (begin, end) in zip(parts, chunks)]
+            for future in futures:
+                future.result()
+        list_file = job.path("chunks.txt")
+        with open(list_file, "w") as f:
+            for part in parts:
+                f.write(f"file '{os.path.abspath(part)}'\n")
+        rendered = job.path(f"{stem}.mp4")
+        command = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", list_file, "-i", audio,
+                   "-i", metadata_file or video_file, "-map", "0:v", "-map", "1:a?",
+                   "-map_metadata", "2", "-map_chapters", "2", "-c", "copy", rendered]
+        _run(command)
+        if os.path.getsize(rendered) >= os.path.getsize(video_file):
+            print(f"-> Версия {profile} не меньше исходника, загружаю {video_file}")
+            return video_file
+        job.publish(rendered, output_file)
+    return output_file
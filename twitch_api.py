@@ -0,0 +1,252 @@
+"""
+Клиент Twitch Helix с кешем app-токена, user_id и состояния синхронизации архивов.
+
+Кеш хранится в twitch_cache.json рядом с config.json: повторные запуски не запрашивают
+новый токен, пока старый не истёк, и не ищут user_id заново.
+"""
+
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+import requests
+
+TWITCH_AUTH_URL = "https://id.twitch.tv/oauth2/token"
+TWITCH_API_URL = "https://api.twitch.tv/helix"
+CACHE_FILE = "twitch_cache.json"
+CONFIG_FILE = "config.json"
+TOKEN_MARGIN = 300  # обновляем токен за 5 минут до истечения
+
+_session = requests.Session()
+_replaced = {}  # отозванный токен -> выданный взамен (вызывающие держат старый)
+
+
+###############################################################################
+# Кеш
+###############################################################################
+
+def load_cache():
+    if os.path.exists(CACHE_FILE):
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            try:
+                return json.load(f)
+            except Exception:
+                return {}
+    return {}
+
+
+def save_cache(cache: dict):
+    tmp = CACHE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, CACHE_FILE)
+
+
+def get_credentials():
+    """
+    client_id/secret из env или config.json без интерактивных вопросов; (None, None) если их нет.
+    """
+    cfg = {}
+    if os.path.exists(CONFIG_FILE):
+        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+            try:
+                cfg = json.load(f) or {}
+            except Exception:
+                cfg = {}
+    client_id = os.getenv("TWITCH_CLIENT_ID") or cfg.get("twitch_client_id")
+    client_secret = os.getenv("TWITCH_CLIENT_SECRET") or cfg.get("twitch_client_secret")
+    if not client_id or not client_secret:
+        return None, None
+    return client_id, client_secret
+
+
+###############################################################################
+# Токен и запросы
+###############################################################################
+
+def get_app_token(client_id, client_secret, force=False):
+    """
+    Возвращает app access token, запрашивая новый только если кешированный истёк.
+    """
+    cache = load_cache()
+    entry = cache.get("tokens", {}).get(client_id)
+    if entry and not force and entry.get("expires_at", 0) - TOKEN_MARGIN > time.time():
+        return entry["access_token"]
+    r = _session.post(
+        TWITCH_AUTH_URL,
+        data={"client_id": client_id, "client_secret": client_secret, "grant_type": "client_credentials"},
+        timeout=30
+    )
+    r.raise_for_status()
+    payload = r.json()
+    cache = load_cache()
+    cache.setdefault("tokens", {})[client_id] = {
+        "access_token": payload["access_token"],
+        "expires_at": time.time() + int(payload.get("expires_in", 0)),
+    }
+    save_cache(cache)
+    return payload["access_token"]
+
+
+def _refresh_token(client_id, token):
+    """
+    Новый токен взамен отвергнутого Helix (401) или None, если взять его не из чего.
+    """
+    stored_id, client_secret = get_credentials()
+    if stored_id != client_id or not client_secret:
+        return None
+    fresh = get_app_token(client_id, client_secret, force=True)
+    _replaced[token] = fresh
+    return fresh
+
+
+def helix_get(path, params, client_id, token):
+    """
+    GET к Helix. При исчерпании лимита (Ratelimit-Remaining: 0) ждёт до Ratelimit-Reset.
+    Токен, отозванный раньше срока из кеша (401), заменяется новым, запрос повторяется раз.
+    """
+    token = _replaced.get(token, token)
+
+    def get(token):
+        return _session.get(
+            f"{TWITCH_API_URL}/{path}",
+            params=params,
+            headers={"Client-ID": client_id, "Authorization": f"Bearer {token}"},
+            timeout=30
+        )
+
+    r = get(token)
+    if r.status_code == 401:
+        fresh = _refresh_token(client_id, token)
+        if fresh:
+            r = get(fresh)
+    r.raise_for_status()
+    if r.headers.get("Ratelimit-Remaining") == "0":
+        reset = float(r.headers.get("Ratelimit-Reset") or 0)
+        time.sleep(max(0.0, reset - time.time()))
+    return r.json()
+
+
+###############################################################################
+# Пользователи и архивы
+###############################################################################
+
+def get_user_id(username, client_id, token):
+    key = username.lower()
+    cache = load_cache()
+    cached = cache.get("users", {}).get(key)
+    if cached:
+        return cached
+    data = helix_get("users", {"login": username}, client_id, token).get("data", [])
+    if not data:
+        raise RuntimeError(f"Пользователь '{username}' не найден в Twitch.")
+    cache = load_cache()
+    cache.setdefault("users", {})[key] = data[0]["id"]
+    save_cache(cache)
+    return data[0]["id"]
+
+
+def fetch_archives(user_id, count, client_id, token, since=None, since_id=None):
+    """
+    Возвращает до `count` архивов (type=archive), отсортированных от старого к новому.
+    Helix отдаёт архивы от нового к старому, поэтому при заданном since (created_at
+    последнего известного архива) или since_id листание останавливается на первом
+    уже известном элементе — ежедневная синхронизация обходится одним запросом.
+    """
+    items = []
+    cursor = None
+    remaining = count
+    # Для инкрементальной синхронизации новых архивов обычно единицы — хватает маленькой страницы
+    page_size = min(20 if (since or since_id) else 100, remaining)
+    while remaining > 0:
+        params = {"user_id": user_id, "first": page_size, "type": "archive"}
+        if cursor:
+            params["after"] = cursor
+        payload = helix_get("videos", params, client_id, token)
+        data = payload.get("data", [])
+        stop = False
+        for v in data:
+            if (since_id and v.get("id") == since_id) or (since and v.get("created_at", "") <= since):
+                stop = True
+                break
+            items.append(v)
+            remaining -= 1
+            if remaining <= 0:
+                break
+        cursor = payload.get("pagination", {}).get("cursor")
+        if stop or not cursor or not data:
+            break
+        page_size = min(100, remaining)
+    return sorted(items[:count], key=lambda x: x.get("created_at", ""))
+
+
+def video_id_from_url(url):
+    url = str(url).strip()
+    if "twitch.tv" not in url:
+        return url
+    return url.split("?")[0].rstrip("/").split("/")[-1]
+
+
+def parse_duration(value):
+    """
+    "3h8m33s" -> секунды.
+    """
+    total = 0
+    number = ""
+    for ch in str(value or ""):
+        if ch.isdigit():
+            number += ch
+        elif ch in "hms" and number:
+            total += int(number) * {"h": 3600, "m": 60, "s": 1}[ch]
+            number = ""
+    return total
+
+
+def get_videos(ids, client_id, token, batch=100):
+    """
+    Разрешает VOD по id пачками по 100 (videos?id=...&id=...). Возвращает {id: объект Helix};
+    удалённых и недоступных id в ответе нет.
+    """
+    ids = list(dict.fromkeys(str(i) for i in ids))
+    found = {}
+    for i in range(0, len(ids), batch):
+        chunk = ids[i:i + batch]
+        try:
+            payload = helix_get("videos", [("id", vid) for vid in chunk], client_id, token)
+        except requests.HTTPError as e:
+            # Helix отвечает 404, если ни одного id из пачки не существует
+            if e.response is not None and e.response.status_code == 404:
+                continue
+            raise
+        for v in payload.get("data", []):
+            found[v["id"]] = v
+    return found
+
+
+def get_sync_state(username):
+    return load_cache().get("sync", {}).get(username.lower(), {})
+
+
+def save_sync_state(username, videos):
+    """
+    Запоминает самый новый архив из videos как точку отсчёта следующей синхронизации.
+    """
+    if not videos:
+        return
+    newest = max(videos, key=lambda v: v.get("created_at", ""))
+    cache = load_cache()
+    cache.setdefault("sync", {})[username.lower()] = {
+        "last_created_at": newest.get("created_at", ""),
+        "last_video_id": newest.get("id", ""),
+        "synced_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    save_cache(cache)
+
+
+def get_stream(user_id, client_id, token):
+    """
+    Идущий стрим пользователя (объект Helix streams) или None, если он не в эфире.
+    """
+    data = helix_get("streams", {"user_id": user_id, "type": "live"}, client_id, token).get("data", [])
+    return data[0] if data else None
@@ -4,23 +4,36 @@
 import os
 import re
 import json
-import math
 import time
 import shutil
-import zipfile
 import argparse
 import logging
-import urllib.request
+import threading
 import subprocess
 from datetime import datetime
 
-import pandas as pd
 import requests
 
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
+import bandwidth
+import chat
+import eta
+import filetee
+import manifest
+import mp4meta
+import partupload
+import plan
+import quality
+import quota
+import scheduler
+import throughput
+import toolcache
+import transcode
+import twitch_api
+import upload_body
+import watch
+import workqueue
+import workspace
+import youtube_accounts
 
 ###############################################################################
 # Константы и пути
@@ -36,6 +49,10 @@ CLIENT_SECRETS_FILE = "client_secret.json"
 TOKEN_FILE = "token.json"
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 MAX_ALLOWED_DURATION = 11 * 3600 + 58 * 60  # 11:58:00
+VK_API_URL = "https://api.vk.ru/method"
+
+# соединения с VK переиспользуются между строками (в режиме --watch — между публикациями)
+_vk_session = requests.Session()
 
 ###############################################################################
 # Конфиг
@@ -83,44 +100,25 @@ def setup_youtube_credentials():
             f.write(client_secret)
 
 ###############################################################################
-# TwitchDownloader: актуальная версия через GitHub API
+# TwitchDownloader: закреплённая версия из общего кеша
 ###############################################################################
 
-def get_latest_twitch_downloader_url():
-    api_url = "https://api.github.com/repos/lay295/TwitchDownloader/releases/latest"
-    response = requests.get(api_url, timeout=30)
-    response.raise_for_status()
-    release_data = response.json()
-    for asset in release_data.get("assets", []):
-        name = asset.get("name", "")
-        if name.endswith("Linux-x64.zip") and name.startswith("TwitchDownloaderCLI-"):
-            return asset["browser_download_url"]
-    raise RuntimeError("Не найден подходящий TwitchDownloaderCLI для Linux x64")
-
 def ensure_twitch_downloader():
-    if not os.path.exists(TWITCH_DOWNLOADER_PATH):
-        os.makedirs(TWITCH_DOWNLOADER_DIR, exist_ok=True)
-        print("Скачиваю TwitchDownloaderCLI (последняя версия)...")
-        url = get_latest_twitch_downloader_url()
-        zip_path = os.path.join(TWITCH_DOWNLOADER_DIR, "TwitchDownloaderCLI.zip")
-        urllib.request.urlretrieve(url, zip_path)
-        with zipfile.ZipFile(zip_path, "r") as zf:
-            zf.extractall(TWITCH_DOWNLOADER_DIR)
-        os.remove(zip_path)
-        # делаем бинарник исполняемым
-        try:
-            os.chmod(TWITCH_DOWNLOADER_PATH, 0o755)
-        except Exception:
-            pass
-        print("TwitchDownloaderCLI загружен!")
+    # локальная ./TwitchDownloaderCLI, иначе общий кеш toolcache (с тёплым кешем — без сети)
+    global TWITCH_DOWNLOADER_PATH
+    TWITCH_DOWNLOADER_PATH = toolcache.twitch_downloader(TWITCH_DOWNLOADER_PATH)
 
 ###############################################################################
 # Вспомогательные функции (ffprobe/ffmpeg)
 ###############################################################################
 
 def get_video_duration(video_file: str) -> float:
+    # Сначала читаем moov напрямую, ffprobe — только если файл не разобрался
+    duration = mp4meta.read_duration(video_file)
+    if duration is not None:
+        return duration
     cmd = [
-        F FPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
+        FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1", video_file
     ]
     result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
@@ -130,6 +128,9 @@ def get_video_duration(video_file: str) -> float:
         return 0.0
 
 def get_chapters(video_file: str):
+    chapters = mp4meta.read_chapters(video_file)
+    if chapters is not None:
+        return chapters
     cmd = [FFPROBE_PATH, "-v", "quiet", "-print_format", "json", "-show_chapters", video_file]
     result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     try:
@@ -153,7 +154,7 @@ def create_description_from_chapters(chapters) -> str:
         lines.append(f"{ts} - {title}")
     return "\n".join(lines)
 
-def create_concat_metadata(video_files):
+def create_concat_metadata(video_files, meta_file="concat_metadata.txt"):
     cumulative = 0.0
     all_ch = []
     for vf in video_files:
@@ -170,40 +171,86 @@ def create_concat_metadata(video_files):
         end = int(float(ch["end_time"]) * 1000)
         title = ch.get("tags", {}).get("title", "Untitled")
         content += f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle={title}\n"
-    meta_file = "concat_metadata.txt"
     with open(meta_file, "w", encoding="utf-8") as f:
         f.write(content)
     return meta_file
 
 def concatenate_videos(video_files, output_file, metadata_file=None):
     print("Объединяю файлы...")
-    with open("concat_list.txt", "w", encoding="utf-8") as f:
+    # список лежит рядом с результатом (в папке задания), пути в нём абсолютные
+    list_file = f"{output_file}.concat.txt"
+    with open(list_file, "w", encoding="utf-8") as f:
         for vf in video_files:
-            f.write(f"file '{vf}'\n")
-    cmd = [FFMPEG_PATH, "-f", "concat", "-safe", "0", "-i", "concat_list.txt"]
+            f.write(f"file '{os.path.abspath(vf)}'\n")
+    cmd = [FFMPEG_PATH, "-f", "concat", "-safe", "0", "-i", list_file]
     if metadata_file:
         cmd += ["-i", metadata_file, "-map_metadata", "1"]
     cmd += ["-c", "copy", output_file]
-    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    os.remove("concat_list.txt")
+    with throughput.timed("remux", output_file):
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.remove(list_file)
     if metadata_file and os.path.exists(metadata_file):
         os.remove(metadata_file)
     print(f"Видео объединено в {output_file}")
 
-def split_single_video(video_file, max_dur=MAX_ALLOWED_DURATION):
+def split_single_video(video_file, max_dur=MAX_ALLOWED_DURATION, out_dir=None):
     duration = get_video_duration(video_file)
     if duration <= max_dur:
         return [video_file]
-    parts = int(math.ceil(duration / max_dur))
+    base = os.path.join(out_dir, os.path.basename(video_file[:-4])) if out_dir else video_file[:-4]
     result = []
-    for i in range(parts):
-        start = int(i * max_dur)
-        part = f"{video_file[:-4]}_part{i+1}.mp4"
-        cmd = [FFMPEG_PATH, "-ss", str(start), "-i", video_file, "-t", str(max_dur), "-c", "copy", part]
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        result.append(part)
+    # границы частей — те же, что считает --plan
+    with throughput.timed("remux", video_file):
+        for i, (start, _) in enumerate(plan.split_boundaries(duration, max_dur)):
+            part = f"{base}_part{i+1}.mp4"
+            cmd = [FFMPEG_PATH, "-ss", str(start), "-i", video_file, "-t", str(max_dur), "-c", "copy", part]
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            result.append(part)
     return result
 
+def sink_video(video_file, sink, row_plan, renditions, out_dir=None, video_urls=None):
+    """
+    Файл для площадки по плану строки (quality.plan_row): скачанный файл строки, вторая
+    скачанная версия Twitch или версия профиля --transcode (каждая — одна на строку,
+    renditions — {версия или профиль: файл}). Если вторую версию скачать или перекодировать
+    не вышло, площадка получает файл строки.
+    """
+    entry = row_plan["sinks"].get(sink) or {}
+    rendition, profile = entry.get("rendition"), entry.get("transcode")
+    if rendition and rendition != row_plan["downloads"][0]:
+        if rendition not in renditions:
+            files = []
+            try:
+                files = download_row(video_urls, rendition=rendition)
+                if len(files) > 1:
+                    joined = os.path.join(out_dir or ".", f"concatenated_{rendition}.mp4")
+                    meta = create_concat_metadata(files, f"{joined[:-4]}_metadata.txt")
+                    concatenate_videos(files, joined, meta)
+                    workspace.remove_files(files)
+                    files = [joined]
+                renditions[rendition] = files[0]
+            except Exception as e:
+                workspace.remove_files(files)
+                print(f"--!! Не удалось скачать версию {rendition}, загружаю {video_file}: {e}")
+                logging.error(f"Ошибка скачивания версии {rendition}: {e}")
+                renditions[rendition] = video_file
+        video_file = renditions[rendition]
+    if not profile:
+        return video_file
+    if profile not in renditions:
+        base = os.path.join(out_dir, os.path.basename(video_file[:-4])) if out_dir else video_file[:-4]
+        try:
+            # главы — той же склейкой метаданных, что и при объединении файлов строки
+            meta = create_concat_metadata([video_file], f"{base}_{profile}_metadata.txt")
+            renditions[profile] = transcode.transcode(video_file, f"{base}_{profile}.mp4", profile,
+                                                      FFMPEG_PATH, meta)
+            os.remove(meta)
+        except Exception as e:
+            print(f"--!! Не удалось перекодировать {video_file} в {profile}, загружаю исходник: {e}")
+            logging.error(f"Ошибка перекодирования {video_file} в {profile}: {e}")
+            renditions[profile] = video_file
+    return renditions[profile]
+
 ###############################################################################
 # Twitch API (для -last)
 ###############################################################################
@@ -244,94 +291,119 @@ def _get_twitch_credentials():
     return client_id, client_secret
 
 def _get_twitch_token(client_id, client_secret):
-    r = requests.post(
-        "https://id.twitch.tv/oauth2/token",
-        data={"client_id": client_id, "client_secret": client_secret, "grant_type": "client_credentials"},
-        timeout=30
-    )
-    r.raise_for_status()
-    return r.json()["access_token"]
+    # токен кешируется в twitch_cache.json до истечения expires_in
+    return twitch_api.get_app_token(client_id, client_secret)
 
 def _get_user_id(username, client_id, token):
-    r = requests.get(
-        f"https://api.twitch.tv/helix/users?login={username}",
-        headers={"Client-ID": client_id, "Authorization": f"Bearer {token}"},
-        timeout=30
-    )
-    r.raise_for_status()
-    data = r.json().get("data", [])
-    if not data:
-        raise RuntimeError(f"Пользователь '{username}' не найден в Twitch.")
-    return data[0]["id"]
+    return twitch_api.get_user_id(username, client_id, token)
 
-def _fetch_archives(user_id, count, client_id, token):
+def _fetch_archives(user_id, count, client_id, token, since=None, since_id=None):
     """
     Возвращает до `count` архивов (type=archive), отсортированных от старого к новому.
+    С since/since_id — только архивы новее последнего известного.
     """
-    items = []
-    cursor = None
-    remaining = count
-    while remaining > 0:
-        page_size = min(100, remaining)
-        url = f"https://api.twitch.tv/helix/videos?user_id={user_id}&first={page_size}&type=archive"
-        if cursor:
-            url += f"&after={cursor}"
-        r = requests.get(url, headers={"Client-ID": client_id, "Authorization": f"Bearer {token}"}, timeout=30)
-        r.raise_for_status()
-        payload = r.json()
-        data = payload.get("data", [])
-        items.extend(data)
-        remaining -= len(data)
-        cursor = payload.get("pagination", {}).get("cursor")
-        if not cursor or not data:
-            break
-        # лёгкий троттлинг на всякий случай
-        time.sleep(0.2)
-    # сортируем стабильно от старого к новому
-    return sorted(items[:count], key=lambda x: x.get("created_at", ""))
+    return twitch_api.fetch_archives(user_id, count, client_id, token, since=since, since_id=since_id)
 
-def generate_streams_xlsx(username, count, output_file=STREAMS_FILE):
+MANIFEST_COLUMNS = ["B", "C", "D", "E", "F", "I"]
+
+def _archive_to_row(v):
     """
-    Формирует streams.xlsx с колонками:
     B — URL, C — Title + (DD.MM.YYYY), D — Description (пусто), E — Tags (пусто),
     F — dd-mm-YYYY, I — chat_filename.json
     """
+    title = v.get("title", "")
+    created_at = v.get("created_at", "")
+    original_date = _extract_date_from_title(title) or created_at
+    dt = datetime.fromisoformat(original_date.replace("Z", ""))
+    formatted_title_date = dt.strftime("(%d.%m.%Y)")  # для колонки C
+    excel_date = dt.strftime("%d-%m-%Y")               # для колонки F
+    title_with_date = f"{title} {formatted_title_date}".strip()
+    url = v.get("url") or f"https://www.twitch.tv/videos/{v.get('id')}"
+    chat_json = (url.split("/")[-1] or v.get("id", "unknown")) + ".json"
+    return {
+        "B": url,
+        "C": title_with_date,
+        "D": "",                 # description — пусто (добавишь при желании)
+        "E": "",                 # tags — пусто (через запятую)
+        "F": excel_date,
+        "I": chat_json
+    }
+
+def generate_streams_xlsx(username, count, output_file=STREAMS_FILE):
+    """
+    Формирует streams.xlsx заново из последних `count` архивов (колонки см. _archive_to_row).
+    """
     client_id, client_secret = _get_twitch_credentials()
     token = _get_twitch_token(client_id, client_secret)
     user_id = _get_user_id(username, client_id, token)
     videos = _fetch_archives(user_id, int(count), client_id, token)
 
-    rows = []
-    for v in videos:
-        title = v.get("title", "")
-        created_at = v.get("created_at", "")
-        original_date = _extract_date_from_title(title) or created_at
-        dt = datetime.fromisoformat(original_date.replace("Z", ""))
-        formatted_title_date = dt.strftime("(%d.%m.%Y)")  # для колонки C
-        excel_date = dt.strftime("%d-%m-%Y")               # для колонки F
-        title_with_date = f"{title} {formatted_title_date}".strip()
-        url = v.get("url") or f"https://www.twitch.tv/videos/{v.get('id')}"
-        chat_json = (url.split("/")[-1] or v.get("id", "unknown")) + ".json"
-
-        rows.append({
-            "B": url,
-            "C": title_with_date,
-            "D": "",                 # description — пусто (добавишь при желании)
-            "E": "",                 # tags — пусто (через запятую)
-            "F": excel_date,
-            "I": chat_json
-        })
+    rows = [_archive_to_row(v) for v in videos]
 
     # порядок колонок фиксируем
-    df = pd.DataFrame(rows, columns=["B", "C", "D", "E", "F", "I"])
-    df.to_excel(output_file, index=False, engine="openpyxl")
+    manifest.write_rows(output_file, MANIFEST_COLUMNS, [[r[c] for c in MANIFEST_COLUMNS] for r in rows])
+    twitch_api.save_sync_state(username, videos)
     print(f"Собрано {len(rows)} видео. Таблица сохранена в {output_file}")
 
+def sync_streams_xlsx(username, limit=100, output_file=STREAMS_FILE):
+    """
+    Инкрементальная синхронизация: запрашивает только архивы новее последнего известного
+    и дописывает их в конец существующей таблицы (ручные правки строк сохраняются).
+    Если таблицы ещё нет — создаёт её из последних `limit` архивов.
+    """
+    if not os.path.exists(output_file):
+        return generate_streams_xlsx(username, limit, output_file)
+
+    client_id, client_secret = _get_twitch_credentials()
+    token = _get_twitch_token(client_id, client_secret)
+    user_id = _get_user_id(username, client_id, token)
+    state = twitch_api.get_sync_state(username)
+    videos = _fetch_archives(
+        user_id, int(limit), client_id, token,
+        since=state.get("last_created_at"), since_id=state.get("last_video_id")
+    )
+    append_archives(videos, output_file)
+    twitch_api.save_sync_state(username, videos)
+
+def append_archives(videos, output_file=STREAMS_FILE, include_known=False):
+    """
+    Дописывает в конец таблицы архивы, которых в ней ещё нет. Возвращает {id VOD: номер
+    строки} дописанных, а с include_known — и уже бывших в таблице (повтор публикации).
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(output_file)
+    ws = wb.active
+    header = [c.value for c in ws[1]]
+    known = {}
+    for number, cells in enumerate(ws.iter_rows(min_row=2, values_only=True), start=1):
+        for val in cells:
+            if val and "twitch.tv" in str(val):
+                known.update(dict.fromkeys(str(val).split(), number))
+
+    added = {}
+    rows = {}
+    for v in videos:
+        row = _archive_to_row(v)
+        if row["B"] in known:
+            rows[v.get("id")] = known[row["B"]]
+            continue
+        if all(h in row for h in header if h):
+            ws.append([row.get(h, "") if h else "" for h in header])
+        else:
+            ws.append([row[c] for c in MANIFEST_COLUMNS])
+        known[row["B"]] = ws.max_row - 1
+        added[v.get("id")] = ws.max_row - 1
+    if added:
+        wb.save(output_file)
+    print(f"Новых видео: {len(added)}. Таблица {output_file} содержит {ws.max_row - 1} строк.")
+    return {**rows, **added} if include_known else added
+
 ###############################################################################
 # Загрузка в VK и YouTube
 ###############################################################################
 
-def upload_video_to_vk(token, group_id, video_path, album_id, name, description, privacy_view="all"):
+def upload_video_to_vk(token, group_id, video_path, album_id, name, description, privacy_view="all", stream=None):
     logging.info(f"Загрузка файла {video_path} в VK...")
     params = {
         "access_token": token,
@@ -343,48 +415,47 @@ def upload_video_to_vk(token, group_id, video_path, album_id, name, description,
         "privacy_view": privacy_view,
         "privacy_comment": "all",
     }
-    rsp = requests.get("https://api.vk.ru/method/video.save", params=params, timeout=60).json()
+    rsp = _vk_session.get(f"{VK_API_URL}/video.save", params=params, timeout=60).json()
     if "error" in rsp:
         raise RuntimeError(f"Ошибка VK API: {rsp['error']['error_msg']}")
     upload_url = rsp["response"]["upload_url"]
 
     # multipart upload
-    with open(video_path, "rb") as f:
-        try:
-            from requests_toolbelt import MultipartEncoder
-        except Exception:
-            # fallback to standard multipart
-            files = {"video_file": ("video_file", f, "video/mp4")}
-            up = requests.post(upload_url, files=files, timeout=None)
-            if not up.ok:
-                raise RuntimeError(f"Ошибка POST upload VK: {up.text}")
-        else:
-            enc = MultipartEncoder(fields={"video_file": ("video_file", f, "video/mp4")})
-            headers = {"Content-Type": enc.content_type}
-            up = requests.post(upload_url, data=enc, headers=headers, timeout=None)
-            if not up.ok:
-                raise RuntimeError(f"Ошибка POST upload VK: {up.text}")
+    # stream — канал filetee (--tee), иначе файл читается через mmap
+    body = upload_body.MultipartBody(stream, stream.len) if stream else upload_body.FileMultipartBody(video_path)
+    with body:
+        headers = {"Content-Type": body.content_type}
+        up = _vk_session.post(upload_url, data=bandwidth.wrap(body, "vk"), headers=headers, timeout=None)
+        if not up.ok:
+            raise RuntimeError(f"Ошибка POST upload VK: {up.text}")
 
     logging.info(f"{video_path} успешно загружен в VK.")
     return True
 
-def get_authenticated_youtube_service():
-    if os.path.exists(TOKEN_FILE):
-        credentials = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+def get_authenticated_youtube_service(token_file=TOKEN_FILE):
+    # Клиент Google тяжёлый при импорте — грузим только когда действительно нужен YouTube
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    if os.path.exists(token_file):
+        credentials = Credentials.from_authorized_user_file(token_file, SCOPES)
     else:
         if not os.path.exists(CLIENT_SECRETS_FILE):
             raise RuntimeError("Отсутствует client_secret.json для YouTube OAuth.")
         flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
         credentials = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w", encoding="utf-8") as token:
+        with open(token_file, "w", encoding="utf-8") as token:
             token.write(credentials.to_json())
     return build("youtube", "v3", credentials=credentials)
 
-def upload_to_youtube(video_file, title, description, tags):
-    print(f"Загружаю {video_file} на YouTube...")
-    logging.info(f"Загрузка {video_file} на YouTube")
+def upload_to_youtube(video_file, title, description, tags, stream=None, account=None, channel=None):
+    # account — аккаунт пула, выданный pick() (None — лучший аккаунт канала channel)
+    account = account or youtube_accounts.get_pool().pick(channel)
+    if account is None:
+        raise RuntimeError("квота YouTube на сегодня исчерпана на всех аккаунтах пула")
+    print(f"Загружаю {video_file} на YouTube (аккаунт {account.name})...")
+    logging.info(f"Загрузка {video_file} на YouTube через аккаунт {account.name}")
     start = datetime.now()
-    youtube = get_authenticated_youtube_service()
     body = {
         "snippet": {
             "title": title or os.path.basename(video_file),
@@ -394,13 +465,68 @@ def upload_to_youtube(video_file, title, description, tags):
         },
         "status": {"privacyStatus": "private"},
     }
-    media = MediaFileUpload(video_file, chunksize=-1, resumable=True)
-    request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
-    _ = request.execute()
+    from googleapiclient.http import MediaIoBaseUpload
+    # медиапоток идёт через общий ограничитель полосы (bandwidth.json)
+    stream = bandwidth.wrap(stream or open(video_file, "rb"), "youtube")
+    try:
+        youtube = account.service(get_authenticated_youtube_service)
+        media = MediaIoBaseUpload(stream, mimetype="video/mp4", chunksize=-1, resumable=True)
+        request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
+        _ = request.execute()
+    except Exception as e:
+        if quota.is_quota_error(e):
+            account.ledger.exhaust()
+        raise
+    finally:
+        stream.close()
+        account.release()
+    account.record()
     elapsed = (datetime.now() - start).total_seconds()
     size_mb = os.path.getsize(video_file) / (1024 * 1024)
     print(f"  {video_file} ({size_mb:.2f} MB) загружено на YouTube за {int(elapsed//60)} мин {int(elapsed%60)} сек.")
 
+def upload_teed(vk_cfg, video_file, name, description, tags, privacy, window_mb, account=None):
+    """
+    VK и YouTube одновременно из одного чтения файла (filetee). Возвращает (vk_ok, youtube_ok).
+    """
+    tee = filetee.FileTee(video_file, window_mb)
+    sinks = {"VK": tee.sink("vk"), "YouTube": tee.sink("youtube")}
+    jobs = {
+        "VK": lambda: upload_video_to_vk(
+            vk_cfg["vk_token"], vk_cfg["vk_group_id"], video_file, vk_cfg["vk_album_id"],
+            name, description, privacy_view=privacy, stream=sinks["VK"]),
+        "YouTube": lambda: upload_to_youtube(video_file, name, description, tags,
+                                             stream=sinks["YouTube"], account=account),
+    }
+    errors = {}
+
+    def run(platform):
+        try:
+            jobs[platform]()
+            errors[platform] = None
+        except Exception as e:
+            errors[platform] = e
+        finally:
+            # упавшая загрузка не должна держать окно чтения для остальных
+            sinks[platform].close()
+
+    print(f"-> Загрузка в VK и на YouTube из одного чтения файла: {video_file}")
+    tee.start()
+    threads = [threading.Thread(target=run, args=(p,)) for p in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    tee.close()
+    for platform, error in errors.items():
+        if error is None:
+            print(f"-> {platform}: файл {video_file} успешно загружен.")
+            logging.info(f"{platform} upload ok for {video_file}")
+        else:
+            print(f"--!! Ошибка загрузки в {platform}: {error}")
+            logging.error(f"Ошибка {platform} для {video_file}: {error}")
+    return errors["VK"] is None, errors["YouTube"] is None
+
 def add_part_to_title(title, part_number):
     title = title or ""
     last_open = title.rfind("(")
@@ -415,7 +541,7 @@ def add_part_to_title(title, part_number):
 # Скачивание Twitch-видео (TwitchDownloaderCLI)
 ###############################################################################
 
-def download_twitch_video(video_url, output_file):
+def download_twitch_video(video_url, output_file, temp_dir="temp", rendition=None):
     video_id = video_url.split("/")[-1]
     print(f"Скачиваю из Twitch: {video_url} → {output_file}")
     logging.info(f"Загрузка видео Twitch: {video_url}")
@@ -424,9 +550,11 @@ def download_twitch_video(video_url, output_file):
         "--id", video_id,
         "-o", output_file,
         "--threads", "20",
-        "--temp-path", "temp"
+        "--temp-path", temp_dir
     ]
-    os.makedirs("temp", exist_ok=True)
+    if rendition and rendition != quality.SOURCE:
+        cmd += ["-q", rendition]
+    os.makedirs(temp_dir, exist_ok=True)
     proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     patt = re.compile(r"Downloading\s+(\d+)%")
     while True:
@@ -437,11 +565,56 @@ def download_twitch_video(video_url, output_file):
             m = patt.search(line)
             if m:
                 pct = int(m.group(1))
+                eta.video_progress(video_id, pct / 100)
                 print(f"  [{output_file}] {pct:3d}%", end="\r")
-    proc.wait()
+    retcode = proc.wait()
+    if retcode != 0:
+        raise subprocess.CalledProcessError(retcode, cmd)
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        raise RuntimeError(f"TwitchDownloaderCLI не создал {output_file}")
+    eta.video_progress(video_id, 1.0)
     print(f"  [{output_file}] 100%                     ")
     logging.info(f"Файл {output_file} скачан.")
 
+def download_row(video_urls, chats=None, rendition=None):
+    """
+    Скачивает все ссылки строки в кеш (cache/<id>.mp4). Каждый VOD качается в своей рабочей
+    папке и переносится в кеш атомарно; уже лежащий в кеше VOD повторно не качается.
+    При ошибке удаляет скачанное этим вызовом (VOD, который уже был в кеше, может читать
+    другая строка или воркер) и пробрасывает исключение.
+    chats — {id VOD: файл чата} (--chat): чат качается параллельно с видео.
+    rendition — версия Twitch не в качестве источника (quality.plan_row), cache/<id>_<версия>.mp4.
+    """
+    if rendition == quality.SOURCE:
+        rendition = None
+    video_files = []
+    fetched = []
+    chat_jobs = []
+    try:
+        for url in video_urls:
+            video_id = url.split("/")[-1] if "twitch.tv" in url else url
+            out_file = workspace.cache_path(video_id, rendition)
+            video_files.append(out_file)
+            if chats and video_id in chats:
+                chat_jobs.append(chat.start(video_id, chats[video_id], TWITCH_DOWNLOADER_PATH))
+            if os.path.exists(out_file):
+                print(f"-> Twitch ID {video_id} уже скачан: {out_file}")
+                continue
+            print(f"-> Скачивание Twitch ID: {video_id}    ({url})")
+            with workspace.Workspace(f"dl-{video_id}") as job:
+                partial = job.path(f"{video_id}.mp4")
+                with bandwidth.stage("twitch"), throughput.timed("twitch", partial):
+                    download_twitch_video(url, partial, job.temp_dir, rendition)
+                job.publish(partial, out_file)
+                fetched.append(out_file)
+    except Exception:
+        workspace.remove_files(fetched)
+        raise
+    finally:
+        for chat_job in chat_jobs:
+            chat_job.wait()
+    return video_files
+
 ###############################################################################
 # Основной процесс
 ###############################################################################
@@ -453,7 +626,7 @@ def _pick_first_nonempty(row, indices):
     for idx in indices:
         if idx < len(row):
             val = row.iloc[idx]
-            if pd.notna(val) and str(val).strip():
+            if manifest.notna(val):
                 return str(val).strip()
     return ""
 
@@ -466,19 +639,80 @@ def _get_link_from_row(row):
     cands = []
     for idx in (0, 1, 2):
         if idx < len(row):
-            v = str(row.iloc[idx]) if pd.notna(row.iloc[idx]) else ""
+            v = str(row.iloc[idx]) if manifest.notna(row.iloc[idx]) else ""
             if "twitch.tv" in v:
                 cands.append(v.strip())
     return cands[0] if cands else ""
 
-def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99, debug=False):
+def _row_links(records):
+    rows = []
+    for r in records:
+        link = _get_link_from_row(r)
+        if link:
+            rows.append((r.number, link.split()))
+    return rows
+
+def make_plan(start_row, end_row, do_vk, do_youtube, max_uploads, tee_window, plan_file):
+    """
+    --plan: план пачки без скачивания — preflight через Helix и та же склейка/нарезка,
+    что при загрузке. Сохраняется в plan_file для запуска с --from-plan.
+    """
+    if not os.path.exists(STREAMS_FILE):
+        print(f"Не найден {STREAMS_FILE}. Используйте флаг -last <username> <count> для автогенерации.")
+        return None
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
+    preflight_plan = plan.run_preflight(_row_links(records))
+    if not preflight_plan:
+        print("--plan: без данных Helix (длительности VOD) план не построить.")
+        return None
+    pool = youtube_accounts.get_pool() if do_youtube else None
+    batch = plan.build_batch(
+        preflight_plan, lambda durations: plan.layout_concat(durations, MAX_ALLOWED_DURATION),
+        names={r.number: _pick_first_nonempty(r, [1, 2]) for r in records},
+        title=add_part_to_title,
+        platforms=[p for p, on in (("vk", do_vk), ("youtube", do_youtube)) if on],
+        pool=pool, channels={r.number: youtube_accounts.row_channel(r) for r in records},
+        max_uploads=max_uploads, tee=bool(tee_window))
+    plan.print_batch(batch)
+    if pool:
+        pool.report(batch["totals"]["youtube_parts"])
+    plan.save_plan(batch, plan_file)
+    print(f"План сохранён в {plan_file}, запуск по нему: --from-plan {plan_file}")
+    return batch
+
+def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99, debug=False, preflight=True,
+         schedule="sheet", retention_days=scheduler.RETENTION_DAYS, prefetch=3, queue_file=None, worker=None,
+         tee_window=None, part_workers=partupload.PART_WORKERS, plan_file=None, from_plan=None,
+         chat_download=False, chat_render=False, transcode_profiles=None, max_quality=None, configured=False,
+         done=None):
+    """
+    Публикует строки start_row..end_row. Возвращает {номер строки: время публикации} строк,
+    загруженных на все выбранные площадки. configured — настройки VK и YouTube уже
+    проверены (--watch спрашивает их один раз при запуске), main ничего не спрашивает.
+    done — {номер строки: множество площадок}: туда строка уже загружена (повтор --watch),
+    main их пропускает и дописывает площадки, куда загрузил сейчас.
+    """
+    if plan_file:
+        return make_plan(start_row, end_row, do_vk, do_youtube, max_uploads, tee_window, plan_file)
+    transcode_profiles = transcode_profiles or {}
+    max_quality = max_quality or {}
+    done = {} if done is None else done
+    saved_plan = None
+    if from_plan:
+        # запуск по плану --plan: его диапазон, платформы и лимит, данные Helix — из плана
+        saved_plan = plan.load_plan(from_plan)
+        start_row, end_row = saved_plan["range"]
+        do_vk = "vk" in saved_plan["platforms"]
+        do_youtube = "youtube" in saved_plan["platforms"]
+        max_uploads = saved_plan.get("max_uploads") or max_uploads
+        print(f"Запуск по плану {from_plan}: строки {start_row}–{end_row}, {', '.join(saved_plan['platforms'])}")
     ensure_twitch_downloader()
 
     config = load_config()
     vk_cfg = None
     if do_vk:
-        vk_cfg = setup_vkontakte_config()
-    if do_youtube:
+        vk_cfg = config if configured else setup_vkontakte_config()
+    if do_youtube and not configured:
         setup_youtube_credentials()
 
     logging.basicConfig(
@@ -491,28 +725,113 @@ def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99,
         print(f"Не найден {STREAMS_FILE}. Используйте флаг -last <username> <count> для автогенерации.")
         return
 
-    print("Очистка временных .mp4 файлов перед запуском...")
-    for f in os.listdir():
-        if f.endswith(".mp4"):
-            try:
-                os.remove(f)
-            except Exception:
-                pass
+    # чужие рабочие папки не трогаем — только оставшиеся от завершившихся процессов
+    workspace.cleanup_stale()
 
-    df = pd.read_excel(STREAMS_FILE)
-    start_index = max(0, start_row - 1)
-    end_index = end_row if end_row is not None else len(df)
+    # читаем только строки --start..--end
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
     uploaded_count = 0
+    published = {}
+
+    # Preflight: все VOD диапазона одной пачкой через Helix, мёртвые строки пропускаем
+    rows = _row_links(records)
+    if saved_plan:
+        plan_data = saved_plan
+        stale = plan.stale_rows(saved_plan, rows)
+        if stale:
+            print(f"Строки {', '.join(map(str, sorted(stale)))} изменились после --plan, пропускаю их.")
+        dead = plan.dead_rows(plan_data) | stale
+    else:
+        plan_data = plan.run_preflight(rows) if preflight else None
+        dead = plan.dead_rows(plan_data)
+
+    # Дневная квота YouTube по пулу аккаунтов: YouTube-only строки, которые сегодня
+    # не загрузить на их канал, не качаем
+    pool = youtube_accounts.get_pool() if do_youtube else None
+    channels = {r.number: youtube_accounts.row_channel(r) for r in records}
+    deferred = set()
+    youtube_pending = 0
+    if pool:
+        durations = {r["row"]: r["duration"] for r in plan_data["rows"]} if plan_data else {}
+        rows_parts = [(n, quota.parts_needed(durations.get(n), MAX_ALLOWED_DURATION), channels[n])
+                      for n, _ in rows if n not in dead]
+        parts_by_row = {n: parts for n, parts, _ in rows_parts}
+        # строки только для YouTube (без VK или VK уже загружен прошлым запуском --watch)
+        youtube_only = [r for r in rows_parts if not do_vk or "vk" in done.get(r[0], ())]
+        if youtube_only:
+            deferred_rows = pool.split_today(youtube_only, max_uploads)
+            deferred = set(deferred_rows)
+            youtube_pending = sum(parts_by_row[n] for n in deferred)
+            if deferred:
+                print(f"Квота YouTube: строки {', '.join(map(str, deferred_rows))} сегодня не загрузить, "
+                      f"откладываю до сброса квоты.")
+        pool.report(sum(parts_by_row.values()))
+    rows_today = [(n, urls) for n, urls in rows if n not in deferred]
+
+    # --max-quality / --transcode: какие версии VOD качать для площадок строки
+    row_plans = {}
+    for n, _ in rows:
+        sinks = {}
+        if do_vk and vk_cfg and "vk" not in done.get(n, ()):
+            sinks["vk"] = (max_quality.get("vk"), transcode_profiles.get("vk"))
+        # строке, которую сегодня на YouTube не загрузить, версия для YouTube не нужна
+        if do_youtube and "youtube" not in done.get(n, ()) and pool.uploads_left(channels.get(n)) > 0:
+            sinks["youtube"] = (max_quality.get("youtube"), transcode_profiles.get("youtube"))
+        row_plans[n] = quality.plan_row(sinks)
+    rendition_by_urls = {tuple(urls): row_plans[n]["downloads"][0] for n, urls in rows}
+
+    # --chat: файлы чата из колонки I (chat_filename.json), чат качается вместе с видео
+    chats = {}
+    if chat_download or chat_render:
+        by_number = {r.number: r for r in records}
+        for number, urls in rows:
+            chats.update(chat.row_chat_files(
+                by_number[number], [u.split("/")[-1] if "twitch.tv" in u else u for u in urls]))
+
+    # Живой прогноз окончания (нужны размеры из preflight; в режиме очереди неизвестно,
+    # какие строки достанутся этому воркеру)
+    if plan_data and not queue_file:
+        eta.start(plan.build_batch(plan_data, lambda durations: plan.layout_concat(durations, MAX_ALLOWED_DURATION),
+                                   platforms=[p for p, on in (("vk", do_vk), ("youtube", do_youtube)) if on]),
+                  rows={n for n, _ in rows_today if n not in dead}, tee=bool(tee_window))
+
+    # Общая очередь нескольких машин: строки забираются с арендой
+    queue = None
+    if queue_file:
+        queue = workqueue.WorkQueue(queue_file, worker)
+        deadlines = scheduler.row_deadlines(plan_data, retention_days) if plan_data else None
+        queue.fill([n for n, _ in rows_today if n not in dead], deadlines)
+        print(f"Режим очереди {queue_file}, воркер {queue.worker}")
+
+    # Скачивание по сроку удаления VOD, загрузка — по порядку таблицы
+    sched = None
+    if schedule == "expiry":
+        if queue:
+            print("В режиме очереди строки и так выдаются по сроку удаления VOD, --schedule expiry не нужен.")
+        elif plan_data:
+            sched = scheduler.start_for_plan(
+                plan_data, rows_today, lambda urls: download_row(urls, chats, rendition_by_urls.get(tuple(urls))),
+                retention_days, prefetch)
+        else:
+            print("Режим --schedule expiry требует preflight (даты VOD из Helix), качаю по порядку таблицы.")
 
-    for index in range(start_index, end_index):
-        row = df.iloc[index]
+    for row, lease in workqueue.iter_rows(records, queue):
+        index = row.number - 1
 
         # 1) ссылка(и)
         link_cell = _get_link_from_row(row)
         if not link_cell:
             print(f"Строка {index+1}: нет Twitch-ссылки, пропускаю.")
             continue
+        if index + 1 in dead:
+            print(f"Строка {index+1}: VOD недоступен на Twitch (preflight), пропускаю.")
+            logging.warning(f"Строка {index+1} пропущена по результатам preflight")
+            continue
+        if index + 1 in deferred:
+            print(f"Строка {index+1}: отложена до сброса квоты YouTube.")
+            continue
         video_urls = str(link_cell).split()
+        channel = channels.get(index + 1)
 
         # 2) заголовок (пытаемся взять из C => iloc[1], иначе iloc[2], иначе пусто)
         name = _pick_first_nonempty(row, [1, 2])
@@ -524,24 +843,40 @@ def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99,
         tags = _pick_first_nonempty(row, [3, 4])
 
         print(f"\n[{index+1}] Обрабатываю…")
-        video_files = []
-        for url in video_urls:
-            video_id = url.split("/")[-1] if "twitch.tv" in url else url
-            out_file = f"{video_id}.mp4"
-            print(f"-> Скачивание Twitch ID: {video_id}    ({url})")
-            download_twitch_video(url, out_file)
-            video_files.append(out_file)
+        row_plan = row_plans.get(index + 1) or quality.plan_row({})
+        if row_plan["downloads"] != [quality.SOURCE]:
+            print(f"-> Качество: {quality.describe(row_plan)}")
+        try:
+            video_files = sched.wait(index + 1) if sched else download_row(video_urls, chats, row_plan["downloads"][0])
+        except Exception as e:
+            print(f"--!! Ошибка скачивания, строка {index+1} пропущена: {e}")
+            logging.error(f"Ошибка скачивания для строки {index+1}: {e}")
+            if lease:
+                lease.fail(e)
+            eta.row_done(index + 1)
+            continue
+        if lease and lease.lost:
+            print(f"Строка {index+1}: аренду забрал другой воркер, пропускаю.")
+            workspace.remove_files(video_files)
+            continue
+
+        # --chat-render: чат рендерится на CPU, пока строка загружается в сеть
+        render_job = None
+        if chat_render:
+            video_ids = [u.split("/")[-1] if "twitch.tv" in u else u for u in video_urls]
+            render_job = chat.start_render([chats[v] for v in video_ids if v in chats],
+                                           TWITCH_DOWNLOADER_PATH, FFMPEG_PATH, concatenate_videos)
+
+        # склейка и части строки живут в её рабочей папке
+        job = workspace.Workspace(f"row-{index+1}")
 
         # если несколько — конкат
         if len(video_files) > 1:
-            meta = create_concat_metadata(video_files)
-            final_file = f"concatenated_{index+1}.mp4"
-            concatenate_videos(video_files, final_file, meta)
-            for f in video_files:
-                try:
-                    os.remove(f)
-                except Exception:
-                    pass
+            meta = create_concat_metadata(video_files, job.path("concat_metadata.txt"))
+            final_file = job.path(f"concatenated_{index+1}.mp4")
+            with eta.stage(index + 1, "remux"):
+                concatenate_videos(video_files, final_file, meta)
+            workspace.remove_files(video_files)
             video_file = final_file
         else:
             video_file = video_files[0]
@@ -550,62 +885,181 @@ def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99,
         chapters = get_chapters(video_file)
         description_final = create_description_from_chapters(chapters) if chapters else (description or "")
 
+        privacy = "all"  # при желании можно маппить из столбца
+
+        # --max-quality / --transcode: площадки получают свою версию по плану строки
+        renditions = {}
+
+        # площадки, куда строка уже загружена прошлым запуском --watch, не повторяем
+        row_done = done.setdefault(index + 1, set())
+        if lease:
+            row_done |= lease.done  # прошлые попытки других воркеров очереди
+        need_vk = bool(do_vk and vk_cfg) and "vk" not in row_done
+        need_youtube = do_youtube and "youtube" not in row_done
+
+        # --tee: VK и YouTube одновременно, файл читается с диска один раз
+        vk_ok = youtube_ok = True
+        if lease and lease.lost:
+            print(f"Строка {index+1}: аренду забрал другой воркер, не загружаю.")
+            need_vk = need_youtube = vk_ok = youtube_ok = False
+        teed = bool(tee_window) and need_vk and need_youtube and uploaded_count < max_uploads \
+            and pool.uploads_left(channel) > 0 and row_plan["sinks"].get("vk") == row_plan["sinks"].get("youtube") \
+            and get_video_duration(video_file) <= MAX_ALLOWED_DURATION
+        if teed:
+            teed_file = sink_video(video_file, "vk", row_plan, renditions, job.dir, video_urls)
+            with eta.stage(index + 1, "vk"), eta.stage(index + 1, "youtube"):
+                vk_ok, youtube_ok = upload_teed(vk_cfg, teed_file, name, description_final, tags, privacy,
+                                                tee_window, pool.pick(channel))
+            if youtube_ok:
+                uploaded_count += 1
+            if not vk_ok and lease:
+                lease.fail("ошибка загрузки в VK")
+
         # 1. VK
-        vk_ok = True
-        if do_vk and vk_cfg:
+        if need_vk and not teed:
+            vk_file = sink_video(video_file, "vk", row_plan, renditions, job.dir, video_urls)
             try:
-                print(f"-> Загрузка в VK: {video_file}")
-                privacy = "all"  # при желании можно маппить из столбца
-                upload_video_to_vk(
-                    vk_cfg["vk_token"], vk_cfg["vk_group_id"], video_file,
-                    vk_cfg["vk_album_id"], name, description_final, privacy_view=privacy
-                )
-                print(f"-> VK: файл {video_file} успешно загружен.")
-                logging.info(f"VK upload ok for {video_file}")
+                print(f"-> Загрузка в VK: {vk_file}")
+                with eta.stage(index + 1, "vk"):
+                    upload_video_to_vk(
+                        vk_cfg["vk_token"], vk_cfg["vk_group_id"], vk_file,
+                        vk_cfg["vk_album_id"], name, description_final, privacy_view=privacy
+                    )
+                print(f"-> VK: файл {vk_file} успешно загружен.")
+                logging.info(f"VK upload ok for {vk_file}")
             except Exception as e:
                 print(f"--!! Ошибка загрузки в VK: {e}")
-                logging.error(f"Ошибка VK для {video_file}: {e}")
+                logging.error(f"Ошибка VK для {vk_file}: {e}")
                 vk_ok = False
+                if lease:
+                    lease.fail(e)
 
         # 2. YouTube
-        if do_youtube and vk_ok:
+        if need_youtube and lease and lease.lost:
+            print(f"Строка {index+1}: аренду забрал другой воркер после VK, на YouTube не загружаю.")
+            need_youtube = youtube_ok = False
+        if need_youtube and vk_ok and not teed and not pool.uploads_left(channel):
+            # нарезать и загружать сегодня бессмысленно — квота кончилась
+            print(f"Квота YouTube на сегодня исчерпана, строка {index+1} на YouTube не загружена.")
+            youtube_pending += quota.parts_needed(get_video_duration(video_file), MAX_ALLOWED_DURATION)
+            youtube_ok = False
+        elif need_youtube and vk_ok and not teed:
             to_upload = []
-            duration = get_video_duration(video_file)
+            youtube_file = sink_video(video_file, "youtube", row_plan, renditions, job.dir, video_urls)
+            duration = get_video_duration(youtube_file)
             if duration > MAX_ALLOWED_DURATION:
-                to_upload = split_single_video(video_file)
+                with eta.stage(index + 1, "remux"):
+                    to_upload = split_single_video(youtube_file, out_dir=job.dir)
             else:
-                to_upload = [video_file]
+                to_upload = [youtube_file]
 
+            # названия и описания частей — до загрузки, чтобы нумерация не зависела от порядка завершения
+            parts = []
+            quota_left = pool.uploads_left(channel)
             for i, up_file in enumerate(to_upload):
-                if uploaded_count >= max_uploads:
+                if uploaded_count + len(parts) >= max_uploads:
                     print("Достигнут лимит YouTube загрузок (max-uploads).")
                     break
+                if len(parts) >= quota_left:
+                    print("Квота YouTube на сегодня исчерпана.")
+                    youtube_pending += len(to_upload) - i
+                    break
                 y_chapters = get_chapters(up_file)
                 y_desc = create_description_from_chapters(y_chapters) if y_chapters else description_final
                 yt_title = add_part_to_title(name, i + 1) if len(to_upload) > 1 else (name or os.path.basename(up_file))
-                try:
-                    upload_to_youtube(up_file, yt_title, y_desc, tags)
+                parts.append((up_file, yt_title, y_desc))
+            youtube_ok = len(parts) == len(to_upload)
+
+            with eta.stage(index + 1, "youtube"):
+                results = partupload.upload_parts(
+                    parts, lambda part: upload_to_youtube(*part, tags, channel=channel), part_workers)
+            for (up_file, _, _), error in results:
+                if error is None:
                     print(f"-> YouTube: {up_file} успешно загружен.")
                     logging.info(f"YouTube upload ok for {up_file}")
                     uploaded_count += 1
-                except Exception as e:
-                    print(f"--!! Ошибка загрузки на YouTube: {e}")
-                    logging.error(f"Ошибка YouTube для {up_file}: {e}")
+                else:
+                    print(f"--!! Ошибка загрузки на YouTube: {error}")
+                    logging.error(f"Ошибка YouTube для {up_file}: {error}")
+                    youtube_ok = False
+
+        if lease and os.path.exists(video_file):
+            lease.add_bytes(os.path.getsize(video_file))
+        if need_vk and vk_ok:
+            row_done.add("vk")
+        if need_youtube and youtube_ok:
+            row_done.add("youtube")
+        if lease:
+            lease.mark_done(row_done)
+            if not (vk_ok and youtube_ok):
+                # YouTube не догружен (ошибка части, квота) — строка возвращается в очередь
+                lease.fail(lease.error or "загружено не на все площадки")
+        if vk_ok and youtube_ok:
+            published[index + 1] = time.time()
+
+        # 3. Очистка: скачанное (и вторые версии) и рабочая папка строки (склейка, части)
+        workspace.remove_files(video_files)
+        workspace.remove_files(renditions.values())
+        job.cleanup()
+        print(f"Удалены все временные файлы для строки {index+1}.")
+        if sched:
+            sched.release(index + 1)
+        if render_job:
+            render_job.wait()
+        eta.row_done(index + 1)
+
+    eta.stop()
+    if queue:
+        queue.report()
+        queue.close()
+    if pool:
+        pool.report(youtube_pending)
+    print("\nВыполнено!\n")
+    return published
 
-        # 3. Очистка временных файлов
-        try:
-            files_for_cleanup = set(video_files + ([video_file] if video_file not in video_files else []))
-            for f in os.listdir():
-                if (f.startswith(video_file[:-4]) and f.endswith(".mp4")) or f in files_for_cleanup:
-                    try:
-                        os.remove(f)
-                    except Exception:
-                        pass
-            print(f"Удалены все временные файлы для строки {index+1}.")
-        except Exception as e:
-            print(f"Ошибка при удалении файлов: {e}")
+###############################################################################
+# --watch: демон, публикующий новые архивы
+###############################################################################
 
-    print("\nВыполнено!\n")
+def watch_archives(username, limit=100, stop=None, **options):
+    """
+    Следит за архивами username (watch.run) и публикует каждый новый: дописывает его в
+    таблицу и запускает main по его строкам (при повторе — по уже записанным строкам). options — параметры main (площадки, --tee…),
+    stop — threading.Event для остановки.
+    Настройки спрашиваются один раз здесь; клиенты остаются тёплыми между публикациями.
+    """
+    credentials = _get_twitch_credentials()
+    if options.get("do_vk"):
+        setup_vkontakte_config()
+    if options.get("do_youtube"):
+        setup_youtube_credentials()
+    ensure_twitch_downloader()
+    if not os.path.exists(STREAMS_FILE):
+        # прошлые архивы — в таблицу, но не в публикацию: публикуются только новые
+        generate_streams_xlsx(username, limit, STREAMS_FILE)
+
+    def publish(videos, done):
+        rows = append_archives(videos, STREAMS_FILE, include_known=True)
+        # площадки по номерам строк: main дописывает в те же множества, что видит watch
+        row_done = {n: done.setdefault(video_id, set()) for video_id, n in rows.items()}
+        published = {}
+        numbers = sorted(rows.values())
+        # дописанные строки идут подряд, но после ручных правок таблицы — не обязательно
+        ranges = []
+        for n in numbers:
+            if ranges and ranges[-1][1] == n - 1:
+                ranges[-1][1] = n
+            else:
+                ranges.append([n, n])
+        for start_row, end_row in ranges:
+            published.update(main(start_row, end_row, configured=True, done=row_done, **options) or {})
+        return {video_id: published[n] for video_id, n in rows.items() if n in published}
+
+    try:
+        watch.run(username, publish, credentials, limit, stop)
+    except KeyboardInterrupt:
+        print("\nОстановлено.")
+    watch.report()
 
 ###############################################################################
 # CLI
@@ -619,9 +1073,52 @@ def parse_args():
     parser.add_argument("--youtube", action="store_true", help="Загружать только YouTube")
     parser.add_argument("--max-uploads", type=int, default=99, help="Максимум файлов для YouTube за запуск")
     parser.add_argument("--debug", action="store_true", help="Подробный лог")
+    parser.add_argument("--no-preflight", action="store_true", help="Не проверять VOD через Helix перед запуском")
+    parser.add_argument("--schedule", choices=["sheet", "expiry"], default="sheet",
+                        help="Порядок скачивания: по таблице или по сроку удаления VOD на Twitch")
+    parser.add_argument("--retention-days", type=int, default=scheduler.RETENTION_DAYS,
+                        help="Срок хранения архивов на канале, дней")
+    parser.add_argument("--prefetch", type=int, default=3, help="Сколько строк можно скачать наперёд")
+    parser.add_argument("--queue", metavar="FILE",
+                        help="Общая очередь строк (SQLite на общем хранилище) для нескольких машин")
+    parser.add_argument("--worker", help="Имя воркера в очереди (по умолчанию host-pid)")
+    parser.add_argument("--tee", nargs="?", type=float, const=filetee.DEFAULT_WINDOW_MB, metavar="MB",
+                        help="Загружать в VK и на YouTube одновременно из одного чтения файла; MB — окно "
+                             "опережения чтения (по умолчанию %(const)s). YouTube не ждёт успеха VK")
+    parser.add_argument("--part-workers", type=int, default=partupload.PART_WORKERS,
+                        help="Сколько частей длинного видео загружать на YouTube одновременно")
+    parser.add_argument("--plan", nargs="?", const=plan.BATCH_PLAN_FILE, metavar="FILE",
+                        help="Ничего не скачивая, посчитать время, пик диска, части и квоту YouTube "
+                             "и сохранить план (по умолчанию %(const)s)")
+    parser.add_argument("--from-plan", metavar="FILE", help="Запустить сохранённый план --plan как есть")
+    parser.add_argument("--chat", action="store_true",
+                        help="Скачивать чат VOD (chatdownload) вместе с видео в файл из колонки I")
+    parser.add_argument("--chat-render", action="store_true",
+                        help="Скачивать чат и рендерить его в видео (<файл чата>.mp4) кусками на всех ядрах")
+    parser.add_argument("--transcode", action="append", metavar="ПЛОЩАДКА=ПРОФИЛЬ",
+                        help="Загружать на площадку (vk, youtube) перекодированную версию: профиль "
+                             f"{', '.join(transcode.PROFILES)}; кодируется кусками на всех ядрах, главы сохраняются")
+    parser.add_argument("--max-quality", action="append", metavar="ПЛОЩАДКА=КАЧЕСТВО",
+                        help="Наибольшее нужное площадке (vk, youtube) качество, например vk=720p: "
+                             "скачивается самая дешёвая версия Twitch, которой хватает всем площадкам строки")
     parser.add_argument("-last", "--last", nargs=2, metavar=("USERNAME", "COUNT"),
                         help="Скачать последние COUNT архивов у Twitch-пользователя USERNAME и сформировать streams.xlsx")
-    return parser.parse_args()
+    parser.add_argument("-sync", "--sync", metavar="USERNAME",
+                        help="Дописать в streams.xlsx только новые архивы USERNAME с прошлой синхронизации")
+    parser.add_argument("--sync-limit", type=int, default=100,
+                        help="Максимум архивов за одну синхронизацию (и для первой)")
+    parser.add_argument("--watch", metavar="USERNAME",
+                        help="Демон: опрашивать Helix и публиковать каждый новый архив USERNAME сразу после "
+                             "конца стрима; задержка от конца стрима до публикации пишется в latency.json")
+    args = parser.parse_args()
+    if args.watch and (args.plan or args.from_plan):
+        parser.error("--watch нельзя совмещать с --plan и --from-plan")
+    try:
+        args.transcode_profiles = transcode.parse_sinks(args.transcode, ("vk", "youtube"))
+        args.max_quality = quality.parse_caps(args.max_quality, ("vk", "youtube"))
+    except ValueError as e:
+        parser.error(str(e))
+    return args
 
 if __name__ == "__main__":
     args = parse_args()
@@ -630,10 +1127,20 @@ if __name__ == "__main__":
     if args.last:
         username, count = args.last
         generate_streams_xlsx(username=username, count=int(count), output_file=STREAMS_FILE)
+    elif args.sync:
+        sync_streams_xlsx(username=args.sync, limit=args.sync_limit, output_file=STREAMS_FILE)
 
     # Логика выбора платформ:
     # - если не выставлено ни одного флага, то загружаем в обе
     do_vk = args.vk or (not args.vk and not args.youtube)
     do_youtube = args.youtube or (not args.vk and not args.youtube)
 
-    main(args.start, args.end, do_vk, do_youtube, args.max_uploads, args.debug)
+    options = dict(do_vk=do_vk, do_youtube=do_youtube, max_uploads=args.max_uploads, debug=args.debug,
+                   preflight=not args.no_preflight, schedule=args.schedule, retention_days=args.retention_days,
+                   prefetch=args.prefetch, queue_file=args.queue, worker=args.worker, tee_window=args.tee,
+                   part_workers=args.part_workers, chat_download=args.chat, chat_render=args.chat_render,
+                   transcode_profiles=args.transcode_profiles, max_quality=args.max_quality)
+    if args.watch:
+        watch_archives(args.watch, args.sync_limit, **options)
+    else:
+        main(args.start, args.end, plan_file=args.plan, from_plan=args.from_plan, **options)
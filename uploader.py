@@ -1,23 +1,34 @@
-import pandas as pd
 import subprocess
 import os
 import argparse
 import logging
 import requests
-import zipfile
 import shutil
 import threading
 import time
 import json
-import math
 import re
-import urllib.request
 from datetime import datetime
 
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
+import bandwidth
+import chat
+import eta
+import filetee
+import growfile
+import manifest
+import mp4meta
+import partupload
+import plan
+import quality
+import quota
+import scheduler
+import throughput
+import toolcache
+import transcode
+import upload_body
+import workqueue
+import workspace
+import youtube_accounts
 
 CONFIG_FILE = "config.json"
 TWITCH_DOWNLOADER_PATH = "./TwitchDownloaderCLI/TwitchDownloaderCLI"
@@ -28,6 +39,8 @@ CLIENT_SECRETS_FILE = "client_secret.json"
 TOKEN_FILE = "token.json"
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 MAX_ALLOWED_DURATION = 11 * 3600 + 58 * 60  # 11:58:00
+VK_API_URL = "https://api.vk.ru/method"
+STREAM_SLICE = 10 * 60  # --stream-upload: VOD качается кусками по столько секунд
 
 #############################
 # Настройка и конфигурация  #
@@ -65,39 +78,32 @@ def setup_youtube_credentials():
             f.write(client_secret)
 
 ############################################################
-# 1. TwitchDownloader: актуальная версия через GitHub API  #
+# 1. TwitchDownloader: закреплённая версия из общего кеша  #
 ############################################################
 
-def get_latest_twitch_downloader_url():
-    api_url = "https://api.github.com/repos/lay295/TwitchDownloader/releases/latest"
-    response = requests.get(api_url, timeout=20)
-    response.raise_for_status()
-    release_data = response.json()
-    for asset in release_data.get("assets", []):
-        name = asset.get("name", "")
-        if name.endswith("Linux-x64.zip") and name.startswith("TwitchDownloaderCLI-"):
-            return asset["browser_download_url"]
-    raise Exception("Не найден подходящий TwitchDownloaderCLI для Linux x64")
-
 def ensure_twitch_downloader():
-    if not os.path.exists(TWITCH_DOWNLOADER_PATH):
-        print("Скачиваю TwitchDownloaderCLI (последняя версия)...")
-        downloader_url = get_latest_twitch_downloader_url()
-        print(f"URL последней версии: {downloader_url}")
-        urllib.request.urlretrieve(downloader_url, "TwitchDownloaderCLI.zip")
-        with zipfile.ZipFile("TwitchDownloaderCLI.zip", "r") as zip_ref:
-            zip_ref.extractall("./TwitchDownloaderCLI")
-        os.remove("TwitchDownloaderCLI.zip")
-        print("TwitchDownloaderCLI загружен!")
-
-def download_twitch_video(video_url, output_file):
+    # локальная ./TwitchDownloaderCLI, иначе общий кеш toolcache (с тёплым кешем — без сети)
+    global TWITCH_DOWNLOADER_PATH
+    TWITCH_DOWNLOADER_PATH = toolcache.twitch_downloader(TWITCH_DOWNLOADER_PATH)
+
+def download_twitch_video(video_url, output_file, temp_dir="temp", rendition=None,
+                          beginning=None, ending=None, progress=(0.0, 1.0)):
+    # beginning/ending — кусок VOD в секундах (-b/-e TwitchDownloaderCLI), progress — доля
+    # всего VOD, которую этот кусок занимает в прогнозе eta
     video_id = video_url.split("/")[-1]
     print(f"Скачиваю из Twitch: {video_url} → {output_file}")
     logging.info(f"Загрузка видео Twitch: {video_url}")
     command = [
         TWITCH_DOWNLOADER_PATH, "videodownload", "--id", video_id, "-o", output_file,
-        "--threads", "20", "--temp-path", "temp"
+        "--threads", "20", "--temp-path", temp_dir
     ]
+    if rendition and rendition != quality.SOURCE:
+        command += ["-q", rendition]
+    if beginning:
+        command += ["-b", str(int(beginning))]
+    if ending is not None:
+        command += ["-e", str(int(ending))]
+    low, high = progress
     proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     pattern = re.compile(r"Downloading\s+(\d+)%")
     while True:
@@ -108,16 +114,157 @@ def download_twitch_video(video_url, output_file):
             match = pattern.search(line)
             if match:
                 percent = int(match.group(1))
+                eta.video_progress(video_id, low + (high - low) * percent / 100)
                 print(f"  [{output_file}] {percent}%", end="\r")
-    proc.wait()
+    retcode = proc.wait()
+    if retcode != 0:
+        raise subprocess.CalledProcessError(retcode, command)
+    if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
+        raise RuntimeError(f"TwitchDownloaderCLI не создал {output_file}")
+    eta.video_progress(video_id, high)
     print(f"  [{output_file}] 100%               ")
     logging.info(f"Файл {output_file} скачан.")
 
+def download_row(video_urls, chats=None, rendition=None):
+    """
+    Скачивает все ссылки строки в кеш (cache/<id>.mp4). Каждый VOD качается в своей рабочей
+    папке и переносится в кеш атомарно; уже лежащий в кеше VOD повторно не качается.
+    При ошибке удаляет скачанное этим вызовом (VOD, который уже был в кеше, может читать
+    другая строка или воркер) и пробрасывает исключение.
+    chats — {id VOD: файл чата} (--chat): чат качается параллельно с видео.
+    rendition — версия Twitch не в качестве источника (quality.plan_row), cache/<id>_<версия>.mp4.
+    """
+    if rendition == quality.SOURCE:
+        rendition = None
+    video_files = []
+    fetched = []
+    chat_jobs = []
+    try:
+        for url in video_urls:
+            video_id = url.split("/")[-1] if "twitch.tv" in url else url
+            output_file = workspace.cache_path(video_id, rendition)
+            video_files.append(output_file)
+            if chats and video_id in chats:
+                chat_jobs.append(chat.start(video_id, chats[video_id], TWITCH_DOWNLOADER_PATH))
+            if os.path.exists(output_file):
+                print(f"-> Twitch ID {video_id} уже скачан: {output_file}")
+                continue
+            print(f"-> Скачивание Twitch ID: {video_id}    ({url})")
+            with workspace.Workspace(f"dl-{video_id}") as job:
+                partial = job.path(f"{video_id}.mp4")
+                with bandwidth.stage("twitch"), throughput.timed("twitch", partial):
+                    download_twitch_video(url, partial, job.temp_dir, rendition)
+                job.publish(partial, output_file)
+                fetched.append(output_file)
+    except Exception:
+        workspace.remove_files(fetched)
+        raise
+    finally:
+        for chat_job in chat_jobs:
+            chat_job.wait()
+    return video_files
+
+def download_streaming_to_vk(url, config, name, description, privacy, duration, chats=None):
+    """
+    --stream-upload: скачивает один VOD и одновременно загружает его в VK. TwitchDownloaderCLI
+    пишет обычный MP4 (moov в конце, только по завершении), поэтому VOD качается кусками по
+    STREAM_SLICE секунд (-b/-e): ffmpeg перепаковывает готовый кусок во фрагментированный MP4,
+    и его фрагменты дописываются в общий файл (mp4meta.append_fragments), который VK получает
+    по мере записи, пока качается следующий кусок. duration — длина VOD (preflight).
+    Главы кусков известны только после скачивания: VK загружается с описанием из таблицы,
+    а потом описание меняется на главы (video.edit). В кеш ложится обычный MP4 с главами.
+    Возвращает (video_files, vk_result): vk_result None — в VK не загружали, True — загружено,
+    иначе исключение VK.
+    """
+    video_id = url.split("/")[-1] if "twitch.tv" in url else url
+    output_file = workspace.cache_path(video_id)
+    if os.path.exists(output_file):
+        print(f"-> Twitch ID {video_id} уже скачан: {output_file}")
+        return [output_file], None
+    print(f"-> Скачивание Twitch ID: {video_id} с загрузкой в VK по ходу    ({url})")
+    job = workspace.Workspace(f"dl-{video_id}")
+    partial = job.path(f"{video_id}.frag.mp4")
+    errors = []
+    slices = []  # (начало куска, главы куска)
+    chat_job = chat.start(video_id, chats[video_id], TWITCH_DOWNLOADER_PATH) if chats and video_id in chats else None
+
+    def download():
+        try:
+            with bandwidth.stage("twitch"), open(partial, "wb") as out:
+                bounds = list(range(0, int(duration), STREAM_SLICE)) or [0]
+                sequence = 0
+                for i, start in enumerate(bounds):
+                    end = bounds[i + 1] if i + 1 < len(bounds) else None
+                    piece = job.path(f"{video_id}_{i}.mp4")
+                    fragments = job.path(f"{video_id}_{i}.frag.mp4")
+                    download_twitch_video(url, piece, job.temp_dir, beginning=start, ending=end,
+                                          progress=(start / duration, (end or duration) / duration))
+                    slices.append((start, get_chapters(piece)))
+                    subprocess.run(
+                        [FFMPEG_PATH, "-v", "error", "-y", "-i", piece, "-map", "0:v", "-map", "0:a?",
+                         "-map_chapters", "-1", "-c", "copy",
+                         "-movflags", "frag_keyframe+empty_moov+default_base_moof", fragments],
+                        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    sequence = mp4meta.append_fragments(fragments, out, start, sequence, init=i == 0)
+                    workspace.remove_files([piece, fragments])
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=download, daemon=True)
+    thread.start()
+    source = growfile.GrowingFile(partial, done=lambda: not thread.is_alive(),
+                                  error=lambda: errors[0] if errors else None)
+    vk_result = saved = None
+    try:
+        try:
+            saved = upload_video_to_vk(
+                config["vk_token"], config["vk_group_id"], partial,
+                config["vk_album_id"], name, description, privacy_view=privacy, stream=source)
+            print(f"-> VK: файл {video_id} загружен по ходу скачивания.")
+            logging.info(f"VK streamed upload ok for {video_id}")
+            vk_result = True
+        except Exception as e:
+            if not errors:
+                print(f"--!! Ошибка загрузки в VK: {e}")
+                logging.error(f"Ошибка VK для {video_id}: {e}")
+            vk_result = e
+        thread.join()
+        if errors:
+            raise errors[0]
+        chapters = merge_chapters(slices)
+        final_file = job.path(f"{video_id}.mp4")
+        command = [FFMPEG_PATH, "-v", "error", "-y", "-i", partial]
+        if chapters:
+            metadata_file = write_chapters_metadata(chapters, job.path("chapters.txt"))
+            command += ["-i", metadata_file, "-map_metadata", "1", "-map_chapters", "1"]
+        command += ["-map", "0", "-c", "copy", final_file]
+        with throughput.timed("remux", final_file):
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        job.publish(final_file, output_file)
+        if saved and chapters:
+            try:
+                edit_vk_description(config["vk_token"], config["vk_group_id"], saved,
+                                    create_description_from_chapters(chapters))
+            except Exception as e:
+                # видео уже в VK — повторная загрузка дала бы дубль, остаётся описание из таблицы
+                print(f"--!! VK: не удалось заменить описание на главы: {e}")
+                logging.error(f"Ошибка video.edit VK для {video_id}: {e}")
+    finally:
+        source.close()
+        job.cleanup()
+        if chat_job:
+            chat_job.wait()
+    return [output_file], vk_result
+
 ###########################
 # Вспомогательные функции #
 ###########################
 
 def get_video_duration(video_file):
+    # Сначала читаем moov напрямую, ffprobe — только если файл не разобрался
+    duration = mp4meta.read_duration(video_file)
+    if duration is not None:
+        return duration
     command = [
         FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1", video_file
@@ -126,6 +273,9 @@ def get_video_duration(video_file):
     return float(result.stdout.strip())
 
 def get_chapters(video_file):
+    chapters = mp4meta.read_chapters(video_file)
+    if chapters is not None:
+        return chapters
     command = [FFPROBE_PATH, "-v", "quiet", "-print_format", "json", "-show_chapters", video_file]
     result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
     try:
@@ -152,7 +302,34 @@ def create_description_from_chapters(chapters):
         description += f"{timestamp} - {title}\n"
     return description
 
-def create_concat_metadata(video_files):
+def merge_chapters(slices):
+    # главы кусков --stream-upload: сдвиг на начало куска, глава на стыке кусков склеивается
+    merged = []
+    for start, chapters in slices:
+        for chapter in chapters:
+            adjusted = dict(chapter)
+            adjusted["start_time"] = float(adjusted["start_time"]) + start
+            adjusted["end_time"] = float(adjusted["end_time"]) + start
+            previous = merged[-1] if merged else None
+            if previous and previous["tags"].get("title") == adjusted["tags"].get("title") \
+                    and adjusted["start_time"] - previous["end_time"] < 1:
+                previous["end_time"] = adjusted["end_time"]
+            else:
+                merged.append(adjusted)
+    return merged
+
+def write_chapters_metadata(chapters, metadata_file):
+    metadata_content = ";FFMETADATA1\n"
+    for chapter in chapters:
+        start = int(chapter["start_time"] * 1000)
+        end = int(chapter["end_time"] * 1000)
+        title = chapter["tags"].get("title", "Untitled")
+        metadata_content += f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle={title}\n"
+    with open(metadata_file, "w") as f:
+        f.write(metadata_content)
+    return metadata_file
+
+def create_concat_metadata(video_files, metadata_file="concat_metadata.txt"):
     cumulative_duration = 0
     all_chapters = []
     for video_file in video_files:
@@ -164,53 +341,91 @@ def create_concat_metadata(video_files):
             adjusted["end_time"] = float(adjusted["end_time"]) + cumulative_duration
             all_chapters.append(adjusted)
         cumulative_duration += duration
-    metadata_content = ";FFMETADATA1\n"
-    for chapter in all_chapters:
-        start = int(chapter["start_time"] * 1000)
-        end = int(chapter["end_time"] * 1000)
-        title = chapter["tags"].get("title", "Untitled")
-        metadata_content += f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle={title}\n"
-    metadata_file = "concat_metadata.txt"
-    with open(metadata_file, "w") as f:
-        f.write(metadata_content)
-    return metadata_file
+    return write_chapters_metadata(all_chapters, metadata_file)
 
 def concatenate_videos(video_files, output_file, metadata_file=None):
     print("Объединяю файлы...")
-    with open("concat_list.txt", "w") as f:
+    # список лежит рядом с результатом (в папке задания), пути в нём абсолютные
+    list_file = f"{output_file}.concat.txt"
+    with open(list_file, "w") as f:
         for video_file in video_files:
-            f.write(f"file '{video_file}'\n")
-    command = [FFMPEG_PATH, "-f", "concat", "-safe", "0", "-i", "concat_list.txt"]
+            f.write(f"file '{os.path.abspath(video_file)}'\n")
+    command = [FFMPEG_PATH, "-f", "concat", "-safe", "0", "-i", list_file]
     if metadata_file:
         command += ["-i", metadata_file, "-map_metadata", "1"]
     command += ["-c", "copy", output_file]
-    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    os.remove("concat_list.txt")
+    with throughput.timed("remux", output_file):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.remove(list_file)
     if metadata_file and os.path.exists(metadata_file):
         os.remove(metadata_file)
     print(f"Видео объединено в {output_file}")
 
-def split_single_video(video_file, max_dur=MAX_ALLOWED_DURATION):
+def split_single_video(video_file, max_dur=MAX_ALLOWED_DURATION, out_dir=None):
     duration = get_video_duration(video_file)
     if duration <= max_dur:
         return [video_file]
-    parts = int(math.ceil(duration / max_dur))
+    base = os.path.join(out_dir, os.path.basename(video_file[:-4])) if out_dir else video_file[:-4]
     result_files = []
-    for i in range(parts):
-        start_time = int(i * max_dur)
-        part_file = f"{video_file[:-4]}_part{i+1}.mp4"
-        cmd = [
-            FFMPEG_PATH, "-ss", str(start_time), "-i", video_file, "-t", str(max_dur), "-c", "copy", part_file
-        ]
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        result_files.append(part_file)
+    # границы частей — те же, что считает --plan
+    with throughput.timed("remux", video_file):
+        for i, (start_time, _) in enumerate(plan.split_boundaries(duration, max_dur)):
+            part_file = f"{base}_part{i+1}.mp4"
+            cmd = [
+                FFMPEG_PATH, "-ss", str(start_time), "-i", video_file, "-t", str(max_dur), "-c", "copy", part_file
+            ]
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            result_files.append(part_file)
     return result_files
 
+def sink_video(video_file, sink, row_plan, renditions, out_dir=None, video_urls=None):
+    """
+    Файл для площадки по плану строки (quality.plan_row): скачанный файл строки, вторая
+    скачанная версия Twitch или версия профиля --transcode (каждая — одна на строку,
+    renditions — {версия или профиль: файл}). Если вторую версию скачать или перекодировать
+    не вышло, площадка получает файл строки.
+    """
+    plan_entry = row_plan["sinks"].get(sink) or {}
+    rendition, profile = plan_entry.get("rendition"), plan_entry.get("transcode")
+    if rendition and rendition != row_plan["downloads"][0]:
+        if rendition not in renditions:
+            files = []
+            try:
+                files = download_row(video_urls, rendition=rendition)
+                if len(files) > 1:
+                    joined = os.path.join(out_dir or ".", f"concatenated_{rendition}.mp4")
+                    meta = create_concat_metadata(files, f"{joined[:-4]}_metadata.txt")
+                    concatenate_videos(files, joined, meta)
+                    workspace.remove_files(files)
+                    files = [joined]
+                renditions[rendition] = files[0]
+            except Exception as e:
+                workspace.remove_files(files)
+                print(f"--!! Не удалось скачать версию {rendition}, загружаю {video_file}: {e}")
+                logging.error(f"Ошибка скачивания версии {rendition}: {e}")
+                renditions[rendition] = video_file
+        video_file = renditions[rendition]
+    if not profile:
+        return video_file
+    if profile not in renditions:
+        base = os.path.join(out_dir, os.path.basename(video_file[:-4])) if out_dir else video_file[:-4]
+        try:
+            # главы — той же склейкой метаданных, что и при объединении файлов строки
+            metadata_file = create_concat_metadata([video_file], f"{base}_{profile}_metadata.txt")
+            renditions[profile] = transcode.transcode(video_file, f"{base}_{profile}.mp4", profile,
+                                                      FFMPEG_PATH, metadata_file)
+            os.remove(metadata_file)
+        except Exception as e:
+            print(f"--!! Не удалось перекодировать {video_file} в {profile}, загружаю исходник: {e}")
+            logging.error(f"Ошибка перекодирования {video_file} в {profile}: {e}")
+            renditions[profile] = video_file
+    return renditions[profile]
+
 #######################################
 # 2. Загрузка видео в VK              #
 #######################################
 
-def upload_video_to_vk(token, group_id, video_path, album_id, name, description, privacy_view="all"):
+def upload_video_to_vk(token, group_id, video_path, album_id, name, description, privacy_view="all", stream=None):
     logging.info(f"Загрузка файла {video_path} в VK...")
     params = {
         "access_token": token,
@@ -222,39 +437,62 @@ def upload_video_to_vk(token, group_id, video_path, album_id, name, description,
         "privacy_view": privacy_view,
         "privacy_comment": "all"
     }
-    response = requests.get("https://api.vk.ru/method/video.save", params=params).json()
+    response = requests.get(f"{VK_API_URL}/video.save", params=params).json()
     if "error" in response:
         raise Exception(f"Ошибка VK API: {response['error']['error_msg']}")
     upload_url = response["response"]["upload_url"]
-    with open(video_path, "rb") as video_file:
-        from requests_toolbelt import MultipartEncoder
-        encoder = MultipartEncoder(fields={"video_file": ("video_file", video_file, "video/mp4")})
-        headers = {"Content-Type": encoder.content_type}
-        upload_response = requests.post(upload_url, data=encoder, headers=headers)
+    # stream — канал filetee (--tee) или растущий файл (--stream-upload), иначе файл читается через mmap
+    if stream:
+        body = upload_body.MultipartBody(stream, getattr(stream, "len", None))
+    else:
+        body = upload_body.FileMultipartBody(video_path)
+    with body:
+        headers = {"Content-Type": body.content_type}
+        upload_response = requests.post(upload_url, data=bandwidth.wrap(body, "vk"), headers=headers)
         if not upload_response.ok:
             raise Exception(f"Ошибка при POST upload VK: {upload_response.text}")
     logging.info(f"{video_path} успешно загружен в VK.")
-    return True
+    return response["response"]
+
+def edit_vk_description(token, group_id, saved, description):
+    # saved — ответ video.save загруженного видео
+    params = {
+        "access_token": token,
+        "v": "5.199",
+        "owner_id": saved.get("owner_id", -abs(int(group_id))),
+        "video_id": saved["video_id"],
+        "desc": description
+    }
+    response = requests.get(f"{VK_API_URL}/video.edit", params=params).json()
+    if "error" in response:
+        raise Exception(f"Ошибка VK API: {response['error']['error_msg']}")
 
 #######################################
 # 3. Загрузка видео на YouTube        #
 #######################################
 
-def get_authenticated_youtube_service():
-    if os.path.exists(TOKEN_FILE):
-        credentials = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+def get_authenticated_youtube_service(token_file=TOKEN_FILE):
+    # Клиент Google тяжёлый при импорте — грузим только когда действительно нужен YouTube
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    if os.path.exists(token_file):
+        credentials = Credentials.from_authorized_user_file(token_file, SCOPES)
     else:
         flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
         credentials = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token:
+        with open(token_file, "w") as token:
             token.write(credentials.to_json())
     return build("youtube", "v3", credentials=credentials)
 
-def upload_to_youtube(video_file, title, description, tags):
-    print(f"Загружаю {video_file} на YouTube...")
-    logging.info(f"Загрузка {video_file} на YouTube")
+def upload_to_youtube(video_file, title, description, tags, stream=None, account=None, channel=None):
+    # account — аккаунт пула, выданный pick() (None — лучший аккаунт канала channel)
+    account = account or youtube_accounts.get_pool().pick(channel)
+    if account is None:
+        raise RuntimeError("квота YouTube на сегодня исчерпана на всех аккаунтах пула")
+    print(f"Загружаю {video_file} на YouTube (аккаунт {account.name})...")
+    logging.info(f"Загрузка {video_file} на YouTube через аккаунт {account.name}")
     start_time = datetime.now()
-    youtube = get_authenticated_youtube_service()
     body = {
         "snippet": {
             "title": title,
@@ -266,14 +504,69 @@ def upload_to_youtube(video_file, title, description, tags):
             "privacyStatus": "private"
         }
     }
-    media = MediaFileUpload(video_file, chunksize=-1, resumable=True)
-    request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
-    response = request.execute()
+    from googleapiclient.http import MediaIoBaseUpload
+    # медиапоток идёт через общий ограничитель полосы (bandwidth.json)
+    stream = bandwidth.wrap(stream or open(video_file, "rb"), "youtube")
+    try:
+        youtube = account.service(get_authenticated_youtube_service)
+        media = MediaIoBaseUpload(stream, mimetype="video/mp4", chunksize=-1, resumable=True)
+        request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
+        response = request.execute()
+    except Exception as e:
+        if quota.is_quota_error(e):
+            account.ledger.exhaust()
+        raise
+    finally:
+        stream.close()
+        account.release()
+    account.record()
     end_time = datetime.now()
     elapsed = (end_time - start_time).total_seconds()
     size_mb = os.path.getsize(video_file) / (1024 * 1024)
     print(f"  {video_file} ({size_mb:.2f} MB) загружено на YouTube за {int(elapsed//60)} мин {int(elapsed%60)} сек.")
 
+def upload_teed(config, video_file, name, description, tags, privacy, window_mb, account=None):
+    """
+    VK и YouTube одновременно из одного чтения файла (filetee). Возвращает (vk_ok, youtube_ok).
+    """
+    tee = filetee.FileTee(video_file, window_mb)
+    sinks = {"VK": tee.sink("vk"), "YouTube": tee.sink("youtube")}
+    jobs = {
+        "VK": lambda: upload_video_to_vk(
+            config["vk_token"], config["vk_group_id"], video_file, config["vk_album_id"],
+            name, description, privacy_view=privacy, stream=sinks["VK"]),
+        "YouTube": lambda: upload_to_youtube(video_file, name, description, tags,
+                                             stream=sinks["YouTube"], account=account),
+    }
+    errors = {}
+
+    def run(platform):
+        try:
+            jobs[platform]()
+            errors[platform] = None
+        except Exception as e:
+            errors[platform] = e
+        finally:
+            # упавшая загрузка не должна держать окно чтения для остальных
+            sinks[platform].close()
+
+    print(f"-> Загрузка в VK и на YouTube из одного чтения файла: {video_file}")
+    tee.start()
+    threads = [threading.Thread(target=run, args=(p,)) for p in jobs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    tee.close()
+    for platform, error in errors.items():
+        if error is None:
+            print(f"-> {platform}: файл {video_file} успешно загружен.")
+            logging.info(f"{platform} upload ok for {video_file}")
+        else:
+            print(f"--!! Ошибка загрузки в {platform}: {error}")
+            logging.error(f"Ошибка {platform} для {video_file}: {error}")
+    return errors["VK"] is None, errors["YouTube"] is None
+
 def add_part_to_title(title, part_number):
     last_open_paren = title.rfind("(")
     if last_open_paren == -1:
@@ -290,7 +583,53 @@ def add_part_to_title(title, part_number):
 # 4. Основной процесс                   #
 #########################################
 
-def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99, debug=False):
+def make_plan(start_row, end_row, do_vk, do_youtube, max_uploads, tee_window, plan_file):
+    """
+    --plan: план пачки без скачивания — preflight через Helix и та же склейка/нарезка,
+    что при загрузке. Сохраняется в plan_file для запуска с --from-plan.
+    """
+    if not os.path.exists(STREAMS_FILE):
+        print(f"Не найден {STREAMS_FILE}, проверьте наличие.")
+        return None
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
+    rows = [(r.number, str(r.iloc[1]).split()) for r in records if manifest.notna(r.iloc[1])]
+    preflight_plan = plan.run_preflight(rows)
+    if not preflight_plan:
+        print("--plan: без данных Helix (длительности VOD) план не построить.")
+        return None
+    pool = youtube_accounts.get_pool() if do_youtube else None
+    batch = plan.build_batch(
+        preflight_plan, lambda durations: plan.layout_concat(durations, MAX_ALLOWED_DURATION),
+        names={r.number: str(r.iloc[2]) if manifest.notna(r.iloc[2]) else "" for r in records},
+        title=add_part_to_title,
+        platforms=[p for p, on in (("vk", do_vk), ("youtube", do_youtube)) if on],
+        pool=pool, channels={r.number: youtube_accounts.row_channel(r) for r in records},
+        max_uploads=max_uploads, tee=bool(tee_window))
+    plan.print_batch(batch)
+    if pool:
+        pool.report(batch["totals"]["youtube_parts"])
+    plan.save_plan(batch, plan_file)
+    print(f"План сохранён в {plan_file}, запуск по нему: --from-plan {plan_file}")
+    return batch
+
+def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99, debug=False, preflight=True,
+         schedule="sheet", retention_days=scheduler.RETENTION_DAYS, prefetch=3, queue_file=None, worker=None,
+         tee_window=None, stream_upload=False, part_workers=partupload.PART_WORKERS,
+         plan_file=None, from_plan=None, chat_download=False, chat_render=False, transcode_profiles=None,
+         max_quality=None):
+    if plan_file:
+        return make_plan(start_row, end_row, do_vk, do_youtube, max_uploads, tee_window, plan_file)
+    transcode_profiles = transcode_profiles or {}
+    max_quality = max_quality or {}
+    saved_plan = None
+    if from_plan:
+        # запуск по плану --plan: его диапазон, платформы и лимит, данные Helix — из плана
+        saved_plan = plan.load_plan(from_plan)
+        start_row, end_row = saved_plan["range"]
+        do_vk = "vk" in saved_plan["platforms"]
+        do_youtube = "youtube" in saved_plan["platforms"]
+        max_uploads = saved_plan.get("max_uploads") or max_uploads
+        print(f"Запуск по плану {from_plan}: строки {start_row}–{end_row}, {', '.join(saved_plan['platforms'])}")
     ensure_twitch_downloader()
     if do_vk:
         config = setup_vkontakte_config()
@@ -306,113 +645,303 @@ def main(start_row=1, end_row=None, do_vk=True, do_youtube=True, max_uploads=99,
         print(f"Не найден {STREAMS_FILE}, проверьте наличие.")
         return
 
-    print("Очистка временных .mp4 файлов перед запуском...")
-    for f in os.listdir():
-        if f.endswith(".mp4"):
-            os.remove(f)
+    # чужие рабочие папки не трогаем — только оставшиеся от завершившихся процессов
+    workspace.cleanup_stale()
 
-    df = pd.read_excel(STREAMS_FILE)
-    start_index = max(0, start_row - 1)
-    end_index = end_row if end_row is not None else len(df)
+    # читаем только строки --start..--end
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
     uploaded_count = 0
 
-    for index in range(start_index, end_index):
-        row = df.iloc[index]
+    # ---- Preflight: все VOD диапазона одной пачкой через Helix ----
+    rows = [(r.number, str(r.iloc[1]).split()) for r in records if manifest.notna(r.iloc[1])]
+    if saved_plan:
+        plan_data = saved_plan
+        stale = plan.stale_rows(saved_plan, rows)
+        if stale:
+            print(f"Строки {', '.join(map(str, sorted(stale)))} изменились после --plan, пропускаю их.")
+        dead = plan.dead_rows(plan_data) | stale
+    else:
+        plan_data = plan.run_preflight(rows) if preflight else None
+        dead = plan.dead_rows(plan_data)
+
+    # ---- Дневная квота YouTube по пулу аккаунтов: YouTube-only строки, которые сегодня ----
+    # ---- не загрузить на их канал, не качаем ----
+    pool = youtube_accounts.get_pool() if do_youtube else None
+    channels = {r.number: youtube_accounts.row_channel(r) for r in records}
+    deferred = set()
+    youtube_pending = 0
+    durations = {r["row"]: r["duration"] for r in plan_data["rows"]} if plan_data else {}
+    if pool:
+        rows_parts = [(n, quota.parts_needed(durations.get(n), MAX_ALLOWED_DURATION), channels[n])
+                      for n, _ in rows if n not in dead]
+        parts_by_row = {n: parts for n, parts, _ in rows_parts}
+        if not do_vk:
+            deferred_rows = pool.split_today(rows_parts, max_uploads)
+            deferred = set(deferred_rows)
+            youtube_pending = sum(parts_by_row[n] for n in deferred)
+            if deferred:
+                print(f"Квота YouTube: строки {', '.join(map(str, deferred_rows))} сегодня не загрузить, "
+                      f"откладываю до сброса квоты.")
+        pool.report(sum(parts_by_row.values()))
+    rows_today = [(n, urls) for n, urls in rows if n not in deferred]
+
+    # ---- --max-quality / --transcode: какие версии VOD качать для площадок строки ----
+    row_plans = {}
+    for n, _ in rows:
+        sinks = {}
+        if do_vk:
+            sinks["vk"] = (max_quality.get("vk"), transcode_profiles.get("vk"))
+        # строке, которую сегодня на YouTube не загрузить, версия для YouTube не нужна
+        if do_youtube and pool.uploads_left(channels.get(n)) > 0:
+            sinks["youtube"] = (max_quality.get("youtube"), transcode_profiles.get("youtube"))
+        row_plans[n] = quality.plan_row(sinks)
+    rendition_by_urls = {tuple(urls): row_plans[n]["downloads"][0] for n, urls in rows}
+
+    # ---- --chat: файлы чата из колонки I, чат качается вместе с видео ----
+    chats = {}
+    if chat_download or chat_render:
+        for r in records:
+            if manifest.notna(r.iloc[1]):
+                chats.update(chat.row_chat_files(
+                    r, [u.split("/")[-1] if "twitch.tv" in u else u for u in str(r.iloc[1]).split()]))
+
+    # ---- Живой прогноз окончания (нужны размеры из preflight; в режиме очереди ----
+    # ---- неизвестно, какие строки достанутся этому воркеру) ----
+    if plan_data and not queue_file:
+        eta.start(plan.build_batch(plan_data, lambda durations: plan.layout_concat(durations, MAX_ALLOWED_DURATION),
+                                   platforms=[p for p, on in (("vk", do_vk), ("youtube", do_youtube)) if on]),
+                  rows={n for n, _ in rows_today if n not in dead}, tee=bool(tee_window))
+
+    # ---- Общая очередь нескольких машин: строки забираются с арендой ----
+    queue = None
+    if queue_file:
+        queue = workqueue.WorkQueue(queue_file, worker)
+        deadlines = scheduler.row_deadlines(plan_data, retention_days) if plan_data else None
+        queue.fill([n for n, _ in rows_today if n not in dead], deadlines)
+        print(f"Режим очереди {queue_file}, воркер {queue.worker}")
+
+    # ---- Скачивание по сроку удаления VOD, загрузка — по порядку таблицы ----
+    sched = None
+    if schedule == "expiry":
+        if queue:
+            print("В режиме очереди строки и так выдаются по сроку удаления VOD, --schedule expiry не нужен.")
+        elif plan_data:
+            sched = scheduler.start_for_plan(
+                plan_data, rows_today, lambda urls: download_row(urls, chats, rendition_by_urls.get(tuple(urls))),
+                retention_days, prefetch)
+        else:
+            print("Режим --schedule expiry требует preflight (даты VOD из Helix), качаю по порядку таблицы.")
+
+    for row, lease in workqueue.iter_rows(records, queue):
+        index = row.number - 1
         # ---- Пропускаем пустые строки ----
-        if pd.isna(row.iloc[1]):
+        if manifest.isna(row.iloc[1]):
             print(f"Строка {index+1}: нет Twitch-ссылки, пропускаю.")
             continue
+        if index + 1 in dead:
+            print(f"Строка {index+1}: VOD недоступен на Twitch (preflight), пропускаю.")
+            logging.warning(f"Строка {index+1} пропущена по результатам preflight")
+            continue
+        if index + 1 in deferred:
+            print(f"Строка {index+1}: отложена до сброса квоты YouTube.")
+            continue
 
         print(f"\n[{index+1}] Обрабатываю...")
 
-        video_urls = row.iloc[1].split()
-        video_files = []
+        video_urls = str(row.iloc[1]).split()
+        channel = channels.get(index + 1)
+        privacy = "2" if (len(row) > 7 and manifest.notna(row.iloc[7]) and str(row.iloc[7]) == "1") else "all"
+        row_plan = row_plans.get(index + 1) or quality.plan_row({})
+        if row_plan["downloads"] != [quality.SOURCE]:
+            print(f"-> Качество: {quality.describe(row_plan)}")
         # ---- Скачивание (поочерёдно, чтобы видно было url/id) ----
-        for url in video_urls:
-            video_id = url.split("/")[-1] if "twitch.tv" in url else url
-            output_file = f"{video_id}.mp4"
-            print(f"-> Скачивание Twitch ID: {video_id}    ({url})")
-            download_twitch_video(url, output_file)
-            video_files.append(output_file)
+        vk_streamed = None  # итог VK при --stream-upload (None — VK загружается как обычно)
+        try:
+            if sched:
+                video_files = sched.wait(index + 1)
+            elif stream_upload and do_vk and not (lease and "vk" in lease.done) and len(video_urls) == 1 \
+                    and durations.get(index + 1) and row_plan["downloads"] == [quality.SOURCE] \
+                    and not row_plan["sinks"]["vk"]["transcode"]:
+                # куски VOD нарезаются по длине из preflight; главы будут только после скачивания —
+                # VK получает описание из таблицы и потом главы через video.edit
+                with eta.stage(index + 1, "vk"):
+                    video_files, vk_streamed = download_streaming_to_vk(
+                        video_urls[0], config,
+                        str(row.iloc[2]) if manifest.notna(row.iloc[2]) else "",
+                        str(row.iloc[3]) if manifest.notna(row.iloc[3]) else "", privacy,
+                        durations[index + 1], chats)
+            else:
+                video_files = download_row(video_urls, chats, row_plan["downloads"][0])
+        except Exception as e:
+            print(f"--!! Ошибка скачивания, строка {index+1} пропущена: {e}")
+            logging.error(f"Ошибка скачивания для строки {index+1}: {e}")
+            if lease:
+                lease.fail(e)
+            eta.row_done(index + 1)
+            continue
+        if lease and lease.lost:
+            print(f"Строка {index+1}: аренду забрал другой воркер, пропускаю.")
+            workspace.remove_files(video_files)
+            continue
+
+        # ---- --chat-render: чат рендерится на CPU, пока строка загружается в сеть ----
+        render_job = None
+        if chat_render:
+            video_ids = [u.split("/")[-1] if "twitch.tv" in u else u for u in video_urls]
+            render_job = chat.start_render([chats[v] for v in video_ids if v in chats],
+                                           TWITCH_DOWNLOADER_PATH, FFMPEG_PATH, concatenate_videos)
+
+        # ---- Склейка и части строки живут в её рабочей папке ----
+        job = workspace.Workspace(f"row-{index+1}")
 
         # ---- Объединяем если их несколько ----
         if len(video_files) > 1:
-            metadata_file = create_concat_metadata(video_files)
-            final_file = f"concatenated_{index+1}.mp4"
-            concatenate_videos(video_files, final_file, metadata_file)
-            for f in video_files:
-                if os.path.exists(f):
-                    os.remove(f)
+            metadata_file = create_concat_metadata(video_files, job.path("concat_metadata.txt"))
+            final_file = job.path(f"concatenated_{index+1}.mp4")
+            with eta.stage(index + 1, "remux"):
+                concatenate_videos(video_files, final_file, metadata_file)
+            workspace.remove_files(video_files)
             video_file = final_file
         else:
             video_file = video_files[0]
 
         # ---- Извлекаем описания, заголовки и теги ----
-        name = str(row.iloc[2]) if pd.notna(row.iloc[2]) else ""
+        name = str(row.iloc[2]) if manifest.notna(row.iloc[2]) else ""
         chapters = get_chapters(video_file)
-        tags = str(row.iloc[4]) if pd.notna(row.iloc[4]) else ""
+        tags = str(row.iloc[4]) if manifest.notna(row.iloc[4]) else ""
         if chapters:
             description = create_description_from_chapters(chapters)
         else:
-            description = str(row.iloc[3]) if pd.notna(row.iloc[3]) else ""
+            description = str(row.iloc[3]) if manifest.notna(row.iloc[3]) else ""
+
+        # ---- --max-quality / --transcode: площадки получают свою версию по плану строки ----
+        renditions = {}
+
+        # ---- Площадки, куда строка уже загружена прошлыми попытками очереди, не повторяем ----
+        row_done = set(lease.done) if lease else set()
+        need_vk = do_vk and "vk" not in row_done
+        need_youtube = do_youtube and "youtube" not in row_done
+
+        # ---- --stream-upload: VK уже загружен по ходу скачивания ----
+        vk_ok = youtube_ok = True
+        if vk_streamed is not None:
+            vk_ok = vk_streamed is True
+            if not vk_ok and lease:
+                lease.fail(vk_streamed)
+        if lease and lease.lost:
+            print(f"Строка {index+1}: аренду забрал другой воркер, не загружаю.")
+            need_vk = need_youtube = vk_ok = youtube_ok = False
+
+        # ---- --tee: VK и YouTube одновременно, файл читается с диска один раз ----
+        teed = bool(tee_window) and need_vk and vk_streamed is None and need_youtube \
+            and uploaded_count < max_uploads and pool.uploads_left(channel) > 0 \
+            and row_plan["sinks"].get("vk") == row_plan["sinks"].get("youtube") \
+            and get_video_duration(video_file) <= MAX_ALLOWED_DURATION
+        if teed:
+            teed_file = sink_video(video_file, "vk", row_plan, renditions, job.dir, video_urls)
+            with eta.stage(index + 1, "vk"), eta.stage(index + 1, "youtube"):
+                vk_ok, youtube_ok = upload_teed(config, teed_file, name, description, tags, privacy,
+                                                tee_window, pool.pick(channel))
+            if youtube_ok:
+                uploaded_count += 1
+            if not vk_ok and lease:
+                lease.fail("ошибка загрузки в VK")
 
         # ---- 1. Сначала VK ----
-        vk_ok = True
-        if do_vk:
+        if need_vk and not teed and vk_streamed is None:
+            vk_file = sink_video(video_file, "vk", row_plan, renditions, job.dir, video_urls)
             try:
-                print(f"-> Загрузка в VK: {video_file}")
-                privacy = "2" if (len(row) > 7 and pd.notna(row.iloc[7]) and str(row.iloc[7]) == "1") else "all"
-                upload_video_to_vk(
-                    config["vk_token"], config["vk_group_id"], video_file,
-                    config["vk_album_id"], name, description, privacy_view=privacy)
-                print(f"-> VK: файл {video_file} успешно загружен.")
-                logging.info(f"VK upload ok for {video_file}")
+                print(f"-> Загрузка в VK: {vk_file}")
+                with eta.stage(index + 1, "vk"):
+                    upload_video_to_vk(
+                        config["vk_token"], config["vk_group_id"], vk_file,
+                        config["vk_album_id"], name, description, privacy_view=privacy)
+                print(f"-> VK: файл {vk_file} успешно загружен.")
+                logging.info(f"VK upload ok for {vk_file}")
             except Exception as e:
                 print(f"--!! Ошибка загрузки в VK: {e}")
-                logging.error(f"Ошибка VK для {video_file}: {e}")
+                logging.error(f"Ошибка VK для {vk_file}: {e}")
                 vk_ok = False
+                if lease:
+                    lease.fail(e)
 
         # ---- 2. YouTube, если надо, и VK успешен ----
-        if do_youtube and vk_ok:
+        if need_youtube and lease and lease.lost:
+            print(f"Строка {index+1}: аренду забрал другой воркер после VK, на YouTube не загружаю.")
+            need_youtube = youtube_ok = False
+        if need_youtube and vk_ok and not teed and not pool.uploads_left(channel):
+            # нарезать и загружать сегодня бессмысленно — квота кончилась
+            print(f"Квота YouTube на сегодня исчерпана, строка {index+1} на YouTube не загружена.")
+            youtube_pending += quota.parts_needed(get_video_duration(video_file), MAX_ALLOWED_DURATION)
+            youtube_ok = False
+        elif need_youtube and vk_ok and not teed:
             to_upload = []
-            duration = get_video_duration(video_file)
+            youtube_file = sink_video(video_file, "youtube", row_plan, renditions, job.dir, video_urls)
+            duration = get_video_duration(youtube_file)
             # разделить на части если дольше лимита YouTube
             if duration > MAX_ALLOWED_DURATION:
-                parts = split_single_video(video_file)
+                with eta.stage(index + 1, "remux"):
+                    parts = split_single_video(youtube_file, out_dir=job.dir)
                 to_upload.extend(parts)
             else:
-                to_upload.append(video_file)
+                to_upload.append(youtube_file)
 
+            # названия и описания частей — до загрузки, чтобы нумерация не зависела от порядка завершения
+            parts = []
+            quota_left = pool.uploads_left(channel)
             for i, upload_file in enumerate(to_upload):
-                if uploaded_count >= max_uploads:
+                if uploaded_count + len(parts) >= max_uploads:
                     print("Достигнут лимит YouTube загрузок (max-uploads).")
                     break
+                if len(parts) >= quota_left:
+                    print("Квота YouTube на сегодня исчерпана.")
+                    youtube_pending += len(to_upload) - i
+                    break
                 y_chapters = get_chapters(upload_file)
                 y_description = create_description_from_chapters(y_chapters) if y_chapters else description
                 yt_title = add_part_to_title(name, i+1) if len(to_upload) > 1 else name
-                try:
-                    upload_to_youtube(upload_file, yt_title, y_description, tags)
+                parts.append((upload_file, yt_title, y_description))
+            youtube_ok = len(parts) == len(to_upload)
+
+            with eta.stage(index + 1, "youtube"):
+                results = partupload.upload_parts(
+                    parts, lambda part: upload_to_youtube(*part, tags, channel=channel), part_workers)
+            for (upload_file, _, _), error in results:
+                if error is None:
                     print(f"-> YouTube: {upload_file} успешно загружен.")
                     logging.info(f"YouTube upload ok for {upload_file}")
                     uploaded_count += 1
-                except Exception as e:
-                    print(f"--!! Ошибка загрузки на YouTube: {e}")
-                    logging.error(f"Ошибка YouTube для {upload_file}: {e}")
-
-        # ---- Удаляем главный файл и части после загрузки на платформы ----
-        try:
-            files_for_cleanup = set(video_files + ([video_file] if video_file not in video_files else []))
-            # если файл делился на части, тоже почистим
-            for f in os.listdir():
-                if (f.startswith(video_file[:-4]) and f.endswith(".mp4")) or f in files_for_cleanup:
-                    try:
-                        os.remove(f)
-                    except:
-                        pass
-            print(f"Удалены все временные файлы для строки {index+1}.")
-        except Exception as e:
-            print(f"Ошибка при удалении файлов: {e}")
-
+                else:
+                    print(f"--!! Ошибка загрузки на YouTube: {error}")
+                    logging.error(f"Ошибка YouTube для {upload_file}: {error}")
+                    youtube_ok = False
+
+        if lease and os.path.exists(video_file):
+            lease.add_bytes(os.path.getsize(video_file))
+        if lease:
+            lease.mark_done(row_done | {p for p, needed, ok in (("vk", need_vk, vk_ok),
+                                                               ("youtube", need_youtube, youtube_ok)) if needed and ok})
+            if not (vk_ok and youtube_ok):
+                # YouTube не догружен (ошибка части, квота) — строка возвращается в очередь
+                lease.fail(lease.error or "загружено не на все площадки")
+
+        # ---- Удаляем скачанное (и вторые версии) и рабочую папку строки (склейка, части) ----
+        workspace.remove_files(video_files)
+        workspace.remove_files(renditions.values())
+        job.cleanup()
+        print(f"Удалены все временные файлы для строки {index+1}.")
+        if sched:
+            sched.release(index + 1)
+        if render_job:
+            render_job.wait()
+        eta.row_done(index + 1)
+
+    eta.stop()
+    if queue:
+        queue.report()
+        queue.close()
+    if pool:
+        pool.report(youtube_pending)
     print("\nВыполнено!\n")
 
 
@@ -424,9 +953,49 @@ if __name__ == "__main__":
     parser.add_argument("--youtube", action="store_true", help="Загружать только YouTube")
     parser.add_argument("--max-uploads", type=int, default=99, help="Максимум файлов для YouTube за запуск")
     parser.add_argument("--debug", action="store_true", help="Подробный лог")
+    parser.add_argument("--no-preflight", action="store_true", help="Не проверять VOD через Helix перед запуском")
+    parser.add_argument("--schedule", choices=["sheet", "expiry"], default="sheet",
+                        help="Порядок скачивания: по таблице или по сроку удаления VOD на Twitch")
+    parser.add_argument("--retention-days", type=int, default=scheduler.RETENTION_DAYS,
+                        help="Срок хранения архивов на канале, дней")
+    parser.add_argument("--prefetch", type=int, default=3, help="Сколько строк можно скачать наперёд")
+    parser.add_argument("--queue", metavar="FILE",
+                        help="Общая очередь строк (SQLite на общем хранилище) для нескольких машин")
+    parser.add_argument("--worker", help="Имя воркера в очереди (по умолчанию host-pid)")
+    parser.add_argument("--tee", nargs="?", type=float, const=filetee.DEFAULT_WINDOW_MB, metavar="MB",
+                        help="Загружать в VK и на YouTube одновременно из одного чтения файла; MB — окно "
+                             "опережения чтения (по умолчанию %(const)s). YouTube не ждёт успеха VK")
+    parser.add_argument("--part-workers", type=int, default=partupload.PART_WORKERS,
+                        help="Сколько частей длинного видео загружать на YouTube одновременно")
+    parser.add_argument("--stream-upload", action="store_true",
+                        help="Строки из одного VOD загружать в VK по ходу скачивания: VOD качается "
+                             "кусками и собирается во фрагментированный MP4 (нужен preflight); "
+                             "описание с главами VK получает после скачивания")
+    parser.add_argument("--plan", nargs="?", const=plan.BATCH_PLAN_FILE, metavar="FILE",
+                        help="Ничего не скачивая, посчитать время, пик диска, части и квоту YouTube "
+                             "и сохранить план (по умолчанию %(const)s)")
+    parser.add_argument("--from-plan", metavar="FILE", help="Запустить сохранённый план --plan как есть")
+    parser.add_argument("--chat", action="store_true",
+                        help="Скачивать чат VOD (chatdownload) вместе с видео в файл из колонки I")
+    parser.add_argument("--chat-render", action="store_true",
+                        help="Скачивать чат и рендерить его в видео (<файл чата>.mp4) кусками на всех ядрах")
+    parser.add_argument("--transcode", action="append", metavar="ПЛОЩАДКА=ПРОФИЛЬ",
+                        help="Загружать на площадку (vk, youtube) перекодированную версию: профиль "
+                             f"{', '.join(transcode.PROFILES)}; кодируется кусками на всех ядрах, главы сохраняются")
+    parser.add_argument("--max-quality", action="append", metavar="ПЛОЩАДКА=КАЧЕСТВО",
+                        help="Наибольшее нужное площадке (vk, youtube) качество, например vk=720p: "
+                             "скачивается самая дешёвая версия Twitch, которой хватает всем площадкам строки")
     args = parser.parse_args()
+    try:
+        transcode_profiles = transcode.parse_sinks(args.transcode, ("vk", "youtube"))
+        max_quality = quality.parse_caps(args.max_quality, ("vk", "youtube"))
+    except ValueError as e:
+        parser.error(str(e))
     # Флаги: если не выставлено ни одного, то обе платформы ("по умолчанию")
     do_vk = args.vk or (not args.vk and not args.youtube)
     do_youtube = args.youtube or (not args.vk and not args.youtube)
-    main(args.start, args.end, do_vk, do_youtube, args.max_uploads, args.debug)
+    main(args.start, args.end, do_vk, do_youtube, args.max_uploads, args.debug, not args.no_preflight,
+         args.schedule, args.retention_days, args.prefetch, args.queue, args.worker, args.tee,
+         args.stream_upload, args.part_workers, args.plan, args.from_plan, args.chat,
+         args.chat_render, transcode_profiles, max_quality)
 
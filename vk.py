@@ -1,4 +1,3 @@
-import pandas as pd
 import subprocess
 import os
 import requests
@@ -12,33 +11,31 @@ import logging
 import zipfile
 import urllib.request
 import sys
-from requests_toolbelt import MultipartEncoder
+
+import bandwidth
+import manifest
+import mp4meta
+import quality
+import throughput
+import toolcache
+import transcode
+import upload_body
+import waiting
+import workspace
 
 # Константы остаются без изменений
 CONFIG_FILE = "config.json"
 INSTALLED_FILE = ".installed"
-# TWITCH_DOWNLOADER_URL = "https://github.com/lay295/TwitchDownloader/releases/download/1.55.2/TwitchDownloaderCLI-1.55.2-Linux-x64.zip"
+TWITCH_DOWNLOADER_PATH = "TwitchDownloaderCLI/TwitchDownloaderCLI"
 LBRYNET_URL = "https://github.com/lbryio/lbry-sdk/releases/latest/download/lbrynet-linux.zip"
+LBRYNET_API_URL = "http://localhost:5279"
+LBRY_BLOB_SIZE = 2 * 1024 * 1024
+VK_API_URL = "https://api.vk.ru/method"
 
-def get_latest_twitch_downloader_url():
-    """Получает ссылку на последнюю версию TwitchDownloaderCLI для Linux x64 с GitHub."""
-    api_url = "https://api.github.com/repos/lay295/TwitchDownloader/releases/latest"
-    response = requests.get(api_url)
-    response.raise_for_status()
-    release_data = response.json()
-    for asset in release_data.get("assets", []):
-        name = asset.get("name", "")
-        if name.endswith("Linux-x64.zip") and name.startswith("TwitchDownloaderCLI-"):
-            return asset["browser_download_url"]
-    raise Exception("Не удалось найти подходящий TwitchDownloaderCLI для Linux x64")
+_lbrynet = None  # процесс `lbrynet start`, запущенный этим скриптом
 
 def install_dependencies():
-    logging.info("Скачивание TwitchDownloaderCLI...")
-    twitch_url = get_latest_twitch_downloader_url()
-    urllib.request.urlretrieve(twitch_url, "TwitchDownloaderCLI.zip")
-    with zipfile.ZipFile("TwitchDownloaderCLI.zip", "r") as zip_ref:
-        zip_ref.extractall("TwitchDownloaderCLI")
-    os.remove("TwitchDownloaderCLI.zip")
+    # TwitchDownloaderCLI ставится не здесь, а в общий кеш toolcache при каждом запуске main
     logging.info("Скачивание lbrynet...")
     urllib.request.urlretrieve(LBRYNET_URL, "lbrynet.zip")
     with zipfile.ZipFile("lbrynet.zip", "r") as zip_ref:
@@ -91,50 +88,76 @@ def setup_config():
     return config
 
 def start_lbrynet():
+    global _lbrynet
     logging.info("Запускаю lbrynet...")
-    subprocess.Popen(["sudo", "lbrynet", "start"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _lbrynet = subprocess.Popen(["sudo", "lbrynet", "start"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # выход процесса будит ожидание сразу, не дожидаясь очередного опроса
+    exited = threading.Event()
+    threading.Thread(target=lambda p=_lbrynet: (p.wait(), exited.set()), daemon=True).start()
     required_components = ["wallet", "file_manager", "blob_manager", "database"]
-    while True:
+
+    def ready():
         try:
             status = lbrynet_call("status")
-            logging.info("Ждем включения компонентов lbrynet")
-            component_status = status.get("startup_status", {})
-            if all(component_status.get(component, False) for component in required_components):
-                logging.info("Все компоненты lbrynet готовы к работе.")
-                break
-            else:
-                logging.info(f"Ожидаю запуска компонентов: {component_status}")
         except Exception as e:
-            logging.error(f"Ошибка при проверке статуса: {e}")
-        time.sleep(15)
+            if exited.is_set():
+                # демон не поднялся и процесс уже завершился — ждать нечего
+                raise RuntimeError(f"lbrynet завершился с кодом {_lbrynet.returncode}: {e}")
+            logging.debug(f"lbrynet ещё не отвечает: {e}")
+            return False
+        component_status = status.get("startup_status", {})
+        if all(component_status.get(component, False) for component in required_components):
+            return True
+        logging.info(f"Ожидаю запуска компонентов: {component_status}")
+        return False
+
+    waiting.poll(ready, "lbrynet start", max_interval=15, wake=exited, legacy=(0, 15))
+    logging.info("Все компоненты lbrynet готовы к работе.")
+
+def lbrynet_stopped():
+    if _lbrynet is not None and _lbrynet.poll() is not None:
+        return True
+    return not waiting.port_open(LBRYNET_API_URL)
 
 def stop_lbrynet():
     logging.info("Останавливаю lbrynet...")
     subprocess.run(["lbrynet", "stop"])
-    time.sleep(5)
+    # ждём выхода демона (он отпускает blob-файлы), но не дольше прежних 5 с
+    waiting.poll(lbrynet_stopped, "lbrynet stop", max_interval=1, deadline=5, legacy=(5, None))
 
-def download_twitch_video(video_url, output_file, progress_dict, lock, thread_id):
+def download_twitch_video(video_url, output_file, progress_dict, lock, thread_id, temp_dir="temp", rendition=None):
     start_time = datetime.now()
     video_id = video_url.split("/")[-1] if "twitch.tv" in video_url else video_url
     command = [
-        "TwitchDownloaderCLI/TwitchDownloaderCLI", "videodownload", "--id", video_id, "-o", output_file,
-        "--threads", "20", "--temp-path", "temp"
+        TWITCH_DOWNLOADER_PATH, "videodownload", "--id", video_id, "-o", output_file,
+        "--threads", "20", "--temp-path", temp_dir
     ]
+    if rendition and rendition != quality.SOURCE:
+        command += ["-q", rendition]
     logging.info(f"Скачиваю видео с ID {video_id} в {output_file}...")
     
     # Запускаем процесс и перенаправляем вывод в PIPE
     process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     
-    # Читаем вывод построчно в реальном времени
-    while process.poll() is None:
-        line = process.stdout.readline().strip()
-        if line and "may not have enough free space" not in line:  # Фильтруем ненужные строки
-            with lock:
-                progress_dict[thread_id] = line  # Сохраняем последнюю строку прогресса для этого потока
+    # Читаем вывод построчно в реальном времени; пока идёт скачивание, загрузки уступают ему полосу
+    with bandwidth.stage("twitch"):
+        while process.poll() is None:
+            line = process.stdout.readline().strip()
+            if line and "may not have enough free space" not in line:  # Фильтруем ненужные строки
+                with lock:
+                    progress_dict[thread_id] = line  # Сохраняем последнюю строку прогресса для этого потока
     
     # После завершения процесса фиксируем итоговую информацию
     end_time = datetime.now()
     download_time = (end_time - start_time).total_seconds()
+    if process.wait() != 0 or not os.path.exists(output_file):
+        # VOD удалён или недоступен — строка не загружается, поток не падает
+        msg = f"Ошибка скачивания {video_id}: TwitchDownloaderCLI завершился с кодом {process.returncode}"
+        with lock:
+            progress_dict[thread_id] = msg
+        logging.error(msg)
+        return
+    throughput.record("twitch", os.path.getsize(output_file), download_time)
     file_size = os.path.getsize(output_file) / (1024 * 1024)
     speed = file_size / download_time if download_time > 0 else 0
     msg = (f"Файл {output_file} ({file_size:.2f} МБ) скачан за "
@@ -152,16 +175,18 @@ def display_progress(progress_dict, lock, stop_event):
                 if progress:
                     print(f"[Thread {thread_id}] {progress}")
             sys.stdout.flush()
-        time.sleep(0.1)  # Обновляем каждые 0.1 секунды
+        stop_event.wait(0.1)  # Обновляем каждые 0.1 секунды, остановка — сразу
 
 def concatenate_videos(video_files, output_file):
     logging.info("Объединение файлов...")
-    with open("concat_list.txt", "w") as f:
+    # список лежит рядом с результатом (в папке задания), пути в нём абсолютные
+    list_file = f"{output_file}.concat.txt"
+    with open(list_file, "w") as f:
         for video_file in video_files:
-            f.write(f"file '{video_file}'\n")
-    command = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", "concat_list.txt", "-c", "copy", output_file]
+            f.write(f"file '{os.path.abspath(video_file)}'\n")
+    command = ["ffmpeg", "-f", "concat", "-safe", "0", "-i", list_file, "-c", "copy", output_file]
     subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    os.remove("concat_list.txt")
+    os.remove(list_file)
     logging.info("Объединение файлов завершилось успешно.")
 
 def upload_video_to_vk(token, group_id, video_path, album_id, name, description, privacy_view="all"):
@@ -177,15 +202,14 @@ def upload_video_to_vk(token, group_id, video_path, album_id, name, description,
         "privacy_view": privacy_view,
         "privacy_comment": "all"
     }
-    response = requests.get("https://api.vk.ru/method/video.save", params=params).json()
+    response = requests.get(f"{VK_API_URL}/video.save", params=params).json()
     if "error" in response:
         raise Exception(f"Ошибка VK API: {response['error']['error_msg']}")
     upload_url = response["response"]["upload_url"]
     
-    with open(video_path, "rb") as video_file:
-        encoder = MultipartEncoder(fields={"video_file": ("video_file", video_file, "video/mp4")})
-        headers = {"Content-Type": encoder.content_type}
-        upload_response = requests.post(upload_url, data=encoder, headers=headers)
+    with upload_body.FileMultipartBody(video_path) as body:
+        headers = {"Content-Type": body.content_type}
+        upload_response = requests.post(upload_url, data=bandwidth.wrap(body, "vk"), headers=headers)
     
     end_time = datetime.now()
     upload_time = (end_time - start_time).total_seconds()
@@ -196,26 +220,29 @@ def upload_video_to_vk(token, group_id, video_path, album_id, name, description,
 
 def lbrynet_call(method, params=None):
     payload = {"jsonrpc": "2.0", "method": method, "params": params or {}, "id": int(time.time())}
-    response = requests.post("http://localhost:5279", json=payload)
+    response = requests.post(LBRYNET_API_URL, json=payload)
     return response.json()["result"]
 
 def wait_for_publish_completion(claim_id, debug=False):
     logging.info("Жду завершения публикации в Odysee...")
-    while True:
+
+    def confirmed():
         claims = lbrynet_call("claim_search", {"claim_id": claim_id})
         if debug:
             logging.debug(f"DEBUG: Ответ claim_search: {claims}")
-        if claims["items"] and claims["items"][0].get("confirmations", 0) > 0:
-            logging.info(f"Публикация {claim_id} успешно завершена в Odysee!")
-            return True
-        time.sleep(10)
+        return bool(claims["items"] and claims["items"][0].get("confirmations", 0) > 0)
+
+    waiting.poll(confirmed, "odysee publish", legacy=(0, 10))
+    logging.info(f"Публикация {claim_id} успешно завершена в Odysee!")
+    return True
 
 def wait_for_file_upload_completion(claim_id, debug=False):
     logging.info("Жду завершения загрузки и отражения blob-файлов в Odysee...")
-    time.sleep(5)
-    start_time = time.time()
     max_wait_time = 9999
-    while time.time() - start_time < max_wait_time:
+    last_remaining = None
+
+    def reflected():
+        nonlocal last_remaining
         try:
             file_list = lbrynet_call("file_list", {"claim_id": claim_id})
             if debug:
@@ -225,15 +252,23 @@ def wait_for_file_upload_completion(claim_id, debug=False):
                 status = file_status.get("status", "unknown")
                 blobs_remaining = file_status.get("blobs_remaining", -1)
                 is_fully_reflected = file_status.get("is_fully_reflected", False)
+                # lbrynet отражает blob-ы сам, мимо нас — учитываем их в общем лимите полосы
+                if blobs_remaining >= 0:
+                    if last_remaining is not None and blobs_remaining < last_remaining:
+                        bandwidth.get_manager().charge("odysee", (last_remaining - blobs_remaining) * LBRY_BLOB_SIZE)
+                    last_remaining = blobs_remaining
                 if debug:
                     logging.debug(f"DEBUG: Статус: {status}, is_fully_reflected: {is_fully_reflected}, blobs_remaining: {blobs_remaining}")
                 if status == "finished" and blobs_remaining == 0 and is_fully_reflected:
-                    logging.info(f"Blob-файлы для {claim_id} успешно загружены и отражены!")
                     return True
         except Exception as e:
             if debug:
                 logging.debug(f"DEBUG: Ошибка при проверке статуса: {e}")
-        time.sleep(10)
+        return False
+
+    if waiting.poll(reflected, "odysee reflect", deadline=max_wait_time, legacy=(5, 10)):
+        logging.info(f"Blob-файлы для {claim_id} успешно загружены и отражены!")
+        return True
     logging.warning(f"Предупреждение: Время ожидания загрузки и отражения blob-файлов для {claim_id} истекло (30 минут).")
     return False
 
@@ -273,6 +308,10 @@ def upload_to_odysee(file_path, claim_name, channel_name, thumbnail_url, name, d
 
 # Функция для извлечения глав из видео
 def get_chapters(video_file):
+    # Сначала читаем moov напрямую, ffprobe — только если файл не разобрался
+    chapters = mp4meta.read_chapters(video_file)
+    if chapters is not None:
+        return chapters
     command = [
         "ffprobe", "-v", "quiet", "-print_format", "json", "-show_chapters", video_file
     ]
@@ -300,7 +339,58 @@ def create_description_from_chapters(chapters):
         description += f"{timestamp} - {title}\n"
     return description
 
-def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, debug=False):
+# Длительность видео: moov напрямую, ffprobe — если файл не разобрался
+def get_video_duration(video_file):
+    duration = mp4meta.read_duration(video_file)
+    if duration is not None:
+        return duration
+    command = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", video_file
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return float(result.stdout.strip())
+
+# Главы файлов подряд со сдвигом на длительность предыдущих, в формате FFMETADATA
+def create_concat_metadata(video_files, metadata_file="concat_metadata.txt"):
+    cumulative_duration = 0
+    all_chapters = []
+    for video_file in video_files:
+        duration = get_video_duration(video_file)
+        for chapter in get_chapters(video_file):
+            adjusted = dict(chapter)
+            adjusted["start_time"] = float(adjusted["start_time"]) + cumulative_duration
+            adjusted["end_time"] = float(adjusted["end_time"]) + cumulative_duration
+            all_chapters.append(adjusted)
+        cumulative_duration += duration
+    metadata_content = ";FFMETADATA1\n"
+    for chapter in all_chapters:
+        start = int(chapter["start_time"] * 1000)
+        end = int(chapter["end_time"] * 1000)
+        title = chapter["tags"].get("title", "Untitled")
+        metadata_content += f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle={title}\n"
+    with open(metadata_file, "w") as f:
+        f.write(metadata_content)
+    return metadata_file
+
+# Файл для площадки: исходник или его версия профиля --transcode (одна на профиль строки)
+def sink_video(video_file, profile, renditions, out_dir=None):
+    if not profile:
+        return video_file
+    if profile not in renditions:
+        base = os.path.join(out_dir, os.path.basename(video_file[:-4])) if out_dir else video_file[:-4]
+        try:
+            metadata_file = create_concat_metadata([video_file], f"{base}_{profile}_metadata.txt")
+            renditions[profile] = transcode.transcode(video_file, f"{base}_{profile}.mp4", profile,
+                                                      "ffmpeg", metadata_file)
+            os.remove(metadata_file)
+        except Exception as e:
+            logging.error(f"Не удалось перекодировать {video_file} в {profile}, загружаю исходник: {e}")
+            renditions[profile] = video_file
+    return renditions[profile]
+
+def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, debug=False, transcode_profiles=None,
+         max_quality=None):
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s',
@@ -311,9 +401,13 @@ def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, de
     )
     if debug:
         logging.getLogger().setLevel(logging.DEBUG)
+    transcode_profiles = transcode_profiles or {}
+    max_quality = max_quality or {}
 
     if not os.path.exists(INSTALLED_FILE):
         install_dependencies()
+    global TWITCH_DOWNLOADER_PATH
+    TWITCH_DOWNLOADER_PATH = toolcache.twitch_downloader(TWITCH_DOWNLOADER_PATH)
 
     config = load_config()
     if config:
@@ -334,101 +428,142 @@ def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, de
         shutil.copy(config["wallet_path"], wallet_dest)
         logging.info("Кошелек скопирован.")
 
-    logging.info("Очистка старых видеофайлов и blob-файлов перед запуском...")
-    for file in os.listdir():
-        if file.endswith(".mp4"):
-            os.remove(file)
+    # чужие рабочие папки не трогаем — только оставшиеся от завершившихся процессов
+    logging.info("Очистка брошенных рабочих папок и blob-файлов перед запуском...")
+    workspace.cleanup_stale()
     if os.path.exists(BLOBFILES_PATH):
         shutil.rmtree(BLOBFILES_PATH, ignore_errors=True)
 
     if do_odysee_upload:
         start_lbrynet()
 
-    df = pd.read_excel(STREAMS_FILE)
-    start_index = max(0, start_row - 1)
-    end_index = end_row if end_row is not None else len(df)
-
-    for index in range(start_index, end_index):
-        row = df.iloc[index]
-        if pd.isna(row.iloc[1]):
+    # --max-quality / --transcode: какие версии VOD качать (площадки одни на весь запуск)
+    sinks = {}
+    if do_vk_upload:
+        sinks["vk"] = (max_quality.get("vk"), transcode_profiles.get("vk"))
+    if do_odysee_upload:
+        sinks["odysee"] = (max_quality.get("odysee"), transcode_profiles.get("odysee"))
+    row_plan = quality.plan_row(sinks)
+    if row_plan["downloads"] != [quality.SOURCE]:
+        logging.info(f"Качество: {quality.describe(row_plan)}")
+
+    # читаем только строки --start..--end
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
+    processed = 0
+
+    for row in records:
+        index = row.number - 1
+        if manifest.isna(row.iloc[1]):
             logging.info(f"Пропускаю строку {index + 1}: нет данных для загрузки.")
             continue
         logging.info(f"\nОбработка строки {index + 1}")
+        processed += 1
         
-        if pd.notna(row.iloc[0]):
+        if manifest.notna(row.iloc[0]):
             logging.info(f"Найдена запись в ячейке A: {row.iloc[0]}")
             if input("Продолжить? (y/n): ").lower() != "y":
                 break
 
-        video_urls = row.iloc[1].split()
-        video_files = [f"video_{index + 1}_{i}.mp4" for i, url in enumerate(video_urls)]
-        
-        # Инициализируем словарь для хранения прогресса и блокировку
-        progress_dict = {i: "" for i in range(len(video_urls))}
-        lock = threading.Lock()
-        stop_event = threading.Event()
-
-        # Запускаем поток для отображения прогресса
-        display_thread = threading.Thread(target=display_progress, args=(progress_dict, lock, stop_event))
-        display_thread.start()
-
-        # Запускаем загрузку видео в потоках
-        threads = []
-        for i, url in enumerate(video_urls):
-            thread = threading.Thread(target=download_twitch_video, args=(url, video_files[i], progress_dict, lock, i))
-            threads.append(thread)
-            thread.start()
-        
-        # Ждем завершения всех потоков загрузки
-        for thread in threads:
-            thread.join()
-        
-        # Останавливаем отображение прогресса
-        stop_event.set()
-        display_thread.join()
-
-        # Очищаем консоль после завершения загрузки
-        print("\033[2J\033[H")
-        for i in range(len(video_urls)):
-            print(f"[Thread {i}] {progress_dict[i]}")
-
-        if len(video_files) > 1:
-            final_file = f"concatenated_{index + 1}.mp4"
-            concatenate_videos(video_files, final_file)
-            for temp_file in video_files:
-                os.remove(temp_file)
-            video_file = final_file
+        video_urls = str(row.iloc[1]).split()
+        # скачанные файлы и склейка строки живут в её рабочей папке; каждая версия по плану — свой набор
+        job = workspace.Workspace(f"row-{index + 1}")
+        # VOD строки, сохранённый в кеш после неудачной загрузки, повторно не качаем
+        row_key = "+".join(u.split("/")[-1] if "twitch.tv" in u else u for u in video_urls)
+        cached = {r: workspace.cache_path(row_key, None if r == quality.SOURCE else r) for r in row_plan["downloads"]}
+        if all(os.path.exists(f) for f in cached.values()):
+            logging.info(f"Строка {index + 1}: VOD уже скачан прошлым запуском: {', '.join(cached.values())}")
+            joined = dict(cached)
         else:
-            video_file = video_files[0]
+            rendition_files = {
+                r: [job.path(f"video_{index + 1}_{i}.mp4" if r == quality.SOURCE else f"video_{index + 1}_{i}_{r}.mp4")
+                    for i in range(len(video_urls))]
+                for r in row_plan["downloads"]
+            }
+            tasks = [(r, url, path) for r, files in rendition_files.items() for url, path in zip(video_urls, files)]
+
+            # Инициализируем словарь для хранения прогресса и блокировку
+            progress_dict = {i: "" for i in range(len(tasks))}
+            lock = threading.Lock()
+            stop_event = threading.Event()
+
+            # Запускаем поток для отображения прогресса
+            display_thread = threading.Thread(target=display_progress, args=(progress_dict, lock, stop_event))
+            display_thread.start()
+
+            # Запускаем загрузку видео в потоках
+            threads = []
+            for i, (rendition, url, path) in enumerate(tasks):
+                thread = threading.Thread(target=download_twitch_video,
+                                          args=(url, path, progress_dict, lock, i, job.path(f"temp_{i}"), rendition))
+                threads.append(thread)
+                thread.start()
+            
+            # Ждем завершения всех потоков загрузки
+            for thread in threads:
+                thread.join()
+            
+            # Останавливаем отображение прогресса
+            stop_event.set()
+            display_thread.join()
+
+            # Очищаем консоль после завершения загрузки
+            print("\033[2J\033[H")
+            for i in range(len(tasks)):
+                print(f"[Thread {i}] {progress_dict[i]}")
+            missing = [path for _, _, path in tasks if not os.path.exists(path)]
+            if missing:
+                logging.error(f"Ошибка скачивания в строке {index + 1} ({', '.join(missing)}). Прерываю.")
+                job.cleanup()
+                break
+
+            joined = {}
+            for rendition, video_files in rendition_files.items():
+                if len(video_files) > 1:
+                    suffix = "" if rendition == quality.SOURCE else f"_{rendition}"
+                    final_file = job.path(f"concatenated_{index + 1}{suffix}.mp4")
+                    concatenate_videos(video_files, final_file)
+                    workspace.remove_files(video_files)
+                    joined[rendition] = final_file
+                else:
+                    joined[rendition] = video_files[0]
+        video_file = joined[row_plan["downloads"][0]]
 
         # Установка параметров видео
-        name = str(row.iloc[2]) if pd.notna(row.iloc[2]) else ""
+        name = str(row.iloc[2]) if manifest.notna(row.iloc[2]) else ""
         chapters = get_chapters(video_file)
         if chapters:
             description = create_description_from_chapters(chapters)
         else:
-            description = str(row.iloc[3]) if pd.notna(row.iloc[3]) else ""
-        tags = str(row.iloc[4]) if pd.notna(row.iloc[4]) else ""
-        claim_name = str(row.iloc[5]) if pd.notna(row.iloc[5]) else "default_claim_name"
-        thumbnail_url = str(row.iloc[6]) if pd.notna(row.iloc[6]) else ""
-        privacy_value = str(row.iloc[7]) if len(row) > 7 and pd.notna(row.iloc[7]) else ""
+            description = str(row.iloc[3]) if manifest.notna(row.iloc[3]) else ""
+        tags = str(row.iloc[4]) if manifest.notna(row.iloc[4]) else ""
+        claim_name = str(row.iloc[5]) if manifest.notna(row.iloc[5]) else "default_claim_name"
+        thumbnail_url = str(row.iloc[6]) if manifest.notna(row.iloc[6]) else ""
+        privacy_value = str(row.iloc[7]) if len(row) > 7 and manifest.notna(row.iloc[7]) else ""
 
         vk_privacy_view = "2" if privacy_value == "1" else "all"
         odysee_visibility = "unlisted" if privacy_value == "1" else "public"
 
+        # --max-quality / --transcode: площадки получают свою версию по плану (до запуска загрузок)
+        renditions = {}
+        vk_file = sink_video(joined[row_plan["sinks"]["vk"]["rendition"]], row_plan["sinks"]["vk"]["transcode"],
+                             renditions, job.dir) if do_vk_upload else None
+        odysee_file = sink_video(joined[row_plan["sinks"]["odysee"]["rendition"]],
+                                 row_plan["sinks"]["odysee"]["transcode"], renditions, job.dir) \
+            if do_odysee_upload else None
+
         vk_success = [False]
         odysee_success = [False]
 
         def vk_upload():
             try:
-                vk_success[0] = upload_video_to_vk(VK_TOKEN, VK_GROUP_ID, video_file, VK_ALBUM_ID, name, description, vk_privacy_view)
+                vk_success[0] = upload_video_to_vk(VK_TOKEN, VK_GROUP_ID, vk_file, VK_ALBUM_ID, name, description, vk_privacy_view)
             except Exception as e:
                 logging.error(f"Ошибка VK: {e}")
                 vk_success[0] = False
 
         def odysee_upload():
             try:
-                claim_id = upload_to_odysee(video_file, claim_name, "@unuasha", thumbnail_url, name, description, tags, odysee_visibility, debug)
+                claim_id = upload_to_odysee(odysee_file, claim_name, "@unuasha", thumbnail_url, name, description, tags, odysee_visibility, debug)
                 odysee_success[0] = claim_id is not None
             except Exception as e:
                 logging.error(f"Ошибка Odysee: {e}")
@@ -450,7 +585,8 @@ def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, de
             if do_odysee_upload:
                 stop_lbrynet()
             logging.info(f"Удаляю {video_file}...")
-            os.remove(video_file)
+            job.cleanup()
+            workspace.remove_files(cached.values())
             if do_odysee_upload:
                 logging.info("Удаляю blobfiles...")
                 if os.path.exists(BLOBFILES_PATH):
@@ -458,6 +594,12 @@ def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, de
                 start_lbrynet()
         else:
             logging.error(f"Ошибка в строке {index + 1}. Прерываю.")
+            # скачанное не выбрасываем: повторный запуск возьмёт его из кеша, а не с Twitch
+            for rendition, path in joined.items():
+                if path != cached[rendition] and os.path.exists(path):
+                    job.publish(path, cached[rendition])
+            logging.info(f"Скачанный VOD сохранён для повторного запуска: {', '.join(cached.values())}")
+            job.cleanup()
             if do_odysee_upload:
                 stop_lbrynet()
             break
@@ -465,6 +607,7 @@ def main(start_row=1, end_row=None, do_vk_upload=True, do_odysee_upload=True, de
     logging.info("Задача успешно выполнена! Все файлы загружены.")
     if do_odysee_upload:
         stop_lbrynet()
+    waiting.report(processed)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Скрипт для загрузки видео")
@@ -473,7 +616,18 @@ if __name__ == "__main__":
     parser.add_argument("--vk", action="store_true", help="Загружать на VK")
     parser.add_argument("--odysee", action="store_true", help="Загружать на Odysee")
     parser.add_argument("--debug", action="store_true", help="Включить отладочные сообщения")
+    parser.add_argument("--transcode", action="append", metavar="ПЛОЩАДКА=ПРОФИЛЬ",
+                        help="Загружать на площадку (vk, odysee) перекодированную версию: профиль "
+                             f"{', '.join(transcode.PROFILES)}; кодируется кусками на всех ядрах, главы сохраняются")
+    parser.add_argument("--max-quality", action="append", metavar="ПЛОЩАДКА=КАЧЕСТВО",
+                        help="Наибольшее нужное площадке (vk, odysee) качество, например odysee=480p: "
+                             "скачивается самая дешёвая версия Twitch, которой хватает обеим площадкам")
     args = parser.parse_args()
+    try:
+        transcode_profiles = transcode.parse_sinks(args.transcode, ("vk", "odysee"))
+        max_quality = quality.parse_caps(args.max_quality, ("vk", "odysee"))
+    except ValueError as e:
+        parser.error(str(e))
     do_vk_upload = args.vk or not (args.vk or args.odysee)
     do_odysee_upload = args.odysee or not (args.vk or args.odysee)
-    main(args.start, args.end, do_vk_upload, do_odysee_upload, args.debug)
+    main(args.start, args.end, do_vk_upload, do_odysee_upload, args.debug, transcode_profiles, max_quality)
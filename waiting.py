@@ -0,0 +1,143 @@
+"""
+Ожидание условий с адаптивным опросом вместо фиксированных time.sleep.
+
+poll(check, label) вызывает check() сразу, а затем с растущими паузами (initial,
+×FACTOR за попытку, не больше max_interval, ± JITTER, чтобы несколько ожидающих не
+опрашивали сервис синхронно), пока check() не вернёт истинное значение. wake
+(threading.Event) будит опрос досрочно — например, когда завершился процесс; deadline —
+предел ожидания в секундах, по его истечении poll возвращает None.
+
+Каждое ожидание учитывается по метке: сколько ждали на самом деле и сколько ждал бы
+прежний цикл с фиксированными паузами (legacy=(начальная пауза, интервал опроса);
+интервал None — просто пауза). report() показывает убранную задержку, в том числе на строку.
+
+    waiting.poll(lambda: lbrynet_ready(), "lbrynet start", max_interval=15, legacy=(0, 15))
+"""
+
+import math
+import time
+import random
+import socket
+import threading
+from urllib.parse import urlparse
+
+INITIAL = 0.25
+MAX_INTERVAL = 10.0
+FACTOR = 2.0
+JITTER = 0.2
+
+_stats = {}  # метка -> {"count", "waited", "legacy", "polls"}
+_lock = threading.Lock()
+
+
+class Backoff:
+    """
+    Растущая пауза для циклов, которые проверяют условие сами (reset() — когда дождались).
+    """
+
+    def __init__(self, initial=INITIAL, max_interval=MAX_INTERVAL, factor=FACTOR, jitter=JITTER):
+        self.initial = initial
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.interval = initial
+
+    def next(self):
+        delay = min(self.interval, self.max_interval)
+        self.interval = min(self.interval * self.factor, self.max_interval)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def sleep(self):
+        time.sleep(self.next())
+
+    def reset(self):
+        self.interval = self.initial
+
+
+def legacy_seconds(elapsed, legacy):
+    """
+    Сколько ждал бы цикл «sleep(first); while not check(): sleep(interval)», если условие
+    выполнилось через elapsed секунд.
+    """
+    first, interval = legacy
+    if not interval or elapsed <= first:
+        return float(first)
+    return first + math.ceil((elapsed - first) / interval) * interval
+
+
+def _record(label, waited, polls, legacy):
+    with _lock:
+        s = _stats.setdefault(label, {"count": 0, "waited": 0.0, "legacy": 0.0, "polls": 0})
+        s["count"] += 1
+        s["waited"] += waited
+        s["polls"] += polls
+        s["legacy"] += legacy_seconds(waited, legacy) if legacy else waited
+
+
+def poll(check, label, initial=INITIAL, max_interval=MAX_INTERVAL, deadline=None, wake=None, legacy=None):
+    """
+    Ждёт, пока check() не вернёт истинное значение, и возвращает его (None — истёк deadline).
+    Исключения check() не перехватываются.
+    """
+    start = time.monotonic()
+    backoff = Backoff(initial, max_interval)
+    polls = 0
+    try:
+        while True:
+            polls += 1
+            result = check()
+            if result:
+                return result
+            delay = backoff.next()
+            if deadline is not None:
+                left = deadline - (time.monotonic() - start)
+                if left <= 0:
+                    return None
+                delay = min(delay, left)
+            if wake is not None and wake.wait(delay):
+                # событие будит один раз: дальше оно так и останется выставленным
+                wake = None
+            elif wake is None:
+                time.sleep(delay)
+    finally:
+        _record(label, time.monotonic() - start, polls, legacy)
+
+
+def port_open(url_or_host, port=None, timeout=1.0):
+    """
+    Принимает ли соединения host:port (или хост и порт из URL).
+    """
+    if port is None:
+        parsed = urlparse(url_or_host)
+        host, port = parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80)
+    else:
+        host = url_or_host
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def stats():
+    with _lock:
+        return {label: dict(s) for label, s in _stats.items()}
+
+
+def report(rows=None):
+    """
+    Время ожиданий по меткам; rows — сколько строк обработано (для задержки на строку).
+    """
+    items = sorted(stats().items())
+    if not items:
+        return
+    print("Ожидания:")
+    saved = 0.0
+    for label, s in items:
+        saved += s["legacy"] - s["waited"]
+        print(f"  {label}: {s['count']} раз, {s['polls']} опросов, ждали {s['waited']:.1f} с "
+              f"(с фиксированными паузами ~{s['legacy']:.1f} с)")
+    line = f"  Убрано задержки: ~{saved:.1f} с"
+    if rows:
+        line += f", ~{saved / rows:.1f} с на строку"
+    print(line)
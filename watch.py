@@ -0,0 +1,272 @@
+"""
+Демон --watch: новые архивы Twitch публикуются сами, без cron и ручного запуска -last.
+
+Процесс живёт долго, поэтому между публикациями всё остаётся тёплым: app-токен и сессия
+Helix (twitch_api), клиенты YouTube аккаунтов пула (youtube_accounts), сессия VK,
+TwitchDownloaderCLI из toolcache. Таблица не пересоздаётся — новые архивы дописываются
+в конец, и конвейер запускается только по их строкам.
+
+Опрос Helix адаптивный (Interval): пока канал в эфире — раз в LIVE_INTERVAL, чтобы конец
+стрима заметить быстро; вне эфира пауза растёт от IDLE_MIN до IDLE_MAX и сбрасывается,
+как только появился новый архив или начался стрим. Архив идущего стрима (создан не раньше
+начала стрима) не публикуется, пока стрим не кончится.
+
+Архив, который publish не опубликовал на всех площадках (ошибка загрузки, квота YouTube,
+исключение в самом publish), точку синхронизации не держит — он попадает в PENDING_FILE
+вместе со списком площадок, где уже опубликован, и догружается только на остальные на
+следующих опросах с растущей паузой (RETRY_MIN…RETRY_MAX), пока не выйдет RETRY_ATTEMPTS
+попыток.
+
+Главная метрика — задержка от конца стрима (created_at + duration архива) до публикации на
+всех площадках. Она и её часть «до обнаружения» пишутся в latency.json; report() печатает
+медиану и 90-й перцентиль по последним HISTORY публикациям.
+
+    watch.run("username", publish, (client_id, client_secret))   # publish(videos, done) -> {id: время}
+    python watch.py report
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+import requests
+
+import twitch_api
+import waiting
+
+LATENCY_FILE = "latency.json"
+PENDING_FILE = "watch_pending.json"
+LIVE_INTERVAL = 60.0
+IDLE_MIN = 120.0
+IDLE_MAX = 900.0
+STREAM_SLACK = 600  # архив стрима может появиться чуть раньше started_at
+HISTORY = 200
+RETRY_MIN = 900.0
+RETRY_MAX = 6 * 3600.0
+RETRY_ATTEMPTS = 8
+
+
+def _ts(iso):
+    return datetime.fromisoformat(str(iso).replace("Z", "+00:00")).timestamp()
+
+
+def _fmt(seconds):
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes} мин"
+    return f"{minutes // 60} ч {minutes % 60:02d} мин"
+
+
+def stream_end(video):
+    return _ts(video["created_at"]) + twitch_api.parse_duration(video.get("duration"))
+
+
+def in_progress(video, stream):
+    """
+    Архив идущего стрима: канал в эфире и архив создан не раньше начала стрима.
+    """
+    return stream is not None and _ts(video["created_at"]) >= _ts(stream["started_at"]) - STREAM_SLACK
+
+
+class Interval:
+    """
+    Пауза до следующего опроса Helix: в эфире — LIVE_INTERVAL, вне эфира — растущая.
+    """
+
+    def __init__(self):
+        self.idle = waiting.Backoff(IDLE_MIN, IDLE_MAX)
+
+    def next(self, live, found):
+        if live or found:
+            self.idle.reset()
+        return LIVE_INTERVAL if live else self.idle.next()
+
+
+###############################################################################
+# Задержка публикации
+###############################################################################
+
+def _load(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return [] if default is None else default
+
+
+def _save(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def record(video, detected, published, path=LATENCY_FILE):
+    """
+    Записывает задержку публикации архива video: detected — когда он найден готовым,
+    published — когда загружен на все площадки (time.time()).
+    """
+    ended = stream_end(video)
+    entry = {"id": video.get("id"), "ended": ended, "detected": detected, "published": published,
+             "detect": detected - ended, "latency": published - ended}
+    _save(path, (_load(path) + [entry])[-HISTORY:])
+    print(f"-> VOD {entry['id']} опубликован через {_fmt(entry['latency'])} после конца стрима "
+          f"(обнаружен через {_fmt(entry['detect'])})")
+    logging.info(f"VOD {entry['id']}: конец стрима -> публикация {entry['latency']:.0f} с, "
+                 f"обнаружение {entry['detect']:.0f} с")
+    return entry
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+def summary(path=LATENCY_FILE):
+    history = _load(path)
+    if not history:
+        return None
+    latency = [e["latency"] for e in history]
+    return {"count": len(history), "median": _percentile(latency, 0.5), "p90": _percentile(latency, 0.9),
+            "detect": _percentile([e["detect"] for e in history], 0.5)}
+
+
+def report(path=LATENCY_FILE):
+    stats = summary(path)
+    if not stats:
+        print("Публикаций --watch ещё не было.")
+        return
+    print(f"Конец стрима -> публикация по {stats['count']} VOD: медиана {_fmt(stats['median'])}, "
+          f"90% — {_fmt(stats['p90'])}; из них до обнаружения — медиана {_fmt(stats['detect'])}")
+
+
+###############################################################################
+# Неопубликованные архивы
+###############################################################################
+
+def get_pending(username, path=PENDING_FILE):
+    """
+    {id VOD: {"video", "detected", "done", "attempts", "next"}} архивов, ждущих повторной
+    публикации; done — площадки, на которые архив уже загружен.
+    """
+    return _load(path, {}).get(username.lower(), {})
+
+
+def save_pending(username, pending, path=PENDING_FILE):
+    data = _load(path, {})
+    data[username.lower()] = pending
+    _save(path, data)
+
+
+def retry_later(pending, video, detected, now, done=()):
+    """
+    Откладывает архив на повтор с растущей паузой; False, если попытки кончились.
+    """
+    entry = pending.pop(video["id"], None) or {"video": video, "detected": detected, "attempts": 0}
+    entry["done"] = sorted(done)
+    entry["attempts"] += 1
+    if entry["attempts"] >= RETRY_ATTEMPTS:
+        return False
+    entry["next"] = now + min(RETRY_MIN * 2 ** (entry["attempts"] - 1), RETRY_MAX)
+    pending[video["id"]] = entry
+    return True
+
+
+###############################################################################
+# Цикл опроса
+###############################################################################
+
+def run(username, publish, credentials, limit=100, stop=None):
+    """
+    Опрашивает Helix, пока не выставлен stop (threading.Event) или не прервали Ctrl+C.
+    publish(videos, done) публикует готовые архивы (от старого к новому), включая повторы уже
+    записанных в таблицу, и возвращает {id VOD: время публикации} для опубликованных на всех
+    площадках. done — {id VOD: множество площадок}: на них архив уже загружен и повторно не
+    грузится; publish дописывает туда площадки, куда загрузил. Точка синхронизации (twitch_api.save_sync_state) сдвигается только после
+    publish — если он упал раньше, чем записал архивы в таблицу, они найдутся снова на
+    следующем опросе. Неопубликованные везде архивы ждут повтора в PENDING_FILE.
+    """
+    stop = stop or threading.Event()
+    client_id, client_secret = credentials
+    user_id = twitch_api.get_user_id(username, client_id, twitch_api.get_app_token(client_id, client_secret))
+    interval = Interval()
+    errors = waiting.Backoff(LIVE_INTERVAL, IDLE_MAX)
+    was_live = None
+    print(f"Слежу за архивами {username} (Ctrl+C — выход)")
+    while not stop.is_set():
+        try:
+            token = twitch_api.get_app_token(client_id, client_secret)
+            state = twitch_api.get_sync_state(username)
+            videos = twitch_api.fetch_archives(user_id, limit, client_id, token,
+                                               since=state.get("last_created_at"), since_id=state.get("last_video_id"))
+            stream = twitch_api.get_stream(user_id, client_id, token)
+        except requests.HTTPError as e:
+            error = e
+            if e.response is not None and e.response.status_code == 401:
+                # токен отозван раньше срока — берём новый, опрос повторится после паузы ошибок
+                try:
+                    twitch_api.get_app_token(client_id, client_secret, force=True)
+                except Exception as refresh_error:
+                    error = refresh_error
+            print(f"--!! Helix: {error}")
+            logging.warning(f"--watch: ошибка Helix: {error}")
+            stop.wait(errors.next())
+            continue
+        except requests.RequestException as e:
+            print(f"--!! Helix недоступен: {e}")
+            logging.warning(f"--watch: Helix недоступен: {e}")
+            stop.wait(errors.next())
+            continue
+        errors.reset()
+
+        live = stream is not None
+        if live != was_live:
+            print(f"-> {username} в эфире с {stream['started_at']}" if live else f"-> {username} не в эфире")
+            was_live = live
+        ready = [v for v in videos if not in_progress(v, stream)]
+        pending = get_pending(username)
+        detected = time.time()
+        new_ids = {v["id"] for v in ready}
+        retries = [e["video"] for vid, e in pending.items() if e["next"] <= detected and vid not in new_ids]
+        if ready or retries:
+            if ready:
+                print(f"\nНовых архивов: {len(ready)} ({', '.join(v['id'] for v in ready)})")
+            if retries:
+                print(f"\nПовтор публикации: {len(retries)} ({', '.join(v['id'] for v in retries)})")
+            batch = sorted(retries + ready, key=lambda v: v.get("created_at", ""))
+            done = {vid: set(e.get("done", ())) for vid, e in pending.items()}
+            try:
+                published = publish(batch, done)
+            except Exception as e:
+                # долгоживущий демон не падает из-за одной строки — весь батч уходит на повтор
+                print(f"--!! Ошибка публикации: {e}")
+                logging.exception(f"--watch: ошибка публикации {', '.join(v['id'] for v in batch)}")
+                published = {}
+            twitch_api.save_sync_state(username, ready)
+            now = time.time()
+            for v in batch:
+                first_detected = pending[v["id"]]["detected"] if v["id"] in pending else detected
+                if v["id"] in published:
+                    pending.pop(v["id"], None)
+                    record(v, first_detected, published[v["id"]])
+                elif retry_later(pending, v, first_detected, now, done.get(v["id"], ())):
+                    print(f"--!! VOD {v['id']} опубликован не на всех площадках, повтор через "
+                          f"{_fmt(pending[v['id']]['next'] - now)}, см. лог")
+                else:
+                    print(f"--!! VOD {v['id']} так и не опубликован после {RETRY_ATTEMPTS} попыток, см. лог")
+                    logging.error(f"--watch: VOD {v['id']} не опубликован после {RETRY_ATTEMPTS} попыток")
+            save_pending(username, pending)
+            report()
+        stop.wait(interval.next(live, bool(ready)))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Задержка публикации --watch")
+    parser.add_argument("command", choices=["report"])
+    parser.add_argument("--file", default=LATENCY_FILE)
+    args = parser.parse_args()
+    report(args.file)
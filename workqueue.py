@@ -0,0 +1,322 @@
+"""
+Общая очередь строк таблицы для нескольких машин-загрузчиков (режим --queue).
+
+Очередь — SQLite-файл на общем хранилище. Воркер забирает строку (claim) с арендой на
+LEASE_SECONDS и продлевает её heartbeat-ом, пока строка скачивается и загружается.
+Если воркер упал или пропал из сети, аренда истекает, и строку забирает другой воркер.
+Воркер, потерявший аренду, не начинает загрузку на следующую платформу, а площадки, на
+которые строка уже загружена, записываются в очередь (done) — повторная попытка догружает
+только остальные, поэтому одна строка не загружается на площадку дважды. Строка, не
+загруженная на все площадки (ошибка, квота YouTube), возвращается в очередь. Сроки аренды сравниваются по часам машин — часы должны быть
+синхронизированы (NTP).
+
+    python workqueue.py queue.sqlite        # состояние очереди и скорость воркеров
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+
+QUEUE_FILE = "queue.sqlite"
+LEASE_SECONDS = 600
+HEARTBEAT_SECONDS = 60
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    row INTEGER PRIMARY KEY,
+    priority REAL NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    done TEXT NOT NULL DEFAULT '',
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    started_at REAL,
+    heartbeat_at REAL,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    busy_seconds REAL NOT NULL DEFAULT 0
+);
+"""
+
+
+def default_worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, path=QUEUE_FILE, worker=None, lease_seconds=LEASE_SECONDS, register=True):
+        self.path = path
+        self.worker = worker or default_worker_name()
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()
+        # WAL на сетевых ФС не работает, поэтому обычный журнал + BEGIN IMMEDIATE на запись
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        with self.lock:
+            self.conn.executescript(_SCHEMA)
+            # очередь, созданная до колонки done
+            if "done" not in {c[1] for c in self.conn.execute("PRAGMA table_info(rows)")}:
+                try:
+                    self.conn.execute("ALTER TABLE rows ADD COLUMN done TEXT NOT NULL DEFAULT ''")
+                except sqlite3.OperationalError:
+                    pass  # колонку добавил другой воркер
+        if register:
+            now = time.time()
+            self._write(
+                "INSERT INTO workers (worker, started_at, heartbeat_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(worker) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (self.worker, now, now)
+            )
+
+    def _write(self, sql, params=()):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self.conn.execute(sql, params)
+                self.conn.execute("COMMIT")
+                return cur.rowcount
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def fill(self, rows, priorities=None):
+        """
+        Добавляет строки в очередь (уже известные не трогает — вызывать может каждый воркер).
+        priorities — {строка: приоритет}, меньше = раньше (например, срок удаления VOD).
+        Строки без приоритета идут после всех с приоритетом, между собой — по порядку таблицы.
+        """
+        priorities = priorities or {}
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO rows (row, priority, updated_at) VALUES (?, ?, ?)",
+                    [(r, priorities.get(r, float("inf")), now) for r in rows]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, allowed=None):
+        """
+        Забирает следующую свободную строку (или строку с истёкшей арендой). None — работы нет.
+        Истёкшая аренда последней попытки (воркер упал) помечает строку failed.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self.conn.execute(
+                    "UPDATE rows SET status = 'failed', lease_until = NULL, "
+                    "error = COALESCE(error, 'аренда истекла на последней попытке'), updated_at = ? "
+                    "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                    (now, now, MAX_ATTEMPTS)
+                ).rowcount
+                if expired:
+                    logging.warning(f"Очередь: строк с истёкшей арендой после {MAX_ATTEMPTS} попыток: {expired}, "
+                                    f"помечены failed")
+                candidates = self.conn.execute(
+                    "SELECT row, status FROM rows WHERE (status = 'pending' OR "
+                    "(status = 'leased' AND lease_until < ?)) AND attempts < ? ORDER BY priority, row",
+                    (now, MAX_ATTEMPTS)
+                ).fetchall()
+                for row, status in candidates:
+                    if allowed is not None and row not in allowed:
+                        continue
+                    if status == "leased":
+                        logging.warning(f"Очередь: аренда строки {row} истекла, забираю")
+                    self.conn.execute(
+                        "UPDATE rows SET status = 'leased', worker = ?, lease_until = ?, "
+                        "attempts = attempts + 1, updated_at = ? WHERE row = ?",
+                        (self.worker, now + self.lease_seconds, now, row)
+                    )
+                    self.conn.execute("COMMIT")
+                    return row
+                self.conn.execute("COMMIT")
+                return None
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def renew(self, row):
+        """
+        Продлевает аренду. False — аренду уже забрал другой воркер.
+        """
+        now = time.time()
+        ok = self._write(
+            "UPDATE rows SET lease_until = ?, updated_at = ? WHERE row = ? AND worker = ? AND status = 'leased'",
+            (now + self.lease_seconds, now, row, self.worker)
+        ) == 1
+        self._write("UPDATE workers SET heartbeat_at = ? WHERE worker = ?", (now, self.worker))
+        return ok
+
+    def platforms_done(self, row):
+        """
+        Площадки, на которые строка уже загружена прошлыми попытками.
+        """
+        with self.lock:
+            found = self.conn.execute("SELECT done FROM rows WHERE row = ?", (row,)).fetchone()
+        return set(filter(None, (found[0] if found else "").split(",")))
+
+    def mark_done(self, row, platforms):
+        """
+        Запоминает площадки, на которые строка загружена. False — аренду уже забрал другой воркер.
+        """
+        return self._write(
+            "UPDATE rows SET done = ?, updated_at = ? WHERE row = ? AND worker = ? AND status = 'leased'",
+            (",".join(sorted(platforms)), time.time(), row, self.worker)
+        ) == 1
+
+    def complete(self, row, size=0, seconds=0.0):
+        now = time.time()
+        ok = self._write(
+            "UPDATE rows SET status = 'done', lease_until = NULL, error = NULL, updated_at = ? "
+            "WHERE row = ? AND worker = ?",
+            (now, row, self.worker)
+        ) == 1
+        if not ok:
+            return False
+        self._write(
+            "UPDATE workers SET rows_done = rows_done + 1, bytes_done = bytes_done + ?, "
+            "busy_seconds = busy_seconds + ?, heartbeat_at = ? WHERE worker = ?",
+            (int(size), float(seconds), now, self.worker)
+        )
+        return True
+
+    def fail(self, row, error=""):
+        """
+        Возвращает строку в очередь; после MAX_ATTEMPTS попыток помечает её failed.
+        """
+        self._write(
+            "UPDATE rows SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_until = NULL, error = ?, updated_at = ? WHERE row = ? AND worker = ?",
+            (MAX_ATTEMPTS, str(error)[:500], time.time(), row, self.worker)
+        )
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM rows GROUP BY status").fetchall())
+
+    def workers(self):
+        with self.lock:
+            cur = self.conn.execute(
+                "SELECT worker, rows_done, bytes_done, busy_seconds, heartbeat_at FROM workers ORDER BY worker"
+            )
+            return cur.fetchall()
+
+    def report(self):
+        counts = self.counts()
+        print("Очередь: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items())))
+        now = time.time()
+        for worker, rows_done, bytes_done, busy, heartbeat in self.workers():
+            mbps = bytes_done / busy / (1024 * 1024) if busy else 0.0
+            idle = int(now - heartbeat) if heartbeat else -1
+            mark = " (это я)" if worker == self.worker else ""
+            print(f"  {worker}{mark}: строк {rows_done}, {bytes_done / 1024 ** 3:.1f} ГБ, "
+                  f"{mbps:.1f} МБ/с, последний heartbeat {idle} с назад")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class Lease:
+    """
+    Аренда одной строки: фоновый heartbeat продлевает её, lost выставляется,
+    если строку забрал другой воркер. done — площадки, на которые строка уже загружена.
+    """
+
+    def __init__(self, queue, row, interval=HEARTBEAT_SECONDS):
+        self.queue = queue
+        self.row = row
+        self.interval = interval
+        self.lost = False
+        self.error = None
+        self.bytes = 0
+        self.done = queue.platforms_done(row)
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not self.queue.renew(self.row):
+                    self.lost = True
+                    logging.error(f"Очередь: аренда строки {self.row} потеряна")
+                    return
+            except sqlite3.Error as e:
+                logging.warning(f"Очередь: heartbeat строки {self.row} не удался: {e}")
+
+    def add_bytes(self, size):
+        self.bytes += size
+
+    def mark_done(self, platforms):
+        """
+        Записывает в очередь площадки, на которые строка загружена (сразу, не в finish:
+        при падении воркера следующая попытка их не повторит).
+        """
+        if set(platforms) <= self.done:
+            return
+        self.done |= set(platforms)
+        if not self.queue.mark_done(self.row, self.done):
+            self.lost = True
+
+    def fail(self, error):
+        self.error = error or "ошибка"
+
+    def finish(self):
+        self._stop.set()
+        self._thread.join()
+        if self.lost:
+            return
+        if self.error is not None:
+            self.queue.fail(self.row, self.error)
+        else:
+            self.queue.complete(self.row, self.bytes, time.monotonic() - self.started)
+
+
+def iter_rows(records, queue=None):
+    """
+    Для main(): без очереди — строки по порядку (row, None); с очередью — (row, Lease) для
+    строк, забранных этим воркером. Строка считается выполненной, когда тело цикла
+    завершилось без lease.fail(); при исключении в цикле строка возвращается в очередь.
+    """
+    if queue is None:
+        for row in records:
+            yield row, None
+        return
+    by_number = {r.number: r for r in records}
+    while True:
+        number = queue.claim(allowed=by_number)
+        if number is None:
+            return
+        lease = Lease(queue, number).start()
+        try:
+            yield by_number[number], lease
+        except GeneratorExit:
+            lease.fail("прервано")
+            lease.finish()
+            raise
+        lease.finish()
+
+
+if __name__ == "__main__":
+    import sys
+    queue = WorkQueue(sys.argv[1] if len(sys.argv) > 1 else QUEUE_FILE, worker="status", register=False)
+    queue.report()
+    queue.close()
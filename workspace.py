@@ -0,0 +1,161 @@
+"""
+Изолированные рабочие папки заданий и общий кеш скачанных VOD.
+
+Каждое задание (скачивание одного VOD, обработка одной строки таблицы) работает в своей
+папке work/<имя>-XXXX: списки concat, метаданные глав, temp TwitchDownloaderCLI, склейки
+и части живут там и удаляются вместе с заданием. Готовые VOD переносятся в cache/<id>.mp4
+через os.replace, поэтому другой процесс никогда не увидит недокачанный файл.
+
+Несколько экземпляров скриптов (или несколько строк параллельно) больше не мешают друг
+другу: при старте удаляются только папки заданий, чей процесс уже завершился. Владелец
+папки записан как host:pid, поэтому на общем для нескольких машин work/ (очередь --queue)
+чужие папки не трогаются — жив ли чужой процесс, с этой машины не проверить.
+
+У файлов кеша владельца нет: его может читать любая строка или воркер, поэтому
+cleanup_stale удаляет из cache/ только файлы, не менявшиеся дольше CACHE_TTL (строка
+упала между скачиванием и очисткой, а повторного запуска так и не было).
+"""
+
+import os
+import time
+import shutil
+import socket
+import logging
+import tempfile
+
+WORK_ROOT = "work"
+CACHE_DIR = "cache"
+OWNER_FILE = ".owner"
+OWNERLESS_GRACE = 600  # папка без .owner моложе этого — ещё создаётся, а не брошена
+CACHE_TTL = 2 * 24 * 3600
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class Workspace:
+    """
+    Рабочая папка задания. Используется как контекстный менеджер: при выходе удаляется.
+    """
+
+    def __init__(self, name, root=WORK_ROOT):
+        os.makedirs(root, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix=f"{name}-", dir=root)
+        # через временное имя: cleanup_stale не должен увидеть пустой .owner
+        owner = os.path.join(self.dir, OWNER_FILE)
+        with open(owner + ".tmp", "w") as f:
+            f.write(f"{socket.gethostname()}:{os.getpid()}")
+        os.replace(owner + ".tmp", owner)
+
+    def path(self, *parts):
+        return os.path.join(self.dir, *parts)
+
+    @property
+    def temp_dir(self):
+        """
+        Папка для --temp-path TwitchDownloaderCLI.
+        """
+        path = self.path("temp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def publish(self, src, dst):
+        """
+        Атомарно переносит готовый файл из папки задания (например, в кеш).
+        """
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        os.replace(src, dst)
+        return dst
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+        return False
+
+
+def cache_path(video_id, rendition=None):
+    """
+    Файл VOD в кеше; rendition — версия не в качестве источника (--max-quality).
+    """
+    if rendition:
+        return os.path.join(CACHE_DIR, f"{video_id}_{rendition}.mp4")
+    return os.path.join(CACHE_DIR, f"{video_id}.mp4")
+
+
+def cleanup_stale(root=WORK_ROOT, cache_dir=CACHE_DIR):
+    """
+    Удаляет папки заданий, оставшиеся от завершившихся (упавших) процессов этой машины,
+    и брошенные файлы кеша (старше CACHE_TTL).
+    """
+    stale_files = _cleanup_cache(cache_dir)
+    if not os.path.isdir(root):
+        return stale_files
+    host = socket.gethostname()
+    removed = 0
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        try:
+            with open(os.path.join(path, OWNER_FILE), "r") as f:
+                owner = f.read().strip()
+        except OSError:
+            owner = ""
+        if not owner:
+            try:
+                if time.time() - os.path.getmtime(path) < OWNERLESS_GRACE:
+                    continue
+            except OSError:
+                continue
+        else:
+            # старый формат — только pid, папка этой машины
+            owner_host, _, pid = owner.rpartition(":")
+            if owner_host and owner_host != host:
+                continue
+            try:
+                if _pid_alive(int(pid)):
+                    continue
+            except ValueError:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    if removed:
+        logging.info(f"Удалено брошенных рабочих папок: {removed}")
+    return removed + stale_files
+
+
+def _cleanup_cache(cache_dir):
+    if not os.path.isdir(cache_dir):
+        return 0
+    removed = 0
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.isfile(path) and now - os.path.getmtime(path) > CACHE_TTL:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logging.info(f"Удалено брошенных файлов кеша: {removed}")
+    return removed
+
+
+def remove_files(files):
+    for f in files:
+        try:
+            if os.path.exists(f):
+                os.remove(f)
+        except OSError:
+            pass
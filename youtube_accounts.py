@@ -0,0 +1,212 @@
+"""
+Пул аккаунтов/проектов YouTube для загрузки (дневная квота считается на проект Google).
+
+Токен каждого аккаунта лежит в tokens/<имя>.json (в нём есть client_id и client_secret
+своего проекта), его квота — в tokens/<имя>.quota.json (см. quota.py). Канал, на который
+грузит аккаунт, задаётся в tokens/pool.json; несколько проектов на один канал дают
+несколько дневных квот:
+
+    {"accounts": {"main": {"channel": "main"}, "main2": {"channel": "main"},
+                  "clips": {"channel": "clips"}},
+     "default_channel": "main"}
+
+Строка таблицы идёт на канал из колонки channel (если такая есть в заголовке), иначе на
+канал по умолчанию. Каждое видео загружается через аккаунт своего канала с наибольшим
+остатком квоты. Без папки tokens/ пул — это один аккаунт token.json с квотой
+youtube_quota.json, как раньше.
+
+    python youtube_accounts.py                              # квота и загрузки по пулу
+    python youtube_accounts.py add ИМЯ client_secret.json   # авторизовать новый аккаунт
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import timedelta
+
+import manifest
+import quota
+
+TOKENS_DIR = "tokens"
+POOL_FILE = "pool.json"
+TOKEN_FILE = "token.json"
+DEFAULT_CHANNEL = "default"
+CHANNEL_COLUMN = "channel"
+SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
+
+
+def row_channel(row):
+    """
+    Канал строки из колонки channel (None — канал по умолчанию).
+    """
+    if CHANNEL_COLUMN not in row.header:
+        return None
+    value = row[CHANNEL_COLUMN]
+    return None if manifest.isna(value) else str(value).strip()
+
+
+class Account:
+    def __init__(self, name, token_file, channel, ledger):
+        self.name = name
+        self.token_file = token_file
+        self.channel = channel
+        self.ledger = ledger
+        self.uploaded = 0
+        self.reserved = 0  # выданные pick(), но ещё не завершённые загрузки
+        self.lock = threading.Lock()
+        self._local = threading.local()
+
+    def service(self, factory):
+        """
+        Клиент YouTube аккаунта, собранный factory(token_file). Кешируется на поток:
+        клиент googleapiclient (httplib2) не потокобезопасен.
+        """
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = self._local.service = factory(self.token_file)
+        return service
+
+    def uploads_left(self):
+        with self.lock:
+            return max(0, self.ledger.uploads_left() - self.reserved)
+
+    def record(self):
+        """
+        Загрузка прошла: списываем квоту.
+        """
+        self.ledger.spend()
+        with self.lock:
+            self.uploaded += 1
+
+    def release(self):
+        with self.lock:
+            self.reserved = max(0, self.reserved - 1)
+
+
+class AccountPool:
+    def __init__(self, tokens_dir=TOKENS_DIR, token_file=TOKEN_FILE):
+        self.lock = threading.Lock()
+        config = {}
+        pool_file = os.path.join(tokens_dir, POOL_FILE)
+        if os.path.exists(pool_file):
+            try:
+                with open(pool_file, "r", encoding="utf-8") as f:
+                    config = json.load(f) or {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"Не удалось прочитать {pool_file}: {e}")
+        settings = config.get("accounts", {})
+        self.default_channel = config.get("default_channel", DEFAULT_CHANNEL)
+        self.accounts = []
+        if os.path.isdir(tokens_dir):
+            for fname in sorted(os.listdir(tokens_dir)):
+                if not fname.endswith(".json") or fname == POOL_FILE or fname.endswith(".quota.json"):
+                    continue
+                name = fname[:-len(".json")]
+                self.accounts.append(Account(
+                    name, os.path.join(tokens_dir, fname),
+                    settings.get(name, {}).get("channel", self.default_channel),
+                    quota.QuotaLedger(os.path.join(tokens_dir, f"{name}.quota.json"))
+                ))
+        if not self.accounts:
+            self.accounts.append(Account("default", token_file, self.default_channel, quota.get_ledger()))
+
+    def for_channel(self, channel=None):
+        channel = channel or self.default_channel
+        return [a for a in self.accounts if a.channel == channel]
+
+    def pick(self, channel=None):
+        """
+        Аккаунт канала с наибольшим остатком квоты; резервирует одну загрузку
+        (account.release() после неё). None — квота канала на сегодня исчерпана.
+        """
+        with self.lock:
+            candidates = [(a.uploads_left(), a) for a in self.for_channel(channel)]
+            if not candidates:
+                logging.error(f"В пуле нет аккаунтов для канала {channel or self.default_channel}")
+                return None
+            left, account = max(candidates, key=lambda c: c[0])
+            if left <= 0:
+                return None
+            with account.lock:
+                account.reserved += 1
+            return account
+
+    def uploads_left(self, channel=None):
+        return sum(a.uploads_left() for a in self.for_channel(channel))
+
+    def any_left(self):
+        return any(a.uploads_left() for a in self.accounts)
+
+    def split_today(self, rows, limit=None):
+        """
+        rows — [(строка, число загрузок, канал)] в порядке обработки. Для каждого канала
+        отдельно (quota.split_today) возвращает строки, которые сегодня не загрузить.
+        """
+        deferred = []
+        for channel in dict.fromkeys(c for _, _, c in rows):
+            budget = self.uploads_left(channel)
+            if limit is not None:
+                budget = min(budget, limit)
+            _, rest = quota.split_today([(r, p) for r, p, c in rows if c == channel], budget)
+            deferred += rest
+        return sorted(deferred)
+
+    def report(self, pending=0):
+        """
+        Распределение загрузок и квоты по аккаунтам; pending — сколько видео ещё ждёт загрузки.
+        """
+        for account in self.accounts:
+            ledger = account.ledger
+            print(f"YouTube {account.name} (канал {account.channel}): загружено за запуск {account.uploaded}, "
+                  f"квота {ledger.used}/{ledger.daily_quota}, загрузок сегодня ещё {account.uploads_left()}")
+        if not pending:
+            return
+        per_day = sum(a.ledger.per_day() for a in self.accounts)
+        left = sum(a.uploads_left() for a in self.accounts)
+        if pending <= left:
+            print(f"  В очереди {pending} загрузок — укладываемся в сегодняшнюю квоту пула.")
+        elif not per_day:
+            print(f"  В очереди {pending} загрузок, но дневной квоты пула не хватает даже на одну.")
+        else:
+            days = -(-(pending - left) // per_day)
+            cleared = quota.pacific_now().date() + timedelta(days=days)
+            print(f"  В очереди {pending} загрузок, при {per_day} в сутки по пулу "
+                  f"разберём к {cleared:%d.%m.%Y} (через {days} дн.), сброс квоты {quota.next_reset():%d.%m %H:%M %Z}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AccountPool()
+        return _pool
+
+
+def add_account(name, client_secrets_file, tokens_dir=TOKENS_DIR):
+    """
+    Интерактивная авторизация аккаунта: сохраняет tokens/<name>.json.
+    """
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    flow = InstalledAppFlow.from_client_secrets_file(client_secrets_file, SCOPES)
+    credentials = flow.run_local_server(port=0)
+    os.makedirs(tokens_dir, exist_ok=True)
+    path = os.path.join(tokens_dir, f"{name}.json")
+    with open(path, "w") as f:
+        f.write(credentials.to_json())
+    return path
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 4 and sys.argv[1] == "add":
+        print(f"Токен сохранён: {add_account(sys.argv[2], sys.argv[3])}")
+    elif len(sys.argv) == 1:
+        get_pool().report()
+    else:
+        print("Использование: python youtube_accounts.py [add ИМЯ client_secret.json]")
+        sys.exit(1)
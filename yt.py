@@ -1,22 +1,25 @@
-import pandas as pd
 import subprocess
 import os
 import argparse
 import logging
-import requests
-import zipfile
 import shutil
 import threading
-import time
 import re
-import math
 import json
 from datetime import datetime
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google_auth_oauthlib.flow import InstalledAppFlow
-from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
+
+import bandwidth
+import eta
+import manifest
+import mp4meta
+import partupload
+import plan
+import quality
+import quota
+import throughput
+import toolcache
+import workspace
+import youtube_accounts
 
 # Пути к инструментам и файлам
 TWITCH_DOWNLOADER_PATH = "./TwitchDownloaderCLI/TwitchDownloaderCLI"
@@ -49,18 +52,10 @@ def setup_environment():
         logging.warning("FFmpeg не установлен. Установите его командой: 'sudo apt install ffmpeg'")
         safe_print("FFmpeg не установлен. Установите его командой: 'sudo apt install ffmpeg'")
         exit(1)
-    if not os.path.exists("./TwitchDownloaderCLI"):
-        logging.info("Скачиваю TwitchDownloaderCLI...")
-        safe_print("Скачиваю TwitchDownloaderCLI...")
-        url = "https://github.com/lay295/TwitchDownloader/releases/download/1.55.2/TwitchDownloaderCLI-1.55.2-Linux-x64.zip"
-        response = requests.get(url)
-        with open("TwitchDownloaderCLI.zip", "wb") as f:
-            f.write(response.content)
-        with zipfile.ZipFile("TwitchDownloaderCLI.zip", "r") as zip_ref:
-            zip_ref.extractall("./TwitchDownloaderCLI")
-        os.remove("TwitchDownloaderCLI.zip")
-        logging.info("TwitchDownloaderCLI успешно установлен.")
-        safe_print("TwitchDownloaderCLI успешно установлен.")
+    # локальная ./TwitchDownloaderCLI, иначе закреплённая версия из общего кеша toolcache
+    global TWITCH_DOWNLOADER_PATH
+    TWITCH_DOWNLOADER_PATH = toolcache.twitch_downloader(TWITCH_DOWNLOADER_PATH)
+    logging.info(f"TwitchDownloaderCLI: {TWITCH_DOWNLOADER_PATH}")
 
 # Функция для настройки учетных данных
 def setup_credentials():
@@ -87,13 +82,15 @@ def setup_credentials():
         safe_print(f"{TOKEN_FILE} успешно сохранен.")
 
 # Функция для скачивания видео с Twitch с прогресс-баром
-def download_twitch_video_rich(progress, task_id, video_url, output_file):
+def download_twitch_video_rich(progress, task_id, video_url, output_file, temp_dir="temp", rendition=None):
     start_time = datetime.now()
     video_id = video_url.split("/")[-1] if "twitch.tv" in video_url else video_url
     command = [
         TWITCH_DOWNLOADER_PATH, "videodownload", "--id", video_id, "-o", output_file,
-        "--threads", "20", "--temp-path", "temp"
+        "--threads", "20", "--temp-path", temp_dir
     ]
+    if rendition and rendition != quality.SOURCE:
+        command += ["-q", rendition]
     logging.debug(f"Выполняю команду: {' '.join(command)}")
     try:
         proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
@@ -102,23 +99,27 @@ def download_twitch_video_rich(progress, task_id, video_url, output_file):
         progress.update(task_id, description=f"{output_file} ERROR")
         return
 
-    pattern = re.compile(r"Downloading\s+(\d+)%")
-    while True:
-        line = proc.stdout.readline()
-        if not line and proc.poll() is not None:
-            break
-        if line:
-            match = pattern.search(line)
-            if match:
-                percent = int(match.group(1))
-                progress.update(task_id, completed=percent)
-    retcode = proc.wait()
-    if retcode != 0:
-        raise subprocess.CalledProcessError(retcode, command)
+    with bandwidth.stage("twitch"):
+        pattern = re.compile(r"Downloading\s+(\d+)%")
+        while True:
+            line = proc.stdout.readline()
+            if not line and proc.poll() is not None:
+                break
+            if line:
+                match = pattern.search(line)
+                if match:
+                    percent = int(match.group(1))
+                    progress.update(task_id, completed=percent)
+                    eta.video_progress(video_id, percent / 100)
+        retcode = proc.wait()
+        if retcode != 0:
+            raise subprocess.CalledProcessError(retcode, command)
     progress.update(task_id, completed=100)
     progress.remove_task(task_id)
+    eta.video_progress(video_id, 1.0)
     end_time = datetime.now()
     download_time = (end_time - start_time).total_seconds()
+    throughput.record("twitch", os.path.getsize(output_file), download_time)
     file_size = os.path.getsize(output_file) / (1024 * 1024)
     speed = file_size / download_time if download_time > 0 else 0
     msg = (f"Файл {output_file} ({file_size:.2f} МБ) скачан за "
@@ -128,6 +129,10 @@ def download_twitch_video_rich(progress, task_id, video_url, output_file):
 
 # Функция для получения длительности видео
 def get_video_duration(video_file):
+    # Сначала читаем moov напрямую, ffprobe — только если файл не разобрался
+    duration = mp4meta.read_duration(video_file)
+    if duration is not None:
+        return duration
     command = [
         FFPROBE_PATH, "-v", "error", "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1", video_file
@@ -137,6 +142,9 @@ def get_video_duration(video_file):
 
 # Новая функция: извлечение глав из видео
 def get_chapters(video_file):
+    chapters = mp4meta.read_chapters(video_file)
+    if chapters is not None:
+        return chapters
     command = [
         FFPROBE_PATH, "-v", "quiet", "-print_format", "json", "-show_chapters", video_file
     ]
@@ -165,7 +173,7 @@ def create_description_from_chapters(chapters):
     return description
 
 # Новая функция: создание файла метаданных для объединения видео
-def create_concat_metadata(video_files):
+def create_concat_metadata(video_files, metadata_file="concat_metadata.txt"):
     cumulative_duration = 0
     all_chapters = []
     for video_file in video_files:
@@ -183,7 +191,6 @@ def create_concat_metadata(video_files):
         end = int(chapter["end_time"] * 1000)
         title = chapter["tags"].get("title", "Untitled")
         metadata_content += f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={start}\nEND={end}\ntitle={title}\n"
-    metadata_file = "concat_metadata.txt"
     with open(metadata_file, "w") as f:
         f.write(metadata_content)
     return metadata_file
@@ -192,87 +199,71 @@ def create_concat_metadata(video_files):
 def concatenate_videos(video_files, output_file, metadata_file=None):
     logging.info("Объединяю видео...")
     safe_print("Объединяю видео...")
-    with open("concat_list.txt", "w") as f:
+    # список лежит рядом с результатом (в папке задания), пути в нём абсолютные
+    list_file = f"{output_file}.concat.txt"
+    with open(list_file, "w") as f:
         for video_file in video_files:
-            f.write(f"file '{video_file}'\n")
-    command = [FFMPEG_PATH, "-f", "concat", "-safe", "0", "-i", "concat_list.txt"]
+            f.write(f"file '{os.path.abspath(video_file)}'\n")
+    command = [FFMPEG_PATH, "-f", "concat", "-safe", "0", "-i", list_file]
     if metadata_file:
         command += ["-i", metadata_file, "-map_metadata", "1"]
     command += ["-c", "copy", output_file]
-    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    os.remove("concat_list.txt")
+    with throughput.timed("remux", output_file):
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.remove(list_file)
     if metadata_file and os.path.exists(metadata_file):
         os.remove(metadata_file)
     logging.info(f"Видео объединено в {output_file}")
     safe_print(f"Видео объединено в {output_file}")
 
 # Функция для разбиения длинного видео
-def split_single_video(video_file):
+def split_single_video(video_file, out_dir=None):
     duration = get_video_duration(video_file)
     if duration <= MAX_ALLOWED_DURATION:
         return [video_file]
 
-    parts = int(math.ceil(duration / MAX_ALLOWED_DURATION))
-    split_points = []
-
-    if parts == 2:
-        first_part = math.ceil((duration / 2) / 3600) * 3600 - 1
-        if first_part > MAX_ALLOWED_DURATION:
-            first_part = MAX_ALLOWED_DURATION - 1
-        split_points.append(first_part)
-    else:
-        base = int(math.floor((duration / parts) / 3600)) * 3600 - 1
-        for i in range(parts - 1):
-            split_points.append(base)
-
+    # границы по часам считает plan.hour_split_boundaries — их же показывает --plan
     part_files = []
-    start_time_sec = 0
-    part_num = 1
-
-    for sp in split_points:
-        part_file = f"{video_file[:-4]}_part{part_num}.mp4"
-        logging.info(f"Разделяю {video_file} на часть {part_num} продолжительностью {sp/3600:.2f} ч")
-        safe_print(f"Разделяю {video_file} на часть {part_num} продолжительностью {sp/3600:.2f} ч")
-        command = [
-            FFMPEG_PATH, "-i", video_file, "-ss", str(start_time_sec),
-            "-t", str(sp), "-c", "copy", part_file
-        ]
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        part_files.append(part_file)
-        start_time_sec += sp
-        part_num += 1
-
-    if start_time_sec < duration:
-        remaining_duration = duration - start_time_sec
-        part_file = f"{video_file[:-4]}_part{part_num}.mp4"
-        logging.info(f"Создаю последнюю часть {part_num} длительностью {remaining_duration/3600:.2f} ч")
-        safe_print(f"Создаю последнюю часть {part_num} длительностью {remaining_duration/3600:.2f} ч")
-        command = [
-            FFMPEG_PATH, "-i", video_file, "-ss", str(start_time_sec),
-            "-t", str(remaining_duration), "-c", "copy", part_file
-        ]
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        part_files.append(part_file)
+    base_name = os.path.join(out_dir, os.path.basename(video_file[:-4])) if out_dir else video_file[:-4]
+    with throughput.timed("remux", video_file):
+        for part_num, (start_time_sec, length) in enumerate(
+                plan.hour_split_boundaries(duration, MAX_ALLOWED_DURATION), 1):
+            part_file = f"{base_name}_part{part_num}.mp4"
+            logging.info(f"Разделяю {video_file} на часть {part_num} продолжительностью {length/3600:.2f} ч")
+            safe_print(f"Разделяю {video_file} на часть {part_num} продолжительностью {length/3600:.2f} ч")
+            command = [
+                FFMPEG_PATH, "-i", video_file, "-ss", str(start_time_sec),
+                "-t", str(length), "-c", "copy", part_file
+            ]
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            part_files.append(part_file)
 
     return part_files
 
 # Авторизация в YouTube API
-def get_authenticated_youtube_service():
-    if os.path.exists(TOKEN_FILE):
-        credentials = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+def get_authenticated_youtube_service(token_file=TOKEN_FILE):
+    # Клиент Google тяжёлый при импорте — грузим только когда действительно нужен YouTube
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    if os.path.exists(token_file):
+        credentials = Credentials.from_authorized_user_file(token_file, SCOPES)
     else:
         flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS_FILE, SCOPES)
         credentials = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "w") as token:
+        with open(token_file, "w") as token:
             token.write(credentials.to_json())
     return build("youtube", "v3", credentials=credentials)
 
 # Функция для загрузки видео на YouTube
-def upload_to_youtube(video_file, title, description, tags):
-    logging.info(f"Загружаю {video_file} на YouTube как '{title}'...")
-    safe_print(f"Загружаю {video_file} на YouTube как '{title}'...")
+def upload_to_youtube(video_file, title, description, tags, account=None, channel=None):
+    # account — аккаунт пула, выданный pick() (None — лучший аккаунт канала channel)
+    account = account or youtube_accounts.get_pool().pick(channel)
+    if account is None:
+        raise RuntimeError("квота YouTube на сегодня исчерпана на всех аккаунтах пула")
+    logging.info(f"Загружаю {video_file} на YouTube как '{title}' (аккаунт {account.name})...")
+    safe_print(f"Загружаю {video_file} на YouTube как '{title}' (аккаунт {account.name})...")
     start_time = datetime.now()
-    youtube = get_authenticated_youtube_service()
     body = {
         "snippet": {
             "title": title,
@@ -284,9 +275,22 @@ def upload_to_youtube(video_file, title, description, tags):
             "privacyStatus": "private"
         }
     }
-    media = MediaFileUpload(video_file, chunksize=-1, resumable=True)
-    request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
-    response = request.execute()
+    from googleapiclient.http import MediaIoBaseUpload
+    # медиапоток идёт через общий ограничитель полосы (bandwidth.json)
+    stream = bandwidth.wrap(open(video_file, "rb"), "youtube")
+    try:
+        youtube = account.service(get_authenticated_youtube_service)
+        media = MediaIoBaseUpload(stream, mimetype="video/mp4", chunksize=-1, resumable=True)
+        request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
+        response = request.execute()
+    except Exception as e:
+        if quota.is_quota_error(e):
+            account.ledger.exhaust()
+        raise
+    finally:
+        stream.close()
+        account.release()
+    account.record()
     end_time = datetime.now()
     upload_time = (end_time - start_time).total_seconds()
     file_size = os.path.getsize(video_file) / (1024 * 1024)
@@ -297,32 +301,17 @@ def upload_to_youtube(video_file, title, description, tags):
     safe_print(msg)
 
 # Обновленная функция: умная группировка с учетом метаданных
-def smart_group_and_concatenate(video_files, max_duration=12*3600):
+def smart_group_and_concatenate(video_files, max_duration=12*3600, out_dir=""):
     durations = [get_video_duration(vf) for vf in video_files]
-    groups = []
-    current_group = []
-    current_duration = 0
-
-    for duration, video_file in zip(durations, video_files):
-        if current_duration + duration <= max_duration:
-            current_group.append(video_file)
-            current_duration += duration
-        else:
-            if current_group:
-                groups.append(current_group)
-            current_group = [video_file]
-            current_duration = duration
-
-    if current_group:
-        groups.append(current_group)
+    groups = [[video_files[i] for i in group] for group in plan.group_durations(durations, max_duration)]
 
     final_files = []
     for i, group in enumerate(groups):
         if len(group) == 1:
             final_files.append(group[0])
         else:
-            metadata_file = create_concat_metadata(group)
-            output_file = f"group_{i}.mp4"
+            metadata_file = create_concat_metadata(group, os.path.join(out_dir, "concat_metadata.txt"))
+            output_file = os.path.join(out_dir, f"group_{i}.mp4")
             concatenate_videos(group, output_file, metadata_file)
             final_files.append(output_file)
     return final_files
@@ -340,27 +329,84 @@ def add_part_to_title(title, part_number):
         new_main_title = f"{main_title}. Часть {part_number}"
     return f"{new_main_title} {date_part}"
 
+# --plan: прогноз пачки без скачивания
+def make_plan(start_row, end_row, max_uploads, plan_file):
+    if not os.path.exists(STREAMS_FILE):
+        safe_print(f"Не найден {STREAMS_FILE}.")
+        return None
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
+    rows = [(r.number, str(r.iloc[1]).split()) for r in records if manifest.notna(r.iloc[1])]
+    preflight_plan = plan.run_preflight(rows)
+    if not preflight_plan:
+        safe_print("--plan: без данных Helix (длительности VOD) план не построить.")
+        return None
+    pool = youtube_accounts.get_pool()
+    batch = plan.build_batch(
+        preflight_plan, lambda durations: plan.layout_grouped(durations, MAX_ALLOWED_DURATION),
+        names={r.number: str(r.iloc[2]) if manifest.notna(r.iloc[2]) else "" for r in records},
+        title=add_part_to_title, platforms=["youtube"],
+        pool=pool, channels={r.number: youtube_accounts.row_channel(r) for r in records},
+        max_uploads=max_uploads)
+    plan.print_batch(batch)
+    pool.report(batch["totals"]["youtube_parts"])
+    plan.save_plan(batch, plan_file)
+    safe_print(f"План сохранён в {plan_file}, запуск по нему: --from-plan {plan_file}")
+    return batch
+
 # Основная функция с интеграцией глав
-def main(start_row=1, end_row=None, max_uploads=10, debug=False):
+def main(start_row=1, end_row=None, max_uploads=10, debug=False, part_workers=partupload.PART_WORKERS,
+         plan_file=None, from_plan=None, max_quality=None):
     if debug:
         logging.getLogger().setLevel(logging.DEBUG)
     else:
         logging.getLogger().setLevel(logging.INFO)
 
+    if plan_file:
+        return make_plan(start_row, end_row, max_uploads, plan_file)
+    # --max-quality: YouTube — единственная площадка, качаем самую дешёвую подходящую версию
+    rendition = quality.plan_row({"youtube": (max_quality, None)})["downloads"][0]
+    if rendition != quality.SOURCE:
+        safe_print(f"Качество скачивания: {rendition}")
+        logging.info(f"Качество скачивания: {rendition}")
+    rendition = None if rendition == quality.SOURCE else rendition
+    saved_plan = None
+    if from_plan:
+        # запуск по плану --plan: его диапазон и лимит; мёртвые и изменённые строки пропускаем
+        saved_plan = plan.load_plan(from_plan)
+        start_row, end_row = saved_plan["range"]
+        max_uploads = saved_plan.get("max_uploads") or max_uploads
+        safe_print(f"Запуск по плану {from_plan}: строки {start_row}–{end_row}")
+
     setup_environment()
     setup_credentials()
 
     uploaded_count = 0
-    logging.info("Очистка старых файлов...")
-    safe_print("Очистка старых файлов...")
-    for file in os.listdir():
-        if file.endswith(".mp4"):
-            os.remove(file)
-
-    df = pd.read_excel(STREAMS_FILE)
-    start_index = max(0, start_row - 1)
-    end_index = end_row if end_row is not None else len(df)
-
+    # чужие рабочие папки не трогаем — только оставшиеся от завершившихся процессов
+    logging.info("Очистка брошенных рабочих папок...")
+    workspace.cleanup_stale()
+
+    # читаем только строки --start..--end
+    records = list(manifest.read_rows(STREAMS_FILE, start_row, end_row))
+    rows = [(r.number, str(r.iloc[1]).split()) for r in records if manifest.notna(r.iloc[1])]
+    if saved_plan:
+        plan_data = saved_plan
+        skip = plan.dead_rows(saved_plan) | plan.stale_rows(saved_plan, rows)
+    else:
+        # preflight нужен прогнозу окончания (размеры VOD); заодно мёртвые строки не качаем
+        plan_data = plan.run_preflight(rows)
+        skip = plan.dead_rows(plan_data)
+    if plan_data:
+        eta.start(plan.build_batch(plan_data, lambda durations: plan.layout_grouped(durations, MAX_ALLOWED_DURATION),
+                                   platforms=["youtube"]),
+                  rows={n for n, _ in rows if n not in skip})
+
+    # дневная квота YouTube (по пулу аккаунтов) общая для всех запусков;
+    # без preflight считаем по видео на строку
+    pool = youtube_accounts.get_pool()
+    pool.report(sum(1 for r in records if manifest.notna(r.iloc[1])))
+    youtube_pending = 0
+
+    from rich.progress import Progress, BarColumn, TextColumn, TimeElapsedColumn, TimeRemainingColumn
     with Progress(
         TextColumn("[bold blue]{task.description}"),
         BarColumn(),
@@ -369,45 +415,69 @@ def main(start_row=1, end_row=None, max_uploads=10, debug=False):
         TimeRemainingColumn(),
         transient=True
     ) as progress:
-        for index in range(start_index, end_index):
+        for position, row in enumerate(records):
+            index = row.number - 1
             if uploaded_count >= max_uploads:
                 logging.info(f"Достигнут лимит загрузок: {max_uploads} видео.")
                 safe_print(f"Достигнут лимит загрузок: {max_uploads} видео.")
                 break
+            channel = youtube_accounts.row_channel(row)
+            if not pool.any_left():
+                # качать то, что сегодня не загрузить, незачем — строки дождутся сброса квоты
+                youtube_pending += sum(1 for r in records[position:] if manifest.notna(r.iloc[1]))
+                logging.info(f"Квота YouTube исчерпана, останавливаюсь на строке {index + 1}.")
+                safe_print(f"Квота YouTube на сегодня исчерпана, останавливаюсь на строке {index + 1}.")
+                break
+            if not pool.uploads_left(channel) and manifest.notna(row.iloc[1]):
+                youtube_pending += 1
+                safe_print(f"Квота канала {channel or pool.default_channel} исчерпана, строка {index + 1} отложена.")
+                eta.row_done(index + 1)
+                continue
 
-            row = df.iloc[index]
-            if pd.isna(row.iloc[1]):
+            if manifest.isna(row.iloc[1]):
                 logging.info(f"Пропускаю строку {index + 1}: нет данных.")
                 safe_print(f"Пропускаю строку {index + 1}: нет данных.")
                 continue
+            if row.number in skip:
+                safe_print(f"Пропускаю строку {index + 1}: VOD недоступен на Twitch или изменился после --plan.")
+                continue
             logging.info(f"\nОбработка строки {index + 1}")
             safe_print(f"\nОбработка строки {index + 1}")
 
-            video_urls = row.iloc[1].split()
-            video_files = []
+            video_urls = str(row.iloc[1]).split()
+            video_files = [workspace.cache_path(url.split("/")[-1], rendition) for url in video_urls]
             download_threads = []
+            downloads = []
 
-            for url in video_urls:
-                video_id = url.split("/")[-1]
-                output_file = f"{video_id}.mp4"
+            # каждый VOD качается в своей рабочей папке и атомарно переносится в кеш
+            for url, output_file in zip(video_urls, video_files):
                 if not os.path.exists(output_file):
-                    task_id = progress.add_task(f"[{output_file}]", total=100)
+                    video_id = url.split("/")[-1]
+                    dl_job = workspace.Workspace(f"dl-{video_id}")
+                    partial = dl_job.path(f"{video_id}.mp4")
+                    task_id = progress.add_task(f"[{video_id}.mp4]", total=100)
                     thread = threading.Thread(
                         target=download_twitch_video_rich,
-                        args=(progress, task_id, url, output_file)
+                        args=(progress, task_id, url, partial, dl_job.temp_dir, rendition)
                     )
                     download_threads.append(thread)
+                    downloads.append((dl_job, partial, output_file))
                     thread.start()
 
             for thread in download_threads:
                 thread.join()
+            for dl_job, partial, output_file in downloads:
+                if os.path.exists(partial) and os.path.getsize(partial) > 0:
+                    dl_job.publish(partial, output_file)
+                dl_job.cleanup()
 
-            video_files = [f"{url.split('/')[-1]}.mp4" for url in video_urls]
-
-            name = str(row.iloc[2]) if pd.notna(row.iloc[2]) else ""
-            tags = str(row.iloc[4]) if pd.notna(row.iloc[4]) else ""
+            name = str(row.iloc[2]) if manifest.notna(row.iloc[2]) else ""
+            tags = str(row.iloc[4]) if manifest.notna(row.iloc[4]) else ""
 
-            grouped_files = smart_group_and_concatenate(video_files)
+            # склейки и части строки живут в её рабочей папке
+            job = workspace.Workspace(f"row-{index + 1}")
+            with eta.stage(index + 1, "remux"):
+                grouped_files = smart_group_and_concatenate(video_files, out_dir=job.dir)
 
             # Собираем все файлы для загрузки
             files_to_upload = []
@@ -419,40 +489,56 @@ def main(start_row=1, end_row=None, max_uploads=10, debug=False):
                 if total_duration <= MAX_ALLOWED_DURATION:
                     files_to_upload.append(final_file)
                 else:
-                    parts = split_single_video(final_file)
+                    with eta.stage(index + 1, "remux"):
+                        parts = split_single_video(final_file, out_dir=job.dir)
                     files_to_upload.extend(parts)
 
-            # Загружаем файлы с номерами частей только если их больше одного
+            # Загружаем файлы с номерами частей только если их больше одного;
+            # названия вычисляем до загрузки — части уходят параллельно
+            parts = []
+            quota_left = pool.uploads_left(channel)
             for part_index, upload_file in enumerate(files_to_upload):
-                if uploaded_count >= max_uploads:
+                if uploaded_count + len(parts) >= max_uploads:
+                    break
+                if len(parts) >= quota_left:
+                    youtube_pending += len(files_to_upload) - part_index
+                    safe_print("Квота YouTube на сегодня исчерпана.")
                     break
                 chapters = get_chapters(upload_file)
                 if chapters:
                     description = create_description_from_chapters(chapters)
                 else:
-                    description = str(row.iloc[3]) if pd.notna(row.iloc[3]) else ""
+                    description = str(row.iloc[3]) if manifest.notna(row.iloc[3]) else ""
                 if len(files_to_upload) > 1:
                     part_number = part_index + 1
                     new_name = add_part_to_title(name, part_number)
                 else:
                     new_name = name  # Используем базовое название, если файл один
-                upload_to_youtube(upload_file, new_name, description, tags)
-                uploaded_count += 1
-                time.sleep(10)
+                parts.append((upload_file, new_name, description))
+
+            # пауза между загрузками — только если YouTube ответил ограничением частоты
+            with eta.stage(index + 1, "youtube"):
+                results = partupload.upload_parts(
+                    parts, lambda part: upload_to_youtube(*part, tags, channel=channel), part_workers)
+            eta.row_done(index + 1)
+            errors = []
+            for (upload_file, _, _), error in results:
+                if error is None:
+                    uploaded_count += 1
+                else:
+                    logging.error(f"Ошибка загрузки {upload_file} на YouTube: {error}")
+                    errors.append(error)
+            if errors:
+                raise errors[0]
 
             # Удаляем временные файлы
             logging.info("Удаляю временные файлы...")
             safe_print("Удаляю временные файлы...")
-            for video_file in video_files:
-                if os.path.exists(video_file):
-                    os.remove(video_file)
-            for grouped_file in grouped_files:
-                if os.path.exists(grouped_file) and grouped_file not in video_files:
-                    os.remove(grouped_file)
-            for upload_file in files_to_upload:
-                if os.path.exists(upload_file) and upload_file not in video_files and upload_file not in grouped_files:
-                    os.remove(upload_file)
+            workspace.remove_files(video_files)
+            job.cleanup()
 
+    eta.stop()
+    pool.report(youtube_pending)
     logging.info("Задача выполнена!")
     safe_print("Задача выполнена!")
 
@@ -462,6 +548,20 @@ if __name__ == "__main__":
     parser.add_argument("--end", type=int, help="Конечная строка")
     parser.add_argument("--max-uploads", type=int, default=10, help="Максимальное количество видео для загрузки")
     parser.add_argument("--debug", action="store_true", help="Включить подробное логирование")
+    parser.add_argument("--part-workers", type=int, default=partupload.PART_WORKERS,
+                        help="Сколько частей длинного видео загружать одновременно")
+    parser.add_argument("--plan", nargs="?", const=plan.BATCH_PLAN_FILE, metavar="FILE",
+                        help="Ничего не скачивая, посчитать время, пик диска, части и квоту YouTube "
+                             "и сохранить план (по умолчанию %(const)s)")
+    parser.add_argument("--from-plan", metavar="FILE", help="Запустить сохранённый план --plan как есть")
+    parser.add_argument("--max-quality", metavar="КАЧЕСТВО",
+                        help="Наибольшее нужное качество, например 720p60: скачивается самая дешёвая версия Twitch, "
+                             "которой его хватает")
     args = parser.parse_args()
+    try:
+        max_quality = quality.parse_quality(args.max_quality) if args.max_quality else None
+    except ValueError as e:
+        parser.error(f"--max-quality: {e}")
 
-    main(args.start, args.end, args.max_uploads, args.debug)
\ No newline at end of file
+    main(args.start, args.end, args.max_uploads, args.debug, args.part_workers, args.plan, args.from_plan,
+         max_quality)
\ No newline at end of file